@@ -10,9 +10,16 @@ const char* password = "a47qhmlwxy";
 
 // Server configuration
 const char* serverURL = "http://192.168.1.17:5000/upload"; 
-const unsigned long sendInterval = 10000; // Send image every 10 seconds
+const unsigned long sendInterval = 10000; // Send image every 10 seconds until the server suggests otherwise
+const unsigned long minSendInterval = 500;
+const unsigned long maxSendInterval = 60000;
+unsigned long captureInterval = sendInterval;
 unsigned long lastSendTime = 0;
 
+// The server answers with the delay before the next capture: short while the
+// door's PIR sees motion, long while the corridor is empty
+const char* captureHeaders[] = {"X-Next-Capture-Interval", "Retry-After"};
+
 camera_config_t config;
 
 void camera_configurations(){
@@ -50,6 +57,21 @@ void camera_configurations(){
   }
 }
 
+void updateCaptureInterval(HTTPClient& http) {
+  // Header values are in seconds, e.g. "1" or "0.5"
+  String hint = http.header("X-Next-Capture-Interval");
+  if (hint.length() == 0) {
+    hint = http.header("Retry-After");  // sent with 503 while the server warms up
+  }
+  if (hint.length() == 0) {
+    captureInterval = sendInterval;
+    return;
+  }
+  unsigned long interval = (unsigned long)(hint.toFloat() * 1000);
+  captureInterval = constrain(interval, minSendInterval, maxSendInterval);
+  Serial.printf("Next capture in %lu ms\n", captureInterval);
+}
+
 bool sendImageToServer() {
   digitalWrite(FLASH_GPIO_NUM, HIGH); // Turn on flash
   delay(100); // Allow flash to stabilize
@@ -64,6 +86,7 @@ bool sendImageToServer() {
   WiFiClient client;
   HTTPClient http;
   http.begin(client, serverURL);
+  http.collectHeaders(captureHeaders, 2);
   
   // Generate boundary for multipart form data
   String boundary = "----ESP32CAMFormBoundary" + String(random(1000000, 9999999));
@@ -118,6 +141,7 @@ bool sendImageToServer() {
       Serial.println("Response received (too long to print)");
     }
     success = (httpResponseCode == 200);
+    updateCaptureInterval(http);
   } else {
     Serial.printf("HTTP Error: %d\n", httpResponseCode);
     String error = http.errorToString(httpResponseCode);
@@ -168,7 +192,7 @@ void setup() {
 
 void loop() {
   // Check if it's time to send an image
-  if (millis() - lastSendTime > sendInterval) {
+  if (millis() - lastSendTime > captureInterval) {
     if (sendImageToServer()) {
       Serial.println("Image sent successfully");
     } else {
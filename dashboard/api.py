@@ -1,19 +1,33 @@
 import os
 import logging
 import shutil
-from flask import Blueprint, request, jsonify
+import datetime
+import tempfile
+import threading
+from flask import Blueprint, request, jsonify, send_file, Response
 from database import DatabaseManager
 from auth import AuthManager
-from config import EMPLOYEES_FACES_FOLDER
+from config import (EMPLOYEES_FACES_FOLDER, CACHE_TTL_ENERGY, CACHE_TTL_EMPLOYEES, CACHE_TTL_CAMERAS,
+                    CACHE_TTL_STATUS, ENERGY_EVENTS_WAIT, ENERGY_EVENTS_BATCH, ENERGY_EVENTS_MAX_WAITERS,
+                    ENERGY_EVENTS_RETRY_AFTER)
+from tracing import profiler
+from response_cache import response_cache
+from enrollment import BulkEnrollment
+from history_export import HistoryExporter, parse_export_time
+from rescoring import FrameRescorer, recognizer_with_tolerance
 
 logger = logging.getLogger(__name__)
 
 class APIManager:
-    def __init__(self, face_recognizer, websocket_client):
+    def __init__(self, face_recognizer, board_manager, camera_scheduler=None, readiness=None):
         self.db_manager = DatabaseManager()
         self.auth_manager = AuthManager()
         self.face_recognizer = face_recognizer
-        self.websocket_client = websocket_client
+        self.board_manager = board_manager
+        self.camera_scheduler = camera_scheduler
+        self.readiness = readiness
+        # Long-polls that may hold a serving thread at once, so uploads are never starved
+        self.energy_waiters = threading.BoundedSemaphore(ENERGY_EVENTS_MAX_WAITERS)
         self.api_bp = Blueprint('api', __name__, url_prefix='/api')
         self._setup_api_routes()
     
@@ -45,18 +59,32 @@ class APIManager:
             success, message = self.auth_manager.logout_user()
             return jsonify({"message": message}), 200
         
+        @self.api_bp.route('/ready')
+        def api_ready():
+            """Report per-component readiness (no login, for health probes)."""
+            if not self.readiness:
+                return jsonify({"ready": True, "components": {}})
+            status = self.readiness.status()
+            status["boards_connected"] = self.board_manager.connected_count()
+            status["known_faces_loaded"] = len(self.face_recognizer.known_face_names)
+            return jsonify(status), 200 if status["ready"] else 503
+        
         @self.api_bp.route('/status')
         @self.auth_manager.login_required
+        @response_cache.cached(CACHE_TTL_STATUS, tags=('employees', 'boards'))
         def api_status():
             """API endpoint to check server status."""
             return jsonify({
                 "status": "running",
-                "esp32_connected": self.websocket_client.is_connected(),
+                "esp32_connected": self.board_manager.is_connected(),
+                "boards_connected": self.board_manager.connected_count(),
+                "boards_registered": self.board_manager.registered_count(),
                 "known_faces_loaded": len(self.face_recognizer.known_face_names)
             })
         
         @self.api_bp.route('/cameras', methods=['GET'])
         @self.auth_manager.login_required
+        @response_cache.cached(CACHE_TTL_CAMERAS, tags=('cameras',))
         def api_get_cameras():
             """Get all cameras."""
             try:
@@ -84,6 +112,8 @@ class APIManager:
                       data.get('password')))
                 conn.commit()
                 conn.close()
+                response_cache.invalidate('cameras')
+                self._refresh_camera_streams()
                 return jsonify({"message": "Camera added successfully"}), 201
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
@@ -97,12 +127,67 @@ class APIManager:
                 cursor.execute('DELETE FROM ip_cameras WHERE id = ?', (camera_id,))
                 conn.commit()
                 conn.close()
+                response_cache.invalidate('cameras')
+                self._refresh_camera_streams()
                 return jsonify({"message": "Camera deleted successfully"}), 200
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
 
+        @self.api_bp.route('/cameras/streams', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_camera_streams():
+            """Get stream recognition statistics for each camera."""
+            if not self.camera_scheduler:
+                return jsonify({"running": False, "cameras": []})
+            return jsonify(self.camera_scheduler.get_stats())
+
+        @self.api_bp.route('/boards', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_boards():
+            """Get all main boards with connection state and latest telemetry."""
+            return jsonify(self.board_manager.get_status())
+
+        @self.api_bp.route('/boards', methods=['POST'])
+        @self.auth_manager.login_required
+        def api_add_board():
+            """Register a new main board."""
+            try:
+                data = request.get_json()
+                if not data or not data.get('name') or not data.get('websocket_url'):
+                    return jsonify({"error": "Name and WebSocket URL are required"}), 400
+                board_id = self.db_manager.add_board(data['name'], data['websocket_url'], data.get('door_id'))
+                response_cache.invalidate('boards')
+                self.board_manager.load_boards()
+                return jsonify({"message": "Board added successfully", "board_id": board_id}), 201
+            except Exception as e:
+                logger.error(f"Error adding board: {e}")
+                return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/boards/<int:board_id>', methods=['DELETE'])
+        @self.auth_manager.login_required
+        def api_delete_board(board_id):
+            """Delete a main board by ID."""
+            if not self.db_manager.delete_board(board_id):
+                return jsonify({"error": "Board not found"}), 404
+            response_cache.invalidate('boards')
+            self.board_manager.load_boards()
+            return jsonify({"message": "Board deleted successfully"}), 200
+
+        @self.api_bp.route('/boards/command', methods=['POST'])
+        @self.auth_manager.login_required
+        def api_send_board_command():
+            """Send a command to a board selected by board_id or door_id."""
+            data = request.get_json() or {}
+            command = data.get('command')
+            if not command:
+                return jsonify({"error": "Command is required"}), 400
+            if self.board_manager.send_command(command, board_id=data.get('board_id'), door_id=data.get('door_id')):
+                return jsonify({"message": "Command sent"}), 200
+            return jsonify({"error": "Board not reachable"}), 503
+
         @self.api_bp.route('/employees', methods=['GET'])
         @self.auth_manager.login_required
+        @response_cache.cached(CACHE_TTL_EMPLOYEES, tags=('employees',))
         def api_get_employees():
             """Get all employees."""
             try:
@@ -173,6 +258,7 @@ class APIManager:
                 
                 # Reload known faces
                 self.face_recognizer.load_known_faces(EMPLOYEES_FACES_FOLDER)
+                response_cache.invalidate('employees')
                 
                 return jsonify({
                     "message": "Employee added successfully",
@@ -183,6 +269,48 @@ class APIManager:
             except Exception as e:
                 logger.error(f"Error adding employee: {e}")
                 return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/employees/bulk', methods=['POST'])
+        @self.auth_manager.login_required
+        def api_bulk_enroll():
+            """
+            Start enrolling employees from a ZIP or tar archive with a CSV manifest.
+
+            Enrollment runs in the background; poll the returned job for its report.
+            """
+            archive = request.files.get('archive')
+            if not archive or not archive.filename:
+                return jsonify({"error": "No archive provided"}), 400
+            dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'yes')
+            try:
+                # The upload is gone once the request ends, so the job works on a copy
+                fd, archive_path = tempfile.mkstemp(prefix='enrollment_')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        shutil.copyfileobj(archive.stream, f)
+                except Exception:
+                    os.remove(archive_path)
+                    raise
+                job_id = BulkEnrollment(self.db_manager, self.face_recognizer).start(archive_path, dry_run)
+                if job_id is None:
+                    return jsonify({"error": "Could not start the enrollment"}), 500
+                return (jsonify(self.db_manager.get_enrollment_job(job_id)), 202,
+                        {'Location': f"{self.api_bp.url_prefix}/employees/bulk/{job_id}"})
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error in bulk enrollment: {e}")
+                return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/employees/bulk/<int:job_id>', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_bulk_enrollment(job_id):
+            """Get a bulk enrollment's status, and its report once finished."""
+            job = self.db_manager.get_enrollment_job(job_id)
+            if job is None:
+                return jsonify({"error": "Enrollment job not found"}), 404
+            return jsonify(job)
+
         @self.api_bp.route('/employees/<int:employee_id>', methods=['DELETE'])
         @self.auth_manager.login_required
         def api_delete_employee(employee_id):
@@ -211,6 +339,7 @@ class APIManager:
                 
                 # Reload known faces
                 self.face_recognizer.load_known_faces(EMPLOYEES_FACES_FOLDER)
+                response_cache.invalidate('employees')
                 
                 return jsonify({"message": "Employee deleted successfully"}), 200
                 
@@ -218,8 +347,108 @@ class APIManager:
                 logger.error(f"Error deleting employee: {e}")
                 return jsonify({"error": str(e)}), 500
 
+        @self.api_bp.route('/employees/<int:employee_id>/access', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_employee_access(employee_id):
+            """Get when an employee was recognized, newest first (since/until as 'YYYY-MM-DD[ HH:MM:SS]' UTC)."""
+            try:
+                limit = min(request.args.get('limit', 100, type=int), 1000)
+                history = self.db_manager.get_employee_access_history(
+                    employee_id, request.args.get('since'), request.args.get('until'), limit)
+                return jsonify([{
+                    "id": h[0],
+                    "photo_id": h[1],
+                    "filename": h[2],
+                    "timestamp": h[3],
+                    "distance": h[4],
+                    "box": [int(v) for v in h[5].split(',')] if h[5] else None
+                } for h in history])
+            except Exception as e:
+                logger.error(f"Error getting access history: {e}")
+                return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/attendance', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_attendance():
+            """Get daily first-in/last-seen rows, paginated (page, per_page, from/to or month, employee_id)."""
+            try:
+                start_day, end_day = self._attendance_range()
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            try:
+                page = max(request.args.get('page', 1, type=int), 1)
+                per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+                rows, total = self.db_manager.get_attendance(
+                    start_day, end_day, request.args.get('employee_id', type=int),
+                    per_page, (page - 1) * per_page)
+                return jsonify({
+                    "from": start_day,
+                    "to": end_day,
+                    "page": page,
+                    "per_page": per_page,
+                    "total": total,
+                    "records": [self._attendance_record(row) for row in rows]
+                })
+            except Exception as e:
+                logger.error(f"Error getting attendance: {e}")
+                return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/attendance/summary', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_attendance_summary():
+            """Get per-employee days present for a period (from/to or month, default: this month)."""
+            try:
+                start_day, end_day = self._attendance_range()
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            try:
+                rows = self.db_manager.get_attendance_summary(start_day, end_day)
+                return jsonify({
+                    "from": start_day,
+                    "to": end_day,
+                    "employees": [{
+                        "employee_id": r[0], "name": r[1], "national_id": r[2], "days_present": r[3],
+                        "earliest_arrival": r[4], "latest_departure": r[5], "sightings": r[6]
+                    } for r in rows]
+                })
+            except Exception as e:
+                logger.error(f"Error getting attendance summary: {e}")
+                return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/attendance/export', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_export_attendance():
+            """Download the attendance rows of a period as CSV."""
+            try:
+                start_day, end_day = self._attendance_range()
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            # Streamed a batch at a time, like the history export, however many rows the period holds
+            batches = self.db_manager.iter_attendance(start_day, end_day, request.args.get('employee_id', type=int))
+            chunks = HistoryExporter(self.db_manager).encode(
+                batches, ['employee_id', 'name', 'national_id', 'day', 'first_seen', 'last_seen', 'sightings'])
+            return Response(chunks, mimetype='text/csv', headers={
+                "Content-Disposition": f"attachment; filename=attendance_{start_day}_{end_day}.csv"})
+
+        @self.api_bp.route('/export/<dataset>', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_export_history(dataset):
+            """Stream access, energy or sensor history (from/to in UTC, format=csv|ndjson, gzip=1)."""
+            fmt = request.args.get('format', 'csv')
+            compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+            try:
+                start = parse_export_time(request.args.get('from'))
+                end = parse_export_time(request.args.get('to'), end=True)
+                chunks = HistoryExporter(self.db_manager).stream(dataset, start, end, fmt, compress)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            filename = HistoryExporter.filename(dataset, start, end, fmt, compress)
+            return Response(chunks, mimetype=HistoryExporter.content_type(fmt, compress), headers={
+                "Content-Disposition": f"attachment; filename={filename}"})
+
         @self.api_bp.route('/energy/usage', methods=['GET'])
         @self.auth_manager.login_required
+        @response_cache.cached(CACHE_TTL_ENERGY, tags=('energy',))
         def api_get_energy_usage():
             """Get energy usage statistics."""
             try:
@@ -267,6 +496,7 @@ class APIManager:
 
         @self.api_bp.route('/energy/activity', methods=['GET'])
         @self.auth_manager.login_required
+        @response_cache.cached(CACHE_TTL_ENERGY, tags=('energy',))
         def api_get_energy_activity():
             """Get recent energy activity."""
             try:
@@ -284,6 +514,150 @@ class APIManager:
                 logger.error(f"Error getting energy activity: {e}")
                 return jsonify({"error": str(e)}), 500
 
+        @self.api_bp.route('/energy/events', methods=['GET'])
+        @self.auth_manager.login_required
+        def api_get_energy_events():
+            """
+            Long-poll for energy events newer than the 'since' cursor.
+
+            Without a cursor, returns the current one right away. Otherwise
+            waits up to 'wait' seconds for new events and returns them along
+            with the cursor to use for the next call. When too many requests
+            are already waiting, returns 429 with Retry-After unless there
+            are events to return right away.
+            """
+            try:
+                since = request.args.get('since', type=int)
+                if since is None:
+                    return jsonify({"events": [], "cursor": self.db_manager.get_latest_energy_event_id()})
+                wait = min(max(request.args.get('wait', ENERGY_EVENTS_WAIT, type=float), 0), ENERGY_EVENTS_WAIT)
+
+                # Read the generation before querying so a write in between still wakes us
+                generation = response_cache.generation('energy')
+                events = self.db_manager.get_energy_events_since(since, ENERGY_EVENTS_BATCH)
+                if not events and wait > 0:
+                    if not self.energy_waiters.acquire(blocking=False):
+                        return (jsonify({"error": "Too many waiting requests", "cursor": since}), 429,
+                                {'Retry-After': str(ENERGY_EVENTS_RETRY_AFTER)})
+                    try:
+                        if response_cache.wait_for_change('energy', generation, wait):
+                            events = self.db_manager.get_energy_events_since(since, ENERGY_EVENTS_BATCH)
+                    finally:
+                        self.energy_waiters.release()
+
+                return jsonify({
+                    "events": [{
+                        "id": e[0],
+                        "device": e[1],
+                        "action": e[2],
+                        "timestamp": e[3],
+                        "duration": e[4] if len(e) > 4 else None
+                    } for e in events],
+                    "cursor": events[-1][0] if events else since
+                })
+            except Exception as e:
+                logger.error(f"Error getting energy events: {e}")
+                return jsonify({"error": str(e)}), 500
+
+        @self.api_bp.route('/admin/profiling', methods=['GET'])
+        @self.auth_manager.admin_required
+        def api_get_profiling():
+            """Get profiler status."""
+            return jsonify(profiler.status())
+
+        @self.api_bp.route('/admin/profiling', methods=['POST'])
+        @self.auth_manager.admin_required
+        def api_set_profiling():
+            """Enable or disable cProfile capture for the next N requests."""
+            try:
+                data = request.get_json(silent=True) or {}
+                if data.get('enabled', True):
+                    requests_count = int(data.get('requests', 10))
+                    sample_every = int(data.get('sample_every', 1))
+                    if requests_count <= 0:
+                        return jsonify({"error": "requests must be positive"}), 400
+                    profiler.start(requests_count, sample_every)
+                else:
+                    profiler.stop()
+                return jsonify(profiler.status()), 200
+            except (TypeError, ValueError):
+                return jsonify({"error": "requests and sample_every must be integers"}), 400
+
+        @self.api_bp.route('/admin/profiling/stats', methods=['GET'])
+        @self.auth_manager.admin_required
+        def api_download_profiling_stats():
+            """Download the latest profile stats file."""
+            stats_file = profiler.stats_file
+            if not stats_file or not os.path.exists(stats_file):
+                return jsonify({"error": "No profile stats available"}), 404
+            return send_file(stats_file, as_attachment=True,
+                             download_name=os.path.basename(stats_file))
+
+        @self.api_bp.route('/admin/rescore', methods=['GET'])
+        @self.auth_manager.admin_required
+        def api_get_rescore():
+            """Get the progress, throughput and ETA of the latest re-scoring job."""
+            job = FrameRescorer(self.db_manager, self.face_recognizer).status()
+            if job is None:
+                return jsonify({"error": "No rescore job yet"}), 404
+            return jsonify(job)
+
+        @self.api_bp.route('/admin/rescore', methods=['POST'])
+        @self.auth_manager.admin_required
+        def api_start_rescore():
+            """Start or resume re-scoring stored frames in the background (scope, tolerance, restart)."""
+            data = request.get_json(silent=True) or {}
+            try:
+                tolerance = float(data.get('tolerance', self.face_recognizer.tolerance))
+                recognizer = recognizer_with_tolerance(self.face_recognizer, tolerance)
+                rescorer = FrameRescorer(self.db_manager, recognizer)
+                job_id = rescorer.start(data.get('scope', 'unknown'), bool(data.get('restart')))
+            except (TypeError, ValueError) as e:
+                return jsonify({"error": str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error starting rescore job: {e}")
+                return jsonify({"error": str(e)}), 500
+            if job_id is None:
+                return jsonify({"error": "A rescore job is already running"}), 409
+            threading.Thread(target=rescorer.run, args=(job_id,), name="rescore", daemon=True).start()
+            return jsonify(rescorer.status(job_id)), 202
+
+        @self.api_bp.route('/admin/rescore/stop', methods=['POST'])
+        @self.auth_manager.admin_required
+        def api_stop_rescore():
+            """Pause the running re-scoring job after its current batch; POST /admin/rescore resumes it."""
+            rescorer = FrameRescorer(self.db_manager, self.face_recognizer)
+            if not rescorer.stop():
+                return jsonify({"error": "No running rescore job"}), 409
+            return jsonify(rescorer.status())
+
+    def _refresh_camera_streams(self):
+        """Let the stream scheduler pick up camera changes immediately."""
+        if self.camera_scheduler:
+            try:
+                self.camera_scheduler.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing camera streams: {e}")
+
+    def _attendance_range(self):
+        """Read the requested day range from 'from'/'to' or 'month' (default: the current month)."""
+        today = datetime.date.today()
+        month = request.args.get('month')
+        if month:
+            start = datetime.datetime.strptime(month, '%Y-%m').date()
+            next_month = (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+            return start.isoformat(), (next_month - datetime.timedelta(days=1)).isoformat()
+        start = request.args.get('from') or today.replace(day=1).isoformat()
+        end = request.args.get('to') or today.isoformat()
+        for day in (start, end):
+            datetime.datetime.strptime(day, '%Y-%m-%d')
+        return start, end
+
+    @staticmethod
+    def _attendance_record(row):
+        return {"employee_id": row[0], "name": row[1], "national_id": row[2], "day": row[3],
+                "first_seen": row[4], "last_seen": row[5], "sightings": row[6]}
+
     def get_blueprint(self):
         """Return the API blueprint."""
         return self.api_bp
@@ -1,12 +1,23 @@
 from flask import Flask, render_template, send_from_directory, jsonify, request
 import os
 import logging
+import time
+import threading
 from vision import FaceRecognizer
 from database import DatabaseManager
 from auth import AuthManager
-from websocket_client import WebSocketClient
+from board_manager import BoardConnectionManager
+from board_relay import BoardRelayServer, BoardRelayClient
 from api import APIManager
-from config import UPLOAD_FOLDER, EMPLOYEES_FACES_FOLDER, DATABASE_FILE, ESP32_WEBSOCKET_URL
+from camera_scheduler import CameraStreamScheduler
+from tracing import tracer, profiler
+from readiness import ReadinessTracker
+from gallery_store import SharedGallery, PrimaryLock, RecognitionBudget
+from config import (UPLOAD_FOLDER, EMPLOYEES_FACES_FOLDER, DATABASE_FILE, ESP32_WEBSOCKET_URL,
+                    CAMERA_SCHEDULER_ENABLED, UPLOAD_WARMUP_POLICY, UPLOAD_WARMUP_WAIT,
+                    PRIMARY_LOCK_FILE, PRIMARY_RETRY_INTERVAL, PARTITION_MAINTENANCE_INTERVAL,
+                    MOTION_GATING_ENABLED, IDLE_UPLOAD_POLICY, CAPTURE_INTERVAL_MOTION, CAPTURE_INTERVAL_IDLE,
+                    CAPTURE_INTERVAL_DEFAULT)
 import datetime
 
 # Configure logging
@@ -21,17 +32,88 @@ class SmartEnterpriseServer:
         # Initialize components
         self.db_manager = DatabaseManager()
         self.auth_manager = AuthManager()
-        self.websocket_client = WebSocketClient()
-        self.face_recognizer = FaceRecognizer()
+        self.board_manager = BoardConnectionManager(self.db_manager)
+        self.board_relay = BoardRelayServer(self.board_manager)
+        self.gallery_store = SharedGallery()
+        self.face_recognizer = FaceRecognizer(gallery_store=self.gallery_store,
+                                              recognition_budget=RecognitionBudget())
+        self.primary_lock = PrimaryLock(PRIMARY_LOCK_FILE)
+        self.camera_scheduler = CameraStreamScheduler(self.face_recognizer, self.db_manager)
+        self.readiness = ReadinessTracker(['models', 'gallery', 'boards', 'camera_streams'])
+        self._background_started = False
         
-        # Setup
+        # Setup (slow warm-up work runs in start_background_tasks)
         self._setup_directories()
         self._setup_database()
-        self._load_known_faces()
-        self._connect_to_esp32()
         self._setup_routes()
         self._setup_api()
     
+    def start_background_tasks(self):
+        """Load models, the gallery and board connections without blocking the HTTP server."""
+        if self._background_started:
+            return
+        self._background_started = True
+        # With several worker processes, only the primary runs singleton duties
+        is_primary = self.primary_lock.try_acquire()
+        self.board_manager.persist_telemetry = is_primary
+        if not is_primary:
+            # Boards accept only a few WebSocket clients, so the primary holds them for every worker
+            self.board_manager.relay = BoardRelayClient()
+        threading.Thread(target=self._warm_up_recognition, name="warm-up-recognition", daemon=True).start()
+        threading.Thread(target=self._warm_up_boards, name="warm-up-boards", daemon=True).start()
+        if is_primary:
+            self._start_partition_maintenance()
+        else:
+            threading.Thread(target=self._wait_for_primary, name="primary-watch", daemon=True).start()
+    
+    def _warm_up_recognition(self):
+        """Load the face models and gallery, then start the camera streams."""
+        with self.readiness.track('models'):
+            self.face_recognizer.load_models()
+        with self.readiness.track('gallery'):
+            self._warm_up_gallery()
+        with self.readiness.track('camera_streams'):
+            if self.primary_lock.held:
+                self._start_camera_scheduler()
+    
+    def _warm_up_gallery(self):
+        """Map the shared gallery; the primary re-encodes it to pick up changes on disk."""
+        version = self.face_recognizer.sync_gallery()
+        if self.primary_lock.held:
+            if version:
+                # Serve the last published gallery while re-encoding
+                self.readiness.mark_ready('gallery')
+            self._load_known_faces()
+            return
+        while not version:
+            time.sleep(0.5)
+            version = self.face_recognizer.sync_gallery()
+    
+    def _wait_for_primary(self):
+        """Take over singleton duties if the primary worker exits."""
+        while not self.primary_lock.try_acquire():
+            time.sleep(PRIMARY_RETRY_INTERVAL)
+        self.board_manager.persist_telemetry = True
+        self.board_manager.relay = None
+        threading.Thread(target=self._connect_to_esp32, name="connect-boards", daemon=True).start()
+        self._start_partition_maintenance()
+        if self.readiness.wait_for(('models',)):
+            self._start_camera_scheduler()
+    
+    def _start_partition_maintenance(self):
+        """Periodically roll sensor and energy partitions over and drop expired months."""
+        def maintain():
+            while True:
+                self.db_manager.maintain_partitions()
+                time.sleep(PARTITION_MAINTENANCE_INTERVAL)
+        threading.Thread(target=maintain, name="partition-maintenance", daemon=True).start()
+    
+    def _warm_up_boards(self):
+        """Connect to the ESP32 boards (other workers reach them through the primary)."""
+        with self.readiness.track('boards'):
+            if self.primary_lock.held:
+                self._connect_to_esp32()
+    
     def _setup_directories(self):
         """Create necessary directories."""
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -46,13 +128,19 @@ class SmartEnterpriseServer:
         self.face_recognizer.load_known_faces(EMPLOYEES_FACES_FOLDER)
     
     def _connect_to_esp32(self):
-        """Establish WebSocket connection to ESP32."""
-        self.websocket_client.set_database_manager(self.db_manager)
-        self.websocket_client.connect()
+        """Establish WebSocket connections to every registered ESP32 board and relay them to other workers."""
+        self.board_relay.start()
+        self.board_manager.start()
+    
+    def _start_camera_scheduler(self):
+        """Start pulling frames from registered IP cameras."""
+        if CAMERA_SCHEDULER_ENABLED:
+            self.camera_scheduler.start()
     
     def _setup_api(self):
         """Setup API routes."""
-        api_manager = APIManager(self.face_recognizer, self.websocket_client)
+        api_manager = APIManager(self.face_recognizer, self.board_manager, self.camera_scheduler,
+                                 self.readiness)
         self.app.register_blueprint(api_manager.get_blueprint())
     
     def _setup_routes(self):
@@ -117,7 +205,31 @@ class SmartEnterpriseServer:
 
         @self.app.route('/upload', methods=['POST'])
         def upload():
-            return self._handle_upload()
+            if not self._recognition_ready():
+                return jsonify({
+                    "error": "Server is warming up",
+                    "readiness": self.readiness.status()
+                }), 503, {'Retry-After': '5'}
+            with profiler.profile_request():
+                with tracer.trace('upload', remote_addr=request.remote_addr):
+                    return self._handle_upload()
+
+    def _recognition_ready(self):
+        """Check (or, with the 'queue' policy, wait) until uploads can be recognized."""
+        if self.readiness.is_ready('models', 'gallery'):
+            return True
+        if UPLOAD_WARMUP_POLICY == 'queue':
+            return self.readiness.wait_for(('models', 'gallery'), UPLOAD_WARMUP_WAIT)
+        return False
+
+    def _motion_gate(self, door_id):
+        """Return (motion state, next capture interval) for a frame from the camera at a door."""
+        state = self.board_manager.motion_state(door_id=door_id) if MOTION_GATING_ENABLED else None
+        if state == 'motion':
+            return state, CAPTURE_INTERVAL_MOTION
+        if state == 'idle':
+            return state, CAPTURE_INTERVAL_IDLE
+        return state, CAPTURE_INTERVAL_DEFAULT
 
     def _handle_upload(self):
         """Handle file upload and face recognition."""
@@ -129,39 +241,73 @@ class SmartEnterpriseServer:
             if file.filename == '':
                 return jsonify({"error": "No file selected"}), 400
 
+            # Cameras can name the door they watch, otherwise the default board is used
+            door_id = request.args.get('door_id') or request.form.get('door_id')
+
+            # Cameras adapt their capture rate to the hint; nobody at the door means no recognition
+            motion, next_interval = self._motion_gate(door_id)
+            hint = {"X-Next-Capture-Interval": f"{next_interval:g}"}
+            tracer.annotate(motion=motion)
+            recognize = motion != 'idle' or IDLE_UPLOAD_POLICY == 'recognize'
+            if not recognize and IDLE_UPLOAD_POLICY == 'skip':
+                return jsonify({
+                    "message": "No motion at the door, frame skipped",
+                    "skipped": True,
+                    "motion": motion,
+                    "next_capture_interval": next_interval
+                }), 200, hint
+
             # Save file
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             file_extension = os.path.splitext(file.filename)[1]
             filename = f"{timestamp}{file_extension}"
             file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
+            with tracer.span('upload.save_file'):
+                file.save(file_path)
             logger.info(f"File saved: {filename}")
+            tracer.annotate(filename=filename)
+
+            if not recognize:
+                # 'store' policy: keep the frame for the record without recognizing it or touching the door
+                self.db_manager.save_photo_record(filename, [], [], False)
+                return jsonify({
+                    "message": "File uploaded successfully, not recognized (no motion)",
+                    "skipped": True,
+                    "motion": motion,
+                    "next_capture_interval": next_interval
+                }), 200, hint
 
             # Recognize faces
-            recognized_names = self.face_recognizer.recognize_faces_in_image(file_path)
+            with tracer.span('upload.recognize'):
+                faces, encodings = self.face_recognizer.analyze_faces_in_image(file_path, with_encodings=True)
+            # Faces failing the quality check are left out rather than counted as unknown
+            recognized_names = self.face_recognizer.accepted_names(faces)
             
             # Process recognition results
             access_granted = False
             if recognized_names:
                 if "Unknown" not in recognized_names:
                     logger.info(f"Access granted for: {recognized_names}")
-                    self.websocket_client.send_command('open_door')
+                    self.board_manager.send_command('open_door', door_id=door_id)
                     access_granted = True
                 else:
                     logger.warning("Unknown face detected - access denied")
-                    self.websocket_client.send_command('close_door')
+                    self.board_manager.send_command('close_door', door_id=door_id)
             else:
-                logger.info("No faces detected in image")
-                self.websocket_client.send_command('close_door')
+                logger.info("No usable faces in image")
+                self.board_manager.send_command('close_door', door_id=door_id)
             
             # Save to database
-            self.db_manager.save_photo_record(filename, recognized_names)
+            self.db_manager.save_photo_record(filename, recognized_names, faces, access_granted, encodings)
 
             return jsonify({
                 "message": "File uploaded successfully",
                 "recognized_faces": recognized_names,
-                "access_granted": access_granted
-            }), 200
+                "access_granted": access_granted,
+                "faces": faces,
+                "motion": motion,
+                "next_capture_interval": next_interval
+            }), 200, hint
 
         except Exception as e:
             logger.error(f"Error handling upload: {e}")
@@ -170,6 +316,9 @@ class SmartEnterpriseServer:
     def run(self, host='0.0.0.0', port=5000, debug=True):
         """Run the Flask application."""
         logger.info(f"Starting server on {host}:{port}")
+        # With the reloader only the child process serves requests
+        if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            self.start_background_tasks()
         self.app.run(host=host, port=port, debug=debug)
 
 # Create and run the server
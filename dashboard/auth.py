@@ -3,6 +3,7 @@ import logging
 from functools import wraps
 from flask import session, request, jsonify, redirect, url_for
 from database import DatabaseManager
+from config import ADMIN_USERNAMES
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,19 @@ class AuthManager:
             return f(*args, **kwargs)
         return decorated_function
     
+    def admin_required(self, f):
+        """Decorator to restrict routes to administrator accounts."""
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'user_id' not in session:
+                if request.is_json:
+                    return jsonify({"error": "Authentication required"}), 401
+                return redirect(url_for('login'))
+            if session.get('username') not in ADMIN_USERNAMES:
+                return jsonify({"error": "Administrator access required"}), 403
+            return f(*args, **kwargs)
+        return decorated_function
+    
     def authenticate_user(self, username, password):
         """Authenticate user with username and password."""
         if not username or not password:
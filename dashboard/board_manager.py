@@ -0,0 +1,209 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from websocket_client import WebSocketClient, decode_telemetry
+from config import (BOARD_HEALTH_CHECK_INTERVAL, BOARD_HEALTH_CHECK_WORKERS, BOARD_CONNECT_TIMEOUT,
+                    BOARD_RECEIVE_TIMEOUT, MOTION_HOLD_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+class BoardConnectionManager:
+    def __init__(self, db_manager):
+        """
+        Hold one persistent WebSocket connection per registered main board.
+
+        Every board has its own client, send lock and listener thread, so a
+        slow or unreachable board never delays commands for the others.
+        In worker processes other than the primary, relay is set and the
+        public calls below are forwarded to the primary's connections.
+        """
+        self.db_manager = db_manager
+        self.clients = {}
+        self.boards = {}
+        self.doors = {}
+        self.telemetry = {}
+        self.frame_stats = {}
+        self.last_motion = {}
+        self.default_board_id = None
+        # Only one worker process should store telemetry when serving with several
+        self.persist_telemetry = True
+        self.relay = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=BOARD_HEALTH_CHECK_WORKERS,
+                                            thread_name_prefix="board-health")
+        self._running = False
+
+    def start(self):
+        """Load boards, connect to all of them and start health checks."""
+        self.load_boards()
+        self.check_all()
+        self._running = True
+        threading.Thread(target=self._health_loop, name="board-health-loop", daemon=True).start()
+
+    def stop(self):
+        """Close every board connection."""
+        self._running = False
+        for client in list(self.clients.values()):
+            client.disconnect()
+
+    def load_boards(self):
+        """Sync connections with the boards table."""
+        if self.relay:
+            self.relay.call('load_boards')
+            return
+        rows = self.db_manager.get_all_boards()
+        added = []
+        with self._lock:
+            current = {row[0]: row for row in rows}
+            for board_id in list(self.clients):
+                if board_id not in current or current[board_id][2] != self.boards[board_id]["websocket_url"]:
+                    self.clients.pop(board_id).disconnect()
+                    self.boards.pop(board_id, None)
+                    self.telemetry.pop(board_id, None)
+                    self.frame_stats.pop(board_id, None)
+                    self.last_motion.pop(board_id, None)
+            for board_id, name, websocket_url, door_id in rows:
+                if board_id not in self.clients:
+                    client = WebSocketClient(websocket_url, board_id=board_id)
+                    client.set_database_manager(self.db_manager)
+                    client.set_message_handler(self._handle_message)
+                    self.clients[board_id] = client
+                    added.append(client)
+                self.boards[board_id] = {"id": board_id, "name": name,
+                                         "websocket_url": websocket_url, "door_id": door_id}
+            self.doors = {b["door_id"]: b["id"] for b in self.boards.values() if b["door_id"]}
+            self.default_board_id = rows[0][0] if rows else None
+        logger.info(f"Loaded {len(rows)} boards")
+        if self._running:
+            # Connect new boards in the background so the caller is never blocked
+            for client in added:
+                self._executor.submit(client.connect)
+
+    def check_all(self):
+        """Health-check (and reconnect) every board concurrently."""
+        clients = list(self.clients.values())
+        futures = [self._executor.submit(client.check_health) for client in clients]
+        wait(futures, timeout=BOARD_CONNECT_TIMEOUT * 2)
+
+    def _health_loop(self):
+        """Periodically health-check all boards."""
+        while self._running:
+            time.sleep(BOARD_HEALTH_CHECK_INTERVAL)
+            try:
+                self.check_all()
+            except Exception as e:
+                logger.error(f"Error checking board health: {e}")
+
+    def resolve_board(self, board_id=None, door_id=None):
+        """Find the board for a board ID or door ID, falling back to the default board."""
+        if board_id is not None:
+            try:
+                board_id = int(board_id)
+            except (TypeError, ValueError):
+                return None
+            return board_id if board_id in self.clients else None
+        if door_id is not None:
+            return self.doors.get(door_id)
+        return self.default_board_id
+
+    def send_command(self, command: str, board_id=None, door_id=None) -> bool:
+        """Send a command to the board that owns the given board or door."""
+        if self.relay:
+            return self.relay.call('send_command', False, command=command, board_id=board_id, door_id=door_id)
+        target = self.resolve_board(board_id, door_id)
+        client = self.clients.get(target)
+        if client is None:
+            logger.error(f"No board registered for board={board_id} door={door_id}")
+            return False
+        return client.send_command(command)
+
+    def is_connected(self, board_id=None):
+        """Check if a board (default board if omitted) is connected."""
+        if self.relay:
+            return self.relay.call('is_connected', False, board_id=board_id)
+        client = self.clients.get(board_id if board_id is not None else self.default_board_id)
+        return client is not None and client.is_connected()
+
+    def connected_count(self):
+        """Number of boards with a live connection."""
+        if self.relay:
+            return self.relay.call('connected_count', 0)
+        return sum(1 for client in list(self.clients.values()) if client.is_connected())
+
+    def registered_count(self):
+        """Number of registered boards."""
+        if self.relay:
+            return self.relay.call('registered_count', 0)
+        return len(self.clients)
+
+    def get_latest_reading(self, sensor_type, board_id=None):
+        """Latest (value, timestamp) of a sensor, or None if never received."""
+        board_id = board_id if board_id is not None else self.default_board_id
+        return self.telemetry.get(board_id, {}).get(sensor_type)
+
+    def motion_state(self, board_id=None, door_id=None):
+        """
+        'motion' or 'idle' from the PIR of the board owning a door.
+
+        Motion is held for MOTION_HOLD_SECONDS after the PIR clears. Returns
+        None when the board is unknown, disconnected or its PIR reading is stale.
+        """
+        if self.relay:
+            return self.relay.call('motion_state', board_id=board_id, door_id=door_id)
+        target = self.resolve_board(board_id, door_id)
+        reading = self.get_latest_reading('pir', target) if target is not None else None
+        now = time.time()
+        if reading is None or not self.is_connected(target) or now - reading[1] > BOARD_RECEIVE_TIMEOUT:
+            return None
+        if reading[0] or now - self.last_motion.get(target, 0) < MOTION_HOLD_SECONDS:
+            return 'motion'
+        return 'idle'
+
+    def get_status(self):
+        """Describe every board with its connection state and latest telemetry."""
+        if self.relay:
+            return self.relay.call('get_status', [])
+        with self._lock:
+            boards = list(self.boards.values())
+        status = []
+        for board in boards:
+            client = self.clients.get(board["id"])
+            readings = self.telemetry.get(board["id"], {})
+            status.append({
+                **board,
+                "connected": client is not None and client.is_connected(),
+                "last_message_at": client.last_message_at if client else None,
+                "telemetry": {sensor: (value if value == value else None)
+                              for sensor, (value, _) in readings.items()},
+                "frames_lost": self.frame_stats.get(board["id"], {}).get("lost", 0)
+            })
+        return status
+
+    def _handle_message(self, board_id, message):
+        """Route a frame from a board into the telemetry pipeline, tagged by source."""
+        frame = decode_telemetry(message)
+        if frame is None:
+            return
+        received_at = time.time()
+        board_telemetry = self.telemetry.setdefault(board_id, {})
+        for sensor_type, value in frame["readings"].items():
+            board_telemetry[sensor_type] = (value, received_at)
+        if frame["readings"].get('pir'):
+            self.last_motion[board_id] = received_at
+        if frame["seq"] is not None:
+            self._track_sequence(board_id, frame["seq"])
+
+        # DHT read failures arrive as nan
+        readings = {sensor: value for sensor, value in frame["readings"].items() if value == value}
+        if self.persist_telemetry and readings:
+            self.db_manager.save_sensor_readings(readings, board_id)
+
+    def _track_sequence(self, board_id, seq):
+        """Count telemetry frames lost between consecutive sequence numbers."""
+        stats = self.frame_stats.setdefault(board_id, {"last_seq": None, "lost": 0})
+        last_seq = stats["last_seq"]
+        # A lower number means the board restarted
+        if last_seq is not None and seq > last_seq + 1:
+            stats["lost"] += seq - last_seq - 1
+        stats["last_seq"] = seq
@@ -0,0 +1,118 @@
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+from config import BOARD_RELAY_SOCKET, BOARD_RELAY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Board manager methods the other worker processes may call on the primary
+RELAYED_CALLS = ('send_command', 'motion_state', 'is_connected', 'connected_count', 'registered_count',
+                 'get_status', 'load_boards')
+
+class _RelayHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        """Answer JSON-line calls until the client disconnects."""
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("call") not in RELAYED_CALLS:
+                    raise ValueError(f"unknown call {request.get('call')!r}")
+                method = getattr(self.server.board_manager, request["call"])
+                reply = {"result": method(**request.get("kwargs", {}))}
+            except Exception as e:
+                logger.error(f"Board relay call failed: {e}")
+                reply = {"error": str(e)}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+            self.wfile.flush()
+
+class BoardRelayServer:
+    def __init__(self, board_manager, path=BOARD_RELAY_SOCKET):
+        """
+        Serve the primary worker's board connections to the other worker processes.
+
+        ESP32 boards accept only a few WebSocket clients, so only the primary
+        connects to them. Each request is one JSON line on a Unix socket,
+        {"call": ..., "kwargs": {...}}, answered by one {"result": ...} line.
+        """
+        self.board_manager = board_manager
+        self.path = path
+        self._server = None
+
+    def start(self):
+        """Listen on the relay socket in a background thread."""
+        if self._server is not None:
+            return
+        if not hasattr(socket, 'AF_UNIX'):
+            # Windows: single-process development server only, nothing to relay for
+            return
+        # Left behind by a primary that exited; we hold the primary lock now
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, _RelayHandler)
+        self._server.daemon_threads = True
+        self._server.board_manager = self.board_manager
+        threading.Thread(target=self._server.serve_forever, name="board-relay", daemon=True).start()
+        logger.info(f"Relaying board calls on {self.path}")
+
+class BoardRelayClient:
+    def __init__(self, path=BOARD_RELAY_SOCKET, timeout=BOARD_RELAY_TIMEOUT):
+        """Call the primary worker's board manager; each thread keeps its own connection."""
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def call(self, name, default=None, **kwargs):
+        """Run a board manager method on the primary. Returns default if it cannot be reached."""
+        request = (json.dumps({"call": name, "kwargs": kwargs}) + '\n').encode()
+        # A kept connection may belong to a primary that has since exited, so retry once
+        for attempt in range(2):
+            reused = getattr(self._local, 'sock', None) is not None
+            try:
+                reader = self._connection()
+                self._local.sock.sendall(request)
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("connection closed by the primary")
+                reply = json.loads(line)
+                if "error" in reply:
+                    logger.error(f"Board call {name} failed on the primary: {reply['error']}")
+                    return default
+                return reply["result"]
+            except socket.timeout:
+                # The primary may still act on it, so never resend (e.g. a door command)
+                self._close()
+                logger.error(f"Board relay call {name} timed out")
+                return default
+            except (OSError, ValueError) as e:
+                self._close()
+                if not reused or attempt:
+                    logger.error(f"Board relay unavailable for {name}: {e}")
+                    return default
+        return default
+
+    def _connection(self):
+        if getattr(self._local, 'sock', None) is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+            self._local.reader = sock.makefile('rb')
+        return self._local.reader
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                self._local.reader.close()
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+        self._local.reader = None
@@ -0,0 +1,279 @@
+import os
+import time
+import base64
+import logging
+import datetime
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from tracing import tracer
+from config import (UPLOAD_FOLDER, CAMERA_MIN_SAMPLE_INTERVAL, CAMERA_MAX_SAMPLE_INTERVAL,
+                    CAMERA_SAMPLE_BACKOFF, CAMERA_REFRESH_INTERVAL, CAMERA_CONNECT_TIMEOUT,
+                    CAMERA_RECOGNITION_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+JPEG_START = b'\xff\xd8'
+JPEG_END = b'\xff\xd9'
+READ_CHUNK_SIZE = 16384
+MAX_FRAME_BUFFER = 4 * 1024 * 1024
+
+class CameraStream:
+    def __init__(self, camera_row):
+        """State for one registered IP camera."""
+        self.update(camera_row)
+        self.interval = CAMERA_MIN_SAMPLE_INTERVAL
+        self.next_due = 0.0
+        self.latest_frame = None
+        self.busy = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.faces_detected = 0
+        self.errors = 0
+        self.last_error = None
+        self.recognition_seconds = 0.0
+
+    def update(self, camera_row):
+        """Apply a row from the ip_cameras table."""
+        (self.id, self.name, self.ip_address, self.port, self.stream_path,
+         self.username, self.password) = camera_row[:7]
+        self.row = tuple(camera_row[:7])
+
+    def auth_header(self):
+        """Basic auth header for cameras with credentials."""
+        if not self.username:
+            return {}
+        token = base64.b64encode(f"{self.username}:{self.password or ''}".encode()).decode()
+        return {"Authorization": f"Basic {token}"}
+
+    def stats(self):
+        """Return per-camera counters."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "url": f"http://{self.ip_address}:{self.port}{self.stream_path}",
+            "connected": self.thread is not None and self.thread.is_alive() and self.last_error is None,
+            "sample_interval": round(self.interval, 2),
+            "frames_received": self.frames_received,
+            "frames_processed": self.frames_processed,
+            "faces_detected": self.faces_detected,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "recognition_seconds": round(self.recognition_seconds, 3)
+        }
+
+class CameraStreamScheduler:
+    def __init__(self, face_recognizer, db_manager, recognition_workers=CAMERA_RECOGNITION_WORKERS):
+        """
+        Pull frames from every active IP camera and run face recognition on them.
+
+        Each camera has a reader thread holding a persistent HTTP connection
+        that keeps only the latest frame. A single dispatcher hands frames to
+        a pool of recognition_workers threads, always picking the camera
+        that has been waiting longest, so cameras share the pool fairly.
+        Each recognition also takes a slot of the face recognizer's
+        RecognitionBudget, which /upload requests in every worker share.
+        """
+        self.face_recognizer = face_recognizer
+        self.db_manager = db_manager
+        self.recognition_workers = max(1, recognition_workers)
+        self.cameras = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._slots = threading.Semaphore(self.recognition_workers)
+        self._executor = None
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        """Start the refresh and dispatch threads."""
+        if self._running:
+            return
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.recognition_workers,
+                                            thread_name_prefix="recognition")
+        for target, name in ((self._refresh_loop, "camera-refresh"), (self._dispatch_loop, "camera-dispatch")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Camera stream scheduler started ({self.recognition_workers} recognition workers)")
+
+    def stop(self):
+        """Stop all camera readers and the recognition pool."""
+        with self._condition:
+            self._running = False
+            for camera in self.cameras.values():
+                camera.stop_event.set()
+            self._condition.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def refresh(self):
+        """Sync camera readers with the ip_cameras table."""
+        rows = {row[0]: row for row in self.db_manager.get_all_cameras()}
+        with self._condition:
+            for camera_id in list(self.cameras):
+                camera = self.cameras[camera_id]
+                if camera_id not in rows or tuple(rows[camera_id][:7]) != camera.row:
+                    camera.stop_event.set()
+                    del self.cameras[camera_id]
+                    logger.info(f"Stopped stream for camera {camera.name}")
+            for camera_id, row in rows.items():
+                if camera_id not in self.cameras and self._running:
+                    camera = CameraStream(row)
+                    camera.thread = threading.Thread(target=self._reader_loop, args=(camera,),
+                                                     name=f"camera-{camera_id}", daemon=True)
+                    self.cameras[camera_id] = camera
+                    camera.thread.start()
+                    logger.info(f"Started stream for camera {camera.name}")
+            self._condition.notify_all()
+
+    def get_stats(self):
+        """Return scheduler and per-camera statistics."""
+        with self._lock:
+            cameras = [c.stats() for c in self.cameras.values()]
+        return {"running": self._running, "recognition_workers": self.recognition_workers, "cameras": cameras}
+
+    def _refresh_loop(self):
+        """Periodically pick up camera CRUD changes."""
+        while self._running:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing cameras: {e}")
+            time.sleep(CAMERA_REFRESH_INTERVAL)
+
+    def _reader_loop(self, camera):
+        """Keep a persistent connection to one camera and store its latest frame."""
+        backoff = 1
+        while not camera.stop_event.is_set():
+            conn = http.client.HTTPConnection(camera.ip_address, camera.port, timeout=CAMERA_CONNECT_TIMEOUT)
+            try:
+                while not camera.stop_event.is_set():
+                    conn.request('GET', camera.stream_path, headers=camera.auth_header())
+                    response = conn.getresponse()
+                    if response.status != 200:
+                        raise ConnectionError(f"HTTP {response.status}")
+                    content_type = response.getheader('Content-Type', '')
+                    if content_type.startswith('multipart/'):
+                        self._read_mjpeg(camera, response)
+                        break
+                    # Snapshot camera: reuse the connection once the next sample is due
+                    self._store_frame(camera, response.read())
+                    camera.stop_event.wait(max(camera.next_due - time.monotonic(), camera.interval / 2))
+                    backoff = 1
+            except Exception as e:
+                camera.errors += 1
+                camera.last_error = str(e)
+                logger.warning(f"Camera {camera.name} stream error: {e}")
+            finally:
+                conn.close()
+            camera.stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _read_mjpeg(self, camera, response):
+        """Split a multipart MJPEG stream into JPEG frames by their start/end markers."""
+        buffer = b''
+        while not camera.stop_event.is_set():
+            chunk = response.read1(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ConnectionError("Stream closed")
+            buffer += chunk
+            while True:
+                start = buffer.find(JPEG_START)
+                if start < 0:
+                    buffer = buffer[-1:]
+                    break
+                end = buffer.find(JPEG_END, start + 2)
+                if end < 0:
+                    buffer = buffer[start:]
+                    break
+                self._store_frame(camera, buffer[start:end + 2])
+                buffer = buffer[end + 2:]
+            if len(buffer) > MAX_FRAME_BUFFER:
+                buffer = b''
+
+    def _store_frame(self, camera, frame):
+        """Replace the camera's pending frame; older frames are simply dropped."""
+        with self._condition:
+            camera.latest_frame = frame
+            camera.frames_received += 1
+            camera.last_error = None
+            if not camera.busy and camera.next_due <= time.monotonic():
+                self._condition.notify()
+
+    def _next_due_camera(self):
+        """Block until a camera with a frame is due, then claim it."""
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                ready = [c for c in self.cameras.values() if c.latest_frame is not None and not c.busy]
+                if ready:
+                    camera = min(ready, key=lambda c: c.next_due)
+                    if camera.next_due <= now:
+                        camera.busy = True
+                        return camera
+                    self._condition.wait(camera.next_due - now)
+                else:
+                    self._condition.wait(1.0)
+        return None
+
+    def _dispatch_loop(self):
+        """Hand due frames to the recognition pool, never more than it has workers."""
+        while self._running:
+            self._slots.acquire()
+            camera = self._next_due_camera()
+            if camera is None:
+                self._slots.release()
+                break
+            try:
+                self._executor.submit(self._process_frame, camera)
+            except RuntimeError:
+                self._release(camera)
+                break
+
+    def _process_frame(self, camera):
+        """Run recognition on the camera's latest frame and adapt its sample rate."""
+        try:
+            with self._lock:
+                frame, camera.latest_frame = camera.latest_frame, None
+            started = time.monotonic()
+            with tracer.trace('camera_stream', camera=camera.name):
+                faces, encodings = self.face_recognizer.analyze_faces_in_bytes(
+                    frame, source=f"camera {camera.name}", with_encodings=True)
+            recognized_names = self.face_recognizer.accepted_names(faces)
+            camera.recognition_seconds += time.monotonic() - started
+            camera.frames_processed += 1
+
+            if recognized_names:
+                camera.faces_detected += len(recognized_names)
+                camera.interval = CAMERA_MIN_SAMPLE_INTERVAL
+                self._save_frame(camera, frame, recognized_names, faces, encodings)
+            else:
+                camera.interval = min(camera.interval * CAMERA_SAMPLE_BACKOFF, CAMERA_MAX_SAMPLE_INTERVAL)
+        except Exception as e:
+            camera.errors += 1
+            logger.error(f"Error processing frame from camera {camera.name}: {e}")
+        finally:
+            self._release(camera)
+
+    def _release(self, camera):
+        """Return the camera to the schedule and free its recognition slot."""
+        with self._condition:
+            camera.busy = False
+            camera.next_due = time.monotonic() + camera.interval
+            self._condition.notify()
+        self._slots.release()
+
+    def _save_frame(self, camera, frame, recognized_names, faces=None, encodings=None):
+        """Store frames with faces in the access history."""
+        # Milliseconds plus the camera's frame count keep names unique within a second
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        filename = f"{timestamp}_cam{camera.id}_{camera.frames_processed}.jpg"
+        with open(os.path.join(UPLOAD_FOLDER, filename), 'wb') as f:
+            f.write(frame)
+        self.db_manager.save_photo_record(filename, recognized_names, faces, encodings=encodings)
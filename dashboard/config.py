@@ -1,5 +1,107 @@
+import os
+
 # Configuration
 ESP32_WEBSOCKET_URL = "ws://192.168.1.100/ws"
 UPLOAD_FOLDER = './accessHistory'
 EMPLOYEES_FACES_FOLDER = './employees'
-DATABASE_FILE = 'entreprise.db'
\ No newline at end of file
+DATABASE_FILE = 'entreprise.db'
+ADMIN_USERNAMES = ['admin']
+
+# Tracing and profiling
+SLOW_TRACE_THRESHOLD_MS = 1000
+SLOW_TRACE_LOG_FILE = './logs/slow_traces.log'
+SLOW_TRACE_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_TRACE_LOG_BACKUPS = 5
+PROFILE_FOLDER = './profiles'
+
+# IP camera stream scheduler
+CAMERA_SCHEDULER_ENABLED = True
+CAMERA_MIN_SAMPLE_INTERVAL = 1.0    # seconds between recognitions while faces are present
+CAMERA_MAX_SAMPLE_INTERVAL = 10.0   # seconds between recognitions on an idle camera
+CAMERA_SAMPLE_BACKOFF = 1.5         # interval multiplier after a frame without faces
+CAMERA_REFRESH_INTERVAL = 30        # seconds between re-reading the ip_cameras table
+CAMERA_CONNECT_TIMEOUT = 5
+# Recognitions running at once across every worker process, /upload and camera frames alike.
+# Each holds one of these slots (lock files in RECOGNITION_SLOTS_FOLDER) for its detection and encoding.
+RECOGNITION_CPU_BUDGET = os.cpu_count() or 1
+RECOGNITION_SLOTS_FOLDER = './recognition_slots'
+# Camera frames recognized at once on the primary; at most half the budget, so uploads always find a slot
+CAMERA_RECOGNITION_WORKERS = max(1, RECOGNITION_CPU_BUDGET // 2)
+
+# Main board connections
+BOARD_CONNECT_TIMEOUT = 5          # seconds to wait when (re)connecting to a board
+BOARD_RECEIVE_TIMEOUT = 15         # boards send telemetry every second, so silence means a dead link
+BOARD_HEALTH_CHECK_INTERVAL = 10   # seconds between concurrent health checks
+BOARD_HEALTH_CHECK_WORKERS = 16
+
+# Motion gating of /upload: the door's main board PIR decides whether camera frames are recognized
+MOTION_GATING_ENABLED = True
+MOTION_HOLD_SECONDS = 10          # motion still counts this long after the PIR clears
+IDLE_UPLOAD_POLICY = 'store'      # frames without motion: 'store' saves them unrecognized, 'recognize' processes
+                                  # them as usual, 'skip' drops them (loses a frame taken just before the PIR fires)
+CAPTURE_INTERVAL_MOTION = 1.0     # next-capture hint (seconds) sent to cameras while someone is at the door
+# ... while the corridor is empty. The server cannot wake a camera early, so this bounds how long someone
+# arriving between two captures waits; keep it at most the cameras' own 10 s interval.
+CAPTURE_INTERVAL_IDLE = 10.0
+CAPTURE_INTERVAL_DEFAULT = 10.0   # ... when no fresh PIR reading is available
+
+# Startup
+UPLOAD_WARMUP_POLICY = 'queue'   # 'queue' holds uploads until recognition is ready, 'reject' answers 503 at once
+UPLOAD_WARMUP_WAIT = 20          # seconds a queued upload may wait before being rejected
+
+# Multi-process serving (gunicorn -c gunicorn.conf.py wsgi:app)
+GALLERY_FOLDER = './gallery'            # shared, memory-mapped face gallery
+PRIMARY_LOCK_FILE = './primary.lock'    # the worker holding it runs camera streams and stores telemetry
+PRIMARY_RETRY_INTERVAL = 30
+BOARD_RELAY_SOCKET = './board_relay.sock'  # only the primary connects to boards; other workers relay through it
+BOARD_RELAY_TIMEOUT = 2 * BOARD_CONNECT_TIMEOUT
+SERVING_BIND = '0.0.0.0:5000'
+SERVING_WORKERS = 4
+SERVING_THREADS = 16                    # energy long-polls park most of them on a condition, not the CPU
+
+# API response cache (seconds); writes also invalidate the affected responses
+# Next to this file, so every worker shares it whatever directory the server is started from
+CACHE_GENERATIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache_generations')
+CACHE_TTL_ENERGY = 30
+CACHE_TTL_EMPLOYEES = 300
+CACHE_TTL_CAMERAS = 300
+CACHE_TTL_STATUS = 5
+# Responses kept per process, one per endpoint and query string
+CACHE_MAX_ENTRIES = 256
+# Waiters wake at once on writes in their own process and notice other workers' writes within this (seconds)
+CACHE_CHANGE_POLL_INTERVAL = 0.5
+
+# Energy event feed: long-poll requests wait this long (seconds) for new events
+ENERGY_EVENTS_WAIT = 25
+ENERGY_EVENTS_BATCH = 100
+# Each waiting request holds a serving thread, so a quarter of SERVING_THREADS stays free for other
+# requests; beyond this many waiters per process, requests get 429 and retry after ENERGY_EVENTS_RETRY_AFTER
+ENERGY_EVENTS_MAX_WAITERS = SERVING_THREADS * 3 // 4
+ENERGY_EVENTS_RETRY_AFTER = 5
+
+# Sensor and energy history is kept in monthly partitions; older months are dropped (0 keeps everything)
+SENSOR_DATA_RETENTION_MONTHS = 6
+ENERGY_USAGE_RETENTION_MONTHS = 24
+PARTITION_MAINTENANCE_INTERVAL = 3600  # seconds between retention checks on the primary worker
+
+# History export (/api/export/<dataset> and export_history.py): rows read and written per chunk
+EXPORT_BATCH_SIZE = 2000
+
+# Face quality check between detection and encoding:
+# 'reject' skips faces below the thresholds, 'report' only scores them, 'off' disables it
+FACE_QUALITY_POLICY = 'reject'
+FACE_MIN_SIZE = 40  # pixels, shorter side of the face box
+FACE_MIN_SHARPNESS = 25.0  # Laplacian variance at a fixed face scale
+FACE_MIN_BRIGHTNESS = 40  # mean gray level, 0-255
+FACE_MAX_BRIGHTNESS = 220
+
+# Bulk employee enrollment
+ENROLLMENT_WORKERS = os.cpu_count() or 2
+ENROLLMENT_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+ENROLLMENT_MANIFEST = 'manifest.csv'
+
+# Re-scoring stored frames after gallery or tolerance changes (rescore_frames.py, /api/rescore)
+RESCORE_WORKERS = os.cpu_count() or 2
+RESCORE_BATCH_SIZE = 200          # frames per write transaction and resume checkpoint
+RESCORE_STALE_SECONDS = 300       # a 'running' job without a heartbeat for this long can be taken over
+RESCORE_HEARTBEAT_INTERVAL = 30   # seconds between liveness updates of a running job, however slow its batch
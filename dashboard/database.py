@@ -1,13 +1,22 @@
+import json
 import sqlite3
 import logging
 import hashlib
-from config import DATABASE_FILE
+import datetime
+import config
+from config import DATABASE_FILE, SENSOR_DATA_RETENTION_MONTHS, ENERGY_USAGE_RETENTION_MONTHS, EXPORT_BATCH_SIZE
+from partitions import PartitionManager
+from tracing import traced
+from vision import pack_faces
+from response_cache import response_cache
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
     def __init__(self):
         self.db_file = DATABASE_FILE
+        self.partitions = PartitionManager({'sensor_data': SENSOR_DATA_RETENTION_MONTHS,
+                                            'energy_usage': ENERGY_USAGE_RETENTION_MONTHS})
 
     def _get_connection(self):
         """Get a database connection."""
@@ -64,13 +73,15 @@ class DatabaseManager:
                 )
             ''')
             
-            # Sensor data table
+            # Main boards table
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sensor_data (
+                CREATE TABLE IF NOT EXISTS boards (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sensor_type TEXT NOT NULL,
-                    value REAL NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                    name TEXT NOT NULL,
+                    websocket_url TEXT NOT NULL UNIQUE,
+                    door_id TEXT UNIQUE,
+                    is_active BOOLEAN DEFAULT 1,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
             
@@ -85,16 +96,8 @@ class DatabaseManager:
                 )
             ''')
             
-            # Energy usage table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS energy_usage (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    device_name TEXT NOT NULL,
-                    state TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    duration_minutes REAL DEFAULT 0
-                )
-            ''')
+            # Sensor data and energy usage tables, stored as monthly partitions behind views
+            self.partitions.setup(cursor)
             
             # Device status table
             cursor.execute('''
@@ -106,6 +109,96 @@ class DatabaseManager:
                 )
             ''')
             
+            # One row per face found in a photo, so per-employee history is an index lookup
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'photo_faces'")
+            backfill_photo_faces = cursor.fetchone() is None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS photo_faces (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    photo_id INTEGER NOT NULL REFERENCES photos(id),
+                    employee_id INTEGER REFERENCES employees(id),
+                    name TEXT,
+                    distance REAL,
+                    box TEXT,
+                    decision TEXT NOT NULL,
+                    timestamp DATETIME
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_photo_faces_employee_time ON photo_faces (employee_id, timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_photo_faces_time ON photo_faces (timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_photo_faces_photo ON photo_faces (photo_id)')
+            if backfill_photo_faces:
+                self._backfill_photo_faces(cursor)
+            
+            # Daily first-in/last-seen per employee, kept up to date as access is granted
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'attendance'")
+            backfill_attendance = cursor.fetchone() is None
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS attendance (
+                    employee_id INTEGER NOT NULL REFERENCES employees(id),
+                    day TEXT NOT NULL,
+                    first_seen DATETIME NOT NULL,
+                    last_seen DATETIME NOT NULL,
+                    sightings INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (employee_id, day)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_day ON attendance (day, employee_id)')
+            if backfill_attendance:
+                self._backfill_attendance(cursor)
+            
+            # Face boxes, quality and encodings of stored frames, so re-scoring can skip detection
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS photo_encodings (
+                    photo_id INTEGER PRIMARY KEY REFERENCES photos(id),
+                    faces TEXT NOT NULL,
+                    encodings BLOB
+                )
+            ''')
+            
+            # Background bulk enrollments; report holds the JSON result once done
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS enrollment_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    dry_run INTEGER NOT NULL DEFAULT 0,
+                    report TEXT,
+                    error TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME
+                )
+            ''')
+            
+            # Re-scoring jobs; last_photo_id is the resume checkpoint
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS rescore_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scope TEXT NOT NULL,
+                    tolerance REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    last_photo_id INTEGER NOT NULL DEFAULT 0,
+                    max_photo_id INTEGER NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    changed INTEGER NOT NULL DEFAULT 0,
+                    missing INTEGER NOT NULL DEFAULT 0,
+                    cached INTEGER NOT NULL DEFAULT 0,
+                    rate REAL,
+                    error TEXT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    finished_at DATETIME
+                )
+            ''')
+            
+            # Register the configured board so single-board setups keep working. The URL is
+            # read now rather than at import so overrides (e.g. by the benchmarks) apply.
+            cursor.execute('SELECT COUNT(*) FROM boards')
+            if cursor.fetchone()[0] == 0:
+                cursor.execute('INSERT INTO boards (name, websocket_url, door_id) VALUES (?, ?, ?)',
+                               ('Main board', config.ESP32_WEBSOCKET_URL, 'main'))
+                logger.info(f"Registered default board: {config.ESP32_WEBSOCKET_URL}")
+            
             # Initialize default device states
             cursor.execute('SELECT COUNT(*) FROM device_status')
             status_count = cursor.fetchone()[0]
@@ -130,26 +223,385 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
     
-    def save_photo_record(self, filename: str, recognized_names: list):
-        """Save photo record to database."""
+    def _backfill_photo_faces(self, cursor, batch_size=10000):
+        """Split the names stored in photos.recognized_faces into photo_faces rows."""
+        cursor.execute('SELECT name, MAX(id) FROM employees GROUP BY name')
+        employee_ids = dict(cursor.fetchall())
+        photos = cursor.connection.execute(
+            "SELECT id, recognized_faces, timestamp FROM photos "
+            "WHERE recognized_faces IS NOT NULL AND recognized_faces != 'None'")
+        total = 0
+        while True:
+            batch = photos.fetchmany(batch_size)
+            if not batch:
+                break
+            rows = []
+            for photo_id, recognized_faces, timestamp in batch:
+                for name in recognized_faces.split(', '):
+                    decision = 'unknown' if name == 'Unknown' else 'recognized'
+                    rows.append((photo_id, employee_ids.get(name) if decision == 'recognized' else None,
+                                 name, decision, timestamp))
+            cursor.executemany('INSERT INTO photo_faces (photo_id, employee_id, name, decision, timestamp) '
+                               'VALUES (?, ?, ?, ?, ?)', rows)
+            total += len(rows)
+        logger.info(f"Backfilled {total} photo_faces rows")
+    
+    def _backfill_attendance(self, cursor):
+        """Build attendance from uploads where every face was recognized (i.e. access was granted)."""
+        cursor.execute('''
+            INSERT INTO attendance (employee_id, day, first_seen, last_seen, sightings)
+            SELECT pf.employee_id, date(pf.timestamp, 'localtime'), MIN(datetime(pf.timestamp, 'localtime')),
+                   MAX(datetime(pf.timestamp, 'localtime')), COUNT(*)
+            FROM photo_faces pf JOIN photos p ON p.id = pf.photo_id
+            WHERE pf.decision = 'recognized' AND pf.employee_id IS NOT NULL
+              AND p.filename NOT LIKE '%\\_cam%' ESCAPE '\\'
+              AND NOT EXISTS (SELECT 1 FROM photo_faces other
+                              WHERE other.photo_id = pf.photo_id AND other.decision = 'unknown')
+            GROUP BY pf.employee_id, date(pf.timestamp, 'localtime')
+        ''')
+        logger.info(f"Backfilled {cursor.rowcount} attendance rows")
+    
+    @staticmethod
+    def _face_rows(recognized_names, faces):
+        """Build (name, distance, box, decision) tuples for photo_faces."""
+        if faces is None:
+            return [(name, None, None, 'unknown' if name == 'Unknown' else 'recognized')
+                    for name in recognized_names]
+        rows = []
+        for face in faces:
+            box = ','.join(str(v) for v in face["box"])
+            if not face["accepted"]:
+                rows.append((None, None, box, 'rejected'))
+            else:
+                decision = 'unknown' if face["name"] == 'Unknown' else 'recognized'
+                rows.append((face["name"], face.get("distance"), box, decision))
+        return rows
+    
+    @staticmethod
+    def _insert_face_rows(cursor, photo_id, rows):
+        """Insert photo_faces rows for a photo, resolving recognized names to employee ids."""
+        # The face rows share the photo's timestamp so the employee/time index covers history lookups
+        cursor.executemany('''
+            INSERT INTO photo_faces (photo_id, employee_id, name, distance, box, decision, timestamp)
+            SELECT id, CASE WHEN ? = 'recognized' THEN
+                (SELECT MAX(id) FROM employees WHERE name = ? AND is_active = 1) END,
+                ?, ?, ?, ?, timestamp
+            FROM photos WHERE id = ?
+        ''', [(decision, name, name, distance, box, decision, photo_id)
+              for name, distance, box, decision in rows])
+    
+    @traced('db.save_photo_record')
+    def save_photo_record(self, filename: str, recognized_names: list, faces=None, access_granted=False,
+                          encodings=None):
+        """
+        Save photo record to database.
+        
+        faces, as returned by FaceRecognizer.analyze_faces_*, adds the
+        distance, box and decision of every detected face to photo_faces.
+        encodings, those of the accepted faces, are cached in
+        photo_encodings so re-scoring the frame needs no detection.
+        With access_granted, the recognized employees' attendance for the
+        day is updated in the same transaction.
+        Returns the photo id, or None on failure.
+        """
         try:
             conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            faces_str = ', '.join(recognized_names) if recognized_names else 'None'
-            cursor.execute(
-                'INSERT INTO photos (filename, recognized_faces) VALUES (?, ?)',
-                (filename, faces_str)
-            )
-            conn.commit()
+            with conn:
+                cursor = conn.cursor()
+                faces_str = ', '.join(recognized_names) if recognized_names else 'None'
+                cursor.execute(
+                    'INSERT INTO photos (filename, recognized_faces) VALUES (?, ?)',
+                    (filename, faces_str)
+                )
+                photo_id = cursor.lastrowid
+                self._insert_face_rows(cursor, photo_id, self._face_rows(recognized_names, faces))
+                if faces is not None and encodings is not None:
+                    cursor.execute('INSERT INTO photo_encodings (photo_id, faces, encodings) VALUES (?, ?, ?)',
+                                   (photo_id, *pack_faces(faces, encodings)))
+                if access_granted:
+                    cursor.execute('''
+                        INSERT INTO attendance (employee_id, day, first_seen, last_seen)
+                        SELECT employee_id, date(timestamp, 'localtime'), datetime(timestamp, 'localtime'),
+                               datetime(timestamp, 'localtime')
+                        FROM photo_faces
+                        WHERE photo_id = ? AND decision = 'recognized' AND employee_id IS NOT NULL
+                        ON CONFLICT (employee_id, day) DO UPDATE SET
+                            first_seen = MIN(first_seen, excluded.first_seen),
+                            last_seen = MAX(last_seen, excluded.last_seen),
+                            sightings = sightings + 1
+                    ''', (photo_id,))
             conn.close()
             logger.info(f"Photo record saved: {filename}")
+            return photo_id
         except Exception as e:
             logger.error(f"Error saving photo record: {e}")
+            return None
+    
+    # Jobs without a heartbeat within the stale interval lost their runner
+    _ACTIVE_RESCORE_JOB = "status IN ('running', 'stopping') AND updated_at >= datetime('now', ?)"
+    
+    def _rescore_filter(self, scope):
+        """SQL condition on photos selecting the frames a re-scoring scope covers."""
+        return "recognized_faces LIKE '%Unknown%'" if scope == 'unknown' else '1'
+    
+    def create_rescore_job(self, scope, tolerance, stale_seconds):
+        """
+        Create a running re-scoring job over the photos stored so far. Returns its id.
+        
+        Returns None while another job is running or stopping and has
+        had a heartbeat within stale_seconds; older ones are paused.
+        """
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                # Serialize with other processes creating or claiming jobs
+                conn.execute('BEGIN IMMEDIATE')
+                cursor = conn.cursor()
+                cursor.execute(f'SELECT id FROM rescore_jobs WHERE {self._ACTIVE_RESCORE_JOB}',
+                               (f'-{int(stale_seconds)} seconds',))
+                active = cursor.fetchone()
+                if active:
+                    job_id = None
+                    logger.warning(f"Rescore job {active[0]} is still running")
+                else:
+                    cursor.execute('''
+                        UPDATE rescore_jobs SET status = 'paused', updated_at = datetime('now')
+                        WHERE status IN ('running', 'stopping')
+                    ''')
+                    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM photos')
+                    max_photo_id = cursor.fetchone()[0]
+                    cursor.execute(f'SELECT COUNT(*) FROM photos WHERE id <= ? AND {self._rescore_filter(scope)}',
+                                   (max_photo_id,))
+                    total = cursor.fetchone()[0]
+                    cursor.execute('''
+                        INSERT INTO rescore_jobs (scope, tolerance, status, max_photo_id, total)
+                        VALUES (?, ?, 'running', ?, ?)
+                    ''', (scope, tolerance, max_photo_id, total))
+                    job_id = cursor.lastrowid
+            conn.close()
+            return job_id
+        except Exception as e:
+            logger.error(f"Error creating rescore job: {e}")
+            return None
+    
+    def get_rescore_job(self, job_id=None):
+        """Get a re-scoring job as a dict (the latest one if no id is given)."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            conn.row_factory = sqlite3.Row
+            if job_id is None:
+                row = conn.execute('SELECT * FROM rescore_jobs ORDER BY id DESC LIMIT 1').fetchone()
+            else:
+                row = conn.execute('SELECT * FROM rescore_jobs WHERE id = ?', (job_id,)).fetchone()
+            conn.close()
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error getting rescore job: {e}")
+            return None
+    
+    def get_active_rescore_job(self, stale_seconds):
+        """Get the job that is running or stopping and had a heartbeat within stale_seconds, if any."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(f'SELECT * FROM rescore_jobs WHERE {self._ACTIVE_RESCORE_JOB} ORDER BY id DESC',
+                               (f'-{int(stale_seconds)} seconds',)).fetchone()
+            conn.close()
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Error getting active rescore job: {e}")
+            return None
+    
+    def claim_rescore_job(self, job_id, stale_seconds):
+        """Mark a job running unless a live process is running it or another job. Returns True if claimed."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                stale = f'-{int(stale_seconds)} seconds'
+                cursor = conn.execute(f'''
+                    UPDATE rescore_jobs SET status = 'running', error = NULL, updated_at = datetime('now')
+                    WHERE id = ? AND status != 'finished'
+                      AND (status NOT IN ('running', 'stopping') OR updated_at < datetime('now', ?))
+                      AND NOT EXISTS (SELECT 1 FROM rescore_jobs WHERE id != ? AND {self._ACTIVE_RESCORE_JOB})
+                ''', (job_id, stale, job_id, stale))
+                claimed = cursor.rowcount == 1
+            conn.close()
+            return claimed
+        except Exception as e:
+            logger.error(f"Error claiming rescore job: {e}")
+            return False
+    
+    def set_rescore_job_status(self, job_id, status, error=None, only_if=None):
+        """Change a job's status, optionally only from one of the given statuses. Returns True if changed."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                query = '''
+                    UPDATE rescore_jobs SET status = ?, error = ?, updated_at = datetime('now'),
+                        finished_at = CASE WHEN ? = 'finished' THEN datetime('now') END
+                    WHERE id = ?
+                '''
+                params = [status, error, status, job_id]
+                if only_if:
+                    query += f" AND status IN ({','.join('?' * len(only_if))})"
+                    params.extend(only_if)
+                changed = conn.execute(query, params).rowcount == 1
+            conn.close()
+            return changed
+        except Exception as e:
+            logger.error(f"Error updating rescore job: {e}")
+            return False
+    
+    def touch_rescore_job(self, job_id):
+        """Record that a running or stopping job's runner is still alive."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                conn.execute("UPDATE rescore_jobs SET updated_at = datetime('now') "
+                             "WHERE id = ? AND status IN ('running', 'stopping')", (job_id,))
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error updating rescore job: {e}")
+    
+    def get_rescore_batch(self, scope, after_id, max_id, limit):
+        """Get the next frames to re-score with their current names and cached encodings."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            rows = conn.execute(f'''
+                SELECT p.id, p.filename, p.recognized_faces, e.faces, e.encodings
+                FROM photos p LEFT JOIN photo_encodings e ON e.photo_id = p.id
+                WHERE p.id > ? AND p.id <= ? AND {self._rescore_filter(scope)}
+                ORDER BY p.id LIMIT ?
+            ''', (after_id, max_id, limit)).fetchall()
+            conn.close()
+            return rows
+        except Exception as e:
+            logger.error(f"Error getting rescore batch: {e}")
+            return []
+    
+    def save_rescore_batch(self, job_id, results, last_photo_id, counts, rate):
+        """
+        Write re-scored frames and advance the job's checkpoint in one transaction.
+        
+        results holds dicts with photo_id, names, faces and, for newly
+        encoded frames, cache = (faces json, encodings blob). counts adds
+        to the job's processed/changed/missing/cached counters.
+        """
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                cursor = conn.cursor()
+                for result in results:
+                    photo_id = result["photo_id"]
+                    if result.get("cache"):
+                        cursor.execute('INSERT OR REPLACE INTO photo_encodings (photo_id, faces, encodings) '
+                                       'VALUES (?, ?, ?)', (photo_id, *result["cache"]))
+                    if not result.get("changed"):
+                        continue
+                    names = result["names"]
+                    cursor.execute('UPDATE photos SET recognized_faces = ? WHERE id = ?',
+                                   (', '.join(names) if names else 'None', photo_id))
+                    cursor.execute('DELETE FROM photo_faces WHERE photo_id = ?', (photo_id,))
+                    self._insert_face_rows(cursor, photo_id, self._face_rows(names, result["faces"]))
+                cursor.execute('''
+                    UPDATE rescore_jobs SET last_photo_id = ?, processed = processed + ?, changed = changed + ?,
+                        missing = missing + ?, cached = cached + ?, rate = ?, updated_at = datetime('now')
+                    WHERE id = ?
+                ''', (last_photo_id, counts["processed"], counts["changed"], counts["missing"],
+                      counts["cached"], rate, job_id))
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error saving rescore batch: {e}")
+            return False
     
+    @traced('db.get_employee_access_history')
+    def get_employee_access_history(self, employee_id, since=None, until=None, limit=100):
+        """Get an employee's recognitions, newest first, optionally within [since, until)."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            query = '''
+                SELECT pf.id, pf.photo_id, p.filename, pf.timestamp, pf.distance, pf.box
+                FROM photo_faces pf JOIN photos p ON p.id = pf.photo_id
+                WHERE pf.employee_id = ?
+            '''
+            params = [employee_id]
+            if since:
+                query += ' AND pf.timestamp >= ?'
+                params.append(since)
+            if until:
+                query += ' AND pf.timestamp < ?'
+                params.append(until)
+            query += ' ORDER BY pf.timestamp DESC LIMIT ?'
+            params.append(limit)
+            cursor.execute(query, params)
+            records = cursor.fetchall()
+            conn.close()
+            return records
+        except Exception as e:
+            logger.error(f"Error getting access history: {e}")
+            return []
+    
+    @traced('db.get_attendance')
+    def get_attendance(self, start_day, end_day, employee_id=None, limit=100, offset=0):
+        """
+        Get daily attendance rows between two days (inclusive, 'YYYY-MM-DD').
+        
+        Returns (rows, total) where rows are (employee_id, name, national_id,
+        day, first_seen, last_seen, sightings), newest day first.
+        """
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            where = 'a.day BETWEEN ? AND ?'
+            params = [start_day, end_day]
+            if employee_id is not None:
+                where += ' AND a.employee_id = ?'
+                params.append(employee_id)
+            cursor.execute(f'SELECT COUNT(*) FROM attendance a WHERE {where}', params)
+            total = cursor.fetchone()[0]
+            cursor.execute(f'''
+                SELECT a.employee_id, e.name, e.national_id, a.day, a.first_seen, a.last_seen, a.sightings
+                FROM attendance a JOIN employees e ON e.id = a.employee_id
+                WHERE {where}
+                ORDER BY a.day DESC, e.name
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset])
+            rows = cursor.fetchall()
+            conn.close()
+            return rows, total
+        except Exception as e:
+            logger.error(f"Error getting attendance: {e}")
+            return [], 0
+    
+    @traced('db.get_attendance_summary')
+    def get_attendance_summary(self, start_day, end_day):
+        """Per-employee days present, earliest arrival and latest departure between two days."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT a.employee_id, e.name, e.national_id, COUNT(*),
+                       MIN(time(a.first_seen)), MAX(time(a.last_seen)), SUM(a.sightings)
+                FROM attendance a JOIN employees e ON e.id = a.employee_id
+                WHERE a.day BETWEEN ? AND ?
+                GROUP BY a.employee_id
+                ORDER BY e.name
+            ''', (start_day, end_day))
+            rows = cursor.fetchall()
+            conn.close()
+            return rows
+        except Exception as e:
+            logger.error(f"Error getting attendance summary: {e}")
+            return []
+    
+    @traced('db.save_energy_event')
     def save_energy_event(self, device_name, state, timestamp=None):
         """Save energy usage event to database."""
         try:
             conn = sqlite3.connect(self.db_file)
+            self.partitions.ensure_current(conn)
             cursor = conn.cursor()
             
             if timestamp:
@@ -165,10 +617,12 @@ class DatabaseManager:
             
             conn.commit()
             conn.close()
+            response_cache.invalidate('energy')
             logger.info(f"Energy event saved: {device_name} - {state}")
         except Exception as e:
             logger.error(f"Error saving energy event: {e}")
     
+    @traced('db.get_user_by_username')
     def get_user_by_username(self, username):
         """Get user by username."""
         try:
@@ -185,6 +639,7 @@ class DatabaseManager:
             logger.error(f"Error getting user: {e}")
             return None
     
+    @traced('db.get_all_photos')
     def get_all_photos(self):
         """Get all photos from database."""
         try:
@@ -198,6 +653,7 @@ class DatabaseManager:
             logger.error(f"Error getting photos: {e}")
             return []
     
+    @traced('db.get_all_cameras')
     def get_all_cameras(self):
         """Get all cameras from database."""
         try:
@@ -211,6 +667,77 @@ class DatabaseManager:
             logger.error(f"Error getting cameras: {e}")
             return []
     
+    @traced('db.get_all_boards')
+    def get_all_boards(self):
+        """Get all active main boards from database."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name, websocket_url, door_id FROM boards WHERE is_active = 1 ORDER BY id')
+            boards = cursor.fetchall()
+            conn.close()
+            return boards
+        except Exception as e:
+            logger.error(f"Error getting boards: {e}")
+            return []
+    
+    @traced('db.add_board')
+    def add_board(self, name, websocket_url, door_id=None):
+        """Register a main board and return its ID."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO boards (name, websocket_url, door_id) VALUES (?, ?, ?)',
+                           (name, websocket_url, door_id))
+            conn.commit()
+            logger.info(f"Board added: {name} ({websocket_url})")
+            return cursor.lastrowid
+        finally:
+            conn.close()
+    
+    @traced('db.delete_board')
+    def delete_board(self, board_id):
+        """Remove a main board. Returns True if it existed."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM boards WHERE id = ?', (board_id,))
+            deleted = cursor.rowcount > 0
+            conn.commit()
+            conn.close()
+            return deleted
+        except Exception as e:
+            logger.error(f"Error deleting board: {e}")
+            return False
+    
+    @traced('db.save_sensor_data')
+    def save_sensor_data(self, sensor_type, value, board_id=None):
+        """Save a sensor reading received from a main board."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            self.partitions.ensure_current(conn)
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO sensor_data (sensor_type, value, board_id) VALUES (?, ?, ?)',
+                           (sensor_type, value, board_id))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error saving sensor data: {e}")
+    
+    @traced('db.save_sensor_readings')
+    def save_sensor_readings(self, readings, board_id=None):
+        """Save several readings from one telemetry frame in a single transaction."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            self.partitions.ensure_current(conn)
+            with conn:
+                conn.executemany('INSERT INTO sensor_data (sensor_type, value, board_id) VALUES (?, ?, ?)',
+                                 [(sensor_type, value, board_id) for sensor_type, value in readings.items()])
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error saving sensor data: {e}")
+    
+    @traced('db.get_all_employees')
     def get_all_employees(self):
         """Get all employees from database."""
         try:
@@ -224,24 +751,110 @@ class DatabaseManager:
             logger.error(f"Error getting employees: {e}")
             return []
     
+    @traced('db.get_existing_national_ids')
+    def get_existing_national_ids(self, national_ids):
+        """Return which of the given national IDs are already registered (active or not)."""
+        national_ids = list(national_ids)
+        existing = set()
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            # Stay below SQLite's limit on bound parameters
+            for start in range(0, len(national_ids), 500):
+                chunk = national_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'SELECT national_id FROM employees WHERE national_id IN ({placeholders})', chunk)
+                existing.update(row[0] for row in cursor.fetchall())
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error checking national IDs: {e}")
+        return existing
+    
+    @traced('db.add_employees')
+    def add_employees(self, employees):
+        """Insert (name, national_id) pairs in one transaction. Returns their ids, or None if it failed."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            try:
+                with conn:
+                    cursor = conn.cursor()
+                    ids = []
+                    for name, national_id in employees:
+                        cursor.execute('INSERT INTO employees (name, national_id) VALUES (?, ?)', (name, national_id))
+                        ids.append(cursor.lastrowid)
+            finally:
+                conn.close()
+            logger.info(f"Added {len(ids)} employees")
+            return ids
+        except Exception as e:
+            logger.error(f"Error adding employees: {e}")
+            return None
+    
+    def create_enrollment_job(self, dry_run=False):
+        """Record a bulk enrollment started in the background. Returns its id."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                job_id = conn.execute('INSERT INTO enrollment_jobs (dry_run) VALUES (?)', (int(dry_run),)).lastrowid
+            conn.close()
+            return job_id
+        except Exception as e:
+            logger.error(f"Error creating enrollment job: {e}")
+            return None
+    
+    def finish_enrollment_job(self, job_id, report=None, error=None):
+        """Store a bulk enrollment's report, or its error if it failed."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            with conn:
+                conn.execute('''
+                    UPDATE enrollment_jobs SET status = ?, report = ?, error = ?, finished_at = datetime('now')
+                    WHERE id = ?
+                ''', ('failed' if error else 'finished', json.dumps(report) if report is not None else None,
+                      error, job_id))
+            conn.close()
+            return True
+        except Exception as e:
+            logger.error(f"Error finishing enrollment job: {e}")
+            return False
+    
+    def get_enrollment_job(self, job_id):
+        """Get a bulk enrollment job as a dict with its decoded report, or None."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM enrollment_jobs WHERE id = ?', (job_id,)).fetchone()
+            conn.close()
+            if not row:
+                return None
+            job = dict(row)
+            job["dry_run"] = bool(job["dry_run"])
+            job["report"] = json.loads(job["report"]) if job["report"] else None
+            return job
+        except Exception as e:
+            logger.error(f"Error getting enrollment job: {e}")
+            return None
+    
+    @traced('db.get_energy_usage')
     def get_energy_usage(self, device_name=None, days=7):
         """Get energy usage data for the past N days."""
         try:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
+            source = self._energy_source(cursor, days)
             
             if device_name:
                 cursor.execute('''
-                    SELECT * FROM energy_usage 
+                    SELECT * FROM {} 
                     WHERE device_name = ? AND timestamp >= datetime('now', '-{} days')
                     ORDER BY timestamp DESC
-                '''.format(days), (device_name,))
+                '''.format(source, days), (device_name,))
             else:
                 cursor.execute('''
-                    SELECT * FROM energy_usage 
+                    SELECT * FROM {} 
                     WHERE timestamp >= datetime('now', '-{} days')
                     ORDER BY timestamp DESC
-                '''.format(days))
+                '''.format(source, days))
             
             usage_data = cursor.fetchall()
             conn.close()
@@ -250,6 +863,7 @@ class DatabaseManager:
             logger.error(f"Error getting energy usage: {e}")
             return []
     
+    @traced('db.calculate_device_usage_time')
     def calculate_device_usage_time(self, device_name, days=7):
         """Calculate total usage time for a device in the past N days."""
         try:
@@ -258,10 +872,10 @@ class DatabaseManager:
             
             # Get all events for the device in the time period
             cursor.execute('''
-                SELECT state, timestamp FROM energy_usage 
+                SELECT state, timestamp FROM {} 
                 WHERE device_name = ? AND timestamp >= datetime('now', '-{} days')
                 ORDER BY timestamp ASC
-            '''.format(days), (device_name,))
+            '''.format(self._energy_source(cursor, days), days), (device_name,))
             
             events = cursor.fetchall()
             conn.close()
@@ -294,6 +908,7 @@ class DatabaseManager:
             logger.error(f"Error calculating usage time: {e}")
             return 0
         
+    @traced('db.get_device_status')
     def get_device_status(self, device_name):
         """Get current status of a device."""
         try:
@@ -307,6 +922,7 @@ class DatabaseManager:
             logger.error(f"Error getting device status: {e}")
             return 'off'
     
+    @traced('db.update_device_status')
     def update_device_status(self, device_name, state):
         """Update device status."""
         try:
@@ -318,19 +934,172 @@ class DatabaseManager:
             ''', (device_name, state))
             conn.commit()
             conn.close()
+            response_cache.invalidate('energy')
             logger.info(f"Device status updated: {device_name} - {state}")
         except Exception as e:
             logger.error(f"Error updating device status: {e}")
 
+    @traced('db.get_recent_energy_activity')
     def get_recent_energy_activity(self, limit):
         """Get recent energy activity records."""
         try:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM energy_usage ORDER BY timestamp DESC LIMIT ?', (limit,))
-            records = cursor.fetchall()
+            # Ids grow with insertion order, so walking partitions newest-first by primary key needs no sort
+            records = []
+            for partition in reversed(self.partitions.partitions(cursor, 'energy_usage')):
+                cursor.execute(f'SELECT * FROM {partition} ORDER BY id DESC LIMIT ?', (limit - len(records),))
+                records.extend(cursor.fetchall())
+                if len(records) >= limit:
+                    break
             conn.close()
             return records
         except Exception as e:
             logger.error(f"Error getting recent energy activity: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    @traced('db.get_energy_events_since')
+    def get_energy_events_since(self, last_id, limit=100):
+        """Get energy events with an id greater than last_id, oldest first."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM energy_usage WHERE id > ? ORDER BY id LIMIT ?', (last_id, limit))
+            records = cursor.fetchall()
+            conn.close()
+            return records
+        except Exception as e:
+            logger.error(f"Error getting energy events: {e}")
+            return []
+    
+    @traced('db.get_latest_energy_event_id')
+    def get_latest_energy_event_id(self):
+        """Get the id of the newest energy event (0 if there is none)."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            latest = None
+            for partition in reversed(self.partitions.partitions(cursor, 'energy_usage')):
+                cursor.execute(f'SELECT MAX(id) FROM {partition}')
+                latest = cursor.fetchone()[0]
+                if latest is not None:
+                    break
+            conn.close()
+            return latest or 0
+        except Exception as e:
+            logger.error(f"Error getting latest energy event: {e}")
+            return 0
+    
+    def _energy_source(self, cursor, days):
+        """Energy usage partitions that can hold events from the past N days."""
+        since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        return self.partitions.source(cursor, 'energy_usage', since)
+    
+    def maintain_partitions(self):
+        """Create the current month's partitions and drop the ones past retention."""
+        try:
+            conn = sqlite3.connect(self.db_file)
+            self.partitions.ensure_current(conn)
+            dropped = self.partitions.apply_retention(conn)
+            conn.close()
+            if any(name.startswith('energy_usage') for name in dropped):
+                response_cache.invalidate('energy')
+            return dropped
+        except Exception as e:
+            logger.error(f"Error maintaining partitions: {e}")
+            return []
+    
+    def _iter_batches(self, conn, table, columns, start=None, end=None, after_id=0, join='',
+                      batch_size=EXPORT_BATCH_SIZE):
+        """
+        Yield the rows of one table in id order, a batch at a time.
+        
+        Every batch is a separate short query continuing after the last id,
+        so no read transaction stays open while the caller writes a batch
+        out and live writers are never held up by a long export.
+        """
+        conditions, params = [f'{table}.id > ?'], []
+        if start:
+            conditions.append(f'{table}.timestamp >= ?')
+            params.append(start.strftime('%Y-%m-%d %H:%M:%S'))
+        if end:
+            conditions.append(f'{table}.timestamp < ?')
+            params.append(end.strftime('%Y-%m-%d %H:%M:%S'))
+        query = (f"SELECT {table}.id, {columns} FROM {table} {join} "
+                 f"WHERE {' AND '.join(conditions)} ORDER BY {table}.id LIMIT ?")
+        while True:
+            rows = conn.execute(query, (after_id, *params, batch_size)).fetchall()
+            if not rows:
+                return
+            after_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+    
+    def iter_access_history(self, start=None, end=None):
+        """Yield batches of per-face access rows between two UTC datetimes, oldest first."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            after_id = 0
+            if start:
+                # The timestamp index finds where the range begins
+                first = conn.execute('SELECT MIN(id) FROM photo_faces WHERE timestamp >= ?',
+                                     (start.strftime('%Y-%m-%d %H:%M:%S'),)).fetchone()[0]
+                if first is None:
+                    return
+                after_id = first - 1
+            yield from self._iter_batches(
+                conn, 'photo_faces',
+                'photo_faces.timestamp, photo_faces.employee_id, photo_faces.name, photo_faces.decision, '
+                'photo_faces.distance, photo_faces.box, photo_faces.photo_id, photos.filename',
+                start, end, after_id, join='JOIN photos ON photos.id = photo_faces.photo_id')
+        finally:
+            conn.close()
+    
+    def iter_energy_usage(self, start=None, end=None):
+        """Yield batches of energy events between two UTC datetimes, partition by partition."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            for partition in self.partitions.partitions_since(conn.cursor(), 'energy_usage', start):
+                yield from self._iter_batches(conn, partition, 'id, timestamp, device_name, state, duration_minutes',
+                                              start, end)
+        finally:
+            conn.close()
+    
+    def iter_attendance(self, start_day, end_day, employee_id=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Yield batches of daily attendance rows between two days (inclusive), newest day first.
+        
+        Rows are as in get_attendance. Like _iter_batches, every batch is a
+        short query continuing after the last (day, employee_id) key.
+        """
+        where, params = 'a.day BETWEEN ? AND ?', [start_day, end_day]
+        if employee_id is not None:
+            where += ' AND a.employee_id = ?'
+            params.append(employee_id)
+        conn = sqlite3.connect(self.db_file)
+        try:
+            after = ()
+            while True:
+                keyset = ' AND (a.day, a.employee_id) < (?, ?)' if after else ''
+                rows = conn.execute(f'''
+                    SELECT a.employee_id, e.name, e.national_id, a.day, a.first_seen, a.last_seen, a.sightings
+                    FROM attendance a JOIN employees e ON e.id = a.employee_id
+                    WHERE {where}{keyset}
+                    ORDER BY a.day DESC, a.employee_id DESC
+                    LIMIT ?
+                ''', (*params, *after, batch_size)).fetchall()
+                if not rows:
+                    return
+                after = (rows[-1][3], rows[-1][0])
+                yield rows
+        finally:
+            conn.close()
+    
+    def iter_sensor_data(self, start=None, end=None):
+        """Yield batches of sensor readings between two UTC datetimes, partition by partition."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            for partition in self.partitions.partitions_since(conn.cursor(), 'sensor_data', start):
+                yield from self._iter_batches(conn, partition, 'id, timestamp, board_id, sensor_type, value',
+                                              start, end)
+        finally:
+            conn.close()
\ No newline at end of file
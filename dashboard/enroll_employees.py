@@ -0,0 +1,47 @@
+import sys
+import json
+import logging
+import argparse
+from database import DatabaseManager
+from gallery_store import SharedGallery
+from vision import FaceRecognizer
+from enrollment import BulkEnrollment
+from config import ENROLLMENT_WORKERS
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Enroll employees from a ZIP or tar archive holding manifest.csv "
+                    "(name, national_id[, folder]) and one photo folder per person")
+    parser.add_argument('archive', help="Path to the .zip/.tar/.tar.gz archive")
+    parser.add_argument('--workers', type=int, default=ENROLLMENT_WORKERS, help="Encoding processes")
+    parser.add_argument('--dry-run', action='store_true', help="Validate and encode without saving anything")
+    parser.add_argument('--report', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    db_manager.init_database()
+    # Publishing to the shared gallery lets a running server pick the new faces up
+    face_recognizer = FaceRecognizer(gallery_store=SharedGallery())
+    try:
+        report = BulkEnrollment(db_manager, face_recognizer, workers=args.workers).enroll(args.archive, args.dry_run)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    for error in report["errors"]:
+        where = error.get("file") or (f"row {error['row']}" if "row" in error else "archive")
+        print(f"  {where}: {error['error']}")
+    print(f"{'Would add' if args.dry_run else 'Added'} {len(report['employees'])} employees "
+          f"with {sum(e['images'] for e in report['employees'])} photos, {len(report['errors'])} errors")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
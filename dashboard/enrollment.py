@@ -0,0 +1,255 @@
+import io
+import os
+import csv
+import shutil
+import logging
+import tarfile
+import zipfile
+import posixpath
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import vision
+from response_cache import response_cache
+from config import (EMPLOYEES_FACES_FOLDER, ENROLLMENT_WORKERS, ENROLLMENT_MAX_IMAGE_BYTES,
+                    ENROLLMENT_MANIFEST)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+_quality_policy = None
+
+def _encode_enrollment_image(image_path):
+    """Validate and encode one enrollment photo in a worker process. Returns (encoding, error)."""
+    global _quality_policy
+    vision._load_backend()
+    if _quality_policy is None:
+        _quality_policy = vision.FaceQualityPolicy()
+    try:
+        image = vision.face_recognition.load_image_file(image_path)
+        locations = vision.face_recognition.face_locations(image)
+        if not locations:
+            return None, "no face found"
+        if len(locations) > 1:
+            return None, f"{len(locations)} faces found, expected one"
+
+        gray_image = vision.cv2.cvtColor(image, vision.cv2.COLOR_RGB2GRAY)
+        quality = _quality_policy.assess(gray_image, locations[0])
+        if not _quality_policy.accepts(quality):
+            return None, "low quality: " + ", ".join(quality["reasons"])
+
+        return vision.face_recognition.face_encodings(image, locations)[0], None
+    except Exception as e:
+        return None, f"unreadable image ({type(e).__name__})"
+
+def _archive_members(archive):
+    """List (path, size, open) for the regular files of a ZIP or tar archive."""
+    if isinstance(archive, zipfile.ZipFile):
+        return [(info.filename, info.file_size, lambda info=info: archive.open(info))
+                for info in archive.infolist() if not info.is_dir()]
+    return [(member.name, member.size, lambda member=member: archive.extractfile(member))
+            for member in archive.getmembers() if member.isfile()]
+
+def _open_archive(archive_file):
+    """Open a ZIP or (optionally compressed) tar archive from a path or file object."""
+    if zipfile.is_zipfile(archive_file):
+        return zipfile.ZipFile(archive_file)
+    if hasattr(archive_file, 'seek'):
+        archive_file.seek(0)
+        return tarfile.open(fileobj=archive_file)
+    return tarfile.open(archive_file)
+
+class BulkEnrollment:
+    def __init__(self, db_manager, face_recognizer, faces_directory=EMPLOYEES_FACES_FOLDER,
+                 workers=ENROLLMENT_WORKERS):
+        """
+        Enroll many employees from one archive.
+
+        The archive holds a manifest.csv with 'name' and 'national_id'
+        columns (plus an optional 'folder', defaulting to the name) and one
+        folder of photos per person. Photos are validated and encoded in
+        parallel, employees are inserted in a single transaction and the
+        gallery is published once at the end. start() does the same in a
+        background thread so large archives do not hold a serving thread.
+        """
+        self.db_manager = db_manager
+        self.face_recognizer = face_recognizer
+        self.faces_directory = faces_directory
+        self.workers = workers
+
+    def start(self, archive_path, dry_run=False):
+        """
+        Enroll an archive file in a background thread, deleting the file when done.
+
+        Returns the enrollment job id (see DatabaseManager.get_enrollment_job),
+        or None if the job could not be recorded. Raises ValueError if the
+        file is not an archive.
+        """
+        try:
+            self._open(archive_path).close()
+            job_id = self.db_manager.create_enrollment_job(dry_run)
+        except Exception:
+            os.remove(archive_path)
+            raise
+        if job_id is None:
+            os.remove(archive_path)
+            return None
+        threading.Thread(target=self._run_job, args=(job_id, archive_path, dry_run),
+                         name=f"enrollment-{job_id}", daemon=True).start()
+        return job_id
+
+    def _run_job(self, job_id, archive_path, dry_run):
+        """Run one background enrollment and record its report or error."""
+        try:
+            self.db_manager.finish_enrollment_job(job_id, self.enroll(archive_path, dry_run))
+        except Exception as e:
+            logger.error(f"Bulk enrollment job {job_id} failed: {e}")
+            self.db_manager.finish_enrollment_job(job_id, error=str(e))
+        finally:
+            os.remove(archive_path)
+
+    def enroll(self, archive_file, dry_run=False):
+        """Enroll the employees of an archive and return a report with per-row and per-image errors."""
+        report = {"employees_added": 0, "images_enrolled": 0, "dry_run": dry_run,
+                  "employees": [], "errors": []}
+        with self._open(archive_file) as archive, tempfile.TemporaryDirectory() as work_dir:
+            members = _archive_members(archive)
+            people = self._read_manifest(members, report)
+            if not people:
+                return report
+            images = self._extract_images(members, people, work_dir, report)
+            self._encode_images(images, report)
+
+            # Split in one pass: people hold numpy encodings, so they cannot be compared with ==
+            enrolled = []
+            for person in people:
+                if any(image["encoding"] is not None for image in person["images"]):
+                    enrolled.append(person)
+                else:
+                    report["errors"].append({"employee": person["national_id"], "row": person["row"],
+                                             "error": "no usable photos"})
+            if enrolled and not dry_run:
+                self._commit(enrolled, report)
+            elif dry_run:
+                report["employees"] = [self._summary(person) for person in enrolled]
+        return report
+
+    @staticmethod
+    def _open(archive_file):
+        """Open the archive, raising ValueError if it is not a ZIP or tar archive."""
+        try:
+            return _open_archive(archive_file)
+        except (zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+            raise ValueError(f"Not a ZIP or tar archive: {e}")
+
+    def _read_manifest(self, members, report):
+        """Parse and validate the manifest rows."""
+        manifests = [m for m in members if posixpath.basename(m[0]) == ENROLLMENT_MANIFEST]
+        if not manifests:
+            raise ValueError(f"Archive has no {ENROLLMENT_MANIFEST}")
+        # The archive may wrap everything in a top-level folder
+        path, _, open_member = min(manifests, key=lambda m: m[0].count('/'))
+        base = posixpath.dirname(path)
+        with open_member() as f:
+            rows = list(csv.DictReader(io.TextIOWrapper(f, encoding='utf-8-sig')))
+
+        people, seen = [], set()
+        for row_number, row in enumerate(rows, start=2):
+            name = (row.get('name') or '').strip()
+            national_id = (row.get('national_id') or '').strip()
+            folder = (row.get('folder') or '').strip() or name
+            if not name or not national_id:
+                report["errors"].append({"row": row_number, "error": "name and national_id are required"})
+                continue
+            if '/' in name or '\\' in name or name in ('.', '..'):
+                report["errors"].append({"row": row_number, "error": "invalid name"})
+                continue
+            if national_id in seen:
+                report["errors"].append({"row": row_number, "employee": national_id,
+                                         "error": "duplicate national_id in manifest"})
+                continue
+            seen.add(national_id)
+            people.append({"row": row_number, "name": name, "national_id": national_id,
+                           "folder": posixpath.normpath(posixpath.join(base, folder)), "images": []})
+
+        existing = self.db_manager.get_existing_national_ids(p["national_id"] for p in people)
+        for person in [p for p in people if p["national_id"] in existing]:
+            report["errors"].append({"row": person["row"], "employee": person["national_id"],
+                                     "error": "national_id already registered"})
+            people.remove(person)
+        return people
+
+    def _extract_images(self, members, people, work_dir, report):
+        """Copy each person's photos out of the archive under generated names."""
+        by_folder = {person["folder"]: person for person in people}
+        images = []
+        for path, size, open_member in members:
+            person = by_folder.get(posixpath.dirname(posixpath.normpath(path)))
+            if person is None or not path.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if size > ENROLLMENT_MAX_IMAGE_BYTES:
+                report["errors"].append({"employee": person["national_id"], "file": path,
+                                         "error": "image too large"})
+                continue
+            extracted = os.path.join(work_dir, f"{len(images)}{os.path.splitext(path)[1].lower()}")
+            with open_member() as src, open(extracted, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            image = {"file": path, "path": extracted, "encoding": None}
+            person["images"].append(image)
+            images.append((person, image))
+        return images
+
+    def _encode_images(self, images, report):
+        """Encode all photos across a process pool."""
+        if not images:
+            return
+        # Spawned workers do not inherit the server's threads and locks
+        context = multiprocessing.get_context('spawn')
+        workers = max(1, min(self.workers, len(images)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = executor.map(_encode_enrollment_image, [image["path"] for _, image in images],
+                                   chunksize=max(1, len(images) // (workers * 4)))
+            for (person, image), (encoding, error) in zip(images, results):
+                if error:
+                    report["errors"].append({"employee": person["national_id"], "file": image["file"],
+                                             "error": error})
+                else:
+                    image["encoding"] = encoding
+
+    def _commit(self, people, report):
+        """Insert the employees, store their photos and publish the gallery once."""
+        ids = self.db_manager.add_employees([(p["name"], p["national_id"]) for p in people])
+        if ids is None:
+            report["errors"].append({"error": "database insert failed, no employees were added"})
+            return
+
+        encodings, names = [], []
+        try:
+            for person, employee_id in zip(people, ids):
+                person["id"] = employee_id
+                employee_dir = os.path.join(self.faces_directory, person["name"])
+                os.makedirs(employee_dir, exist_ok=True)
+                index = len(os.listdir(employee_dir))
+                for image in person["images"]:
+                    if image["encoding"] is None:
+                        continue
+                    index += 1
+                    ext = os.path.splitext(image["path"])[1]
+                    shutil.copy(image["path"], os.path.join(employee_dir, f"{person['name']}_{index}{ext}"))
+                    encodings.append(image["encoding"])
+                    names.append(person["name"])
+                report["employees"].append(self._summary(person))
+
+            self.face_recognizer.add_known_faces(encodings, names)
+        finally:
+            # Only now are the photos and gallery in place for cached employee responses
+            response_cache.invalidate('employees')
+        report["employees_added"] = len(ids)
+        report["images_enrolled"] = len(encodings)
+        logger.info(f"Bulk enrollment added {len(ids)} employees with {len(encodings)} photos")
+
+    def _summary(self, person):
+        return {"id": person.get("id"), "name": person["name"], "national_id": person["national_id"],
+                "images": sum(1 for image in person["images"] if image["encoding"] is not None)}
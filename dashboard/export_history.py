@@ -0,0 +1,41 @@
+import sys
+import logging
+import argparse
+from database import DatabaseManager
+from history_export import HistoryExporter, parse_export_time, EXPORT_DATASETS, EXPORT_FORMATS
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export access, energy or sensor history as CSV or NDJSON")
+    parser.add_argument('dataset', choices=list(EXPORT_DATASETS))
+    parser.add_argument('--from', dest='start', help="Start, UTC 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument('--to', dest='end', help="End, UTC; a plain date includes the whole day")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--gzip', action='store_true', help="Compress the output")
+    parser.add_argument('--output', default='-', help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    db_manager.init_database()
+    try:
+        start = parse_export_time(args.start)
+        end = parse_export_time(args.end, end=True)
+        chunks = HistoryExporter(db_manager).stream(args.dataset, start, end, args.format, args.gzip)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import os
+import json
+import mmap
+import glob
+import random
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+from config import GALLERY_FOLDER, RECOGNITION_CPU_BUDGET, RECOGNITION_SLOTS_FOLDER
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENCODING_SIZE = 128
+VERSION_FORMAT = '<Q'
+VERSION_SIZE = struct.calcsize(VERSION_FORMAT)
+KEEP_VERSIONS = 3
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on a file across processes."""
+    with open(path, 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class PrimaryLock:
+    def __init__(self, path):
+        """Non-blocking lock that marks one worker process as the primary."""
+        self.path = path
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        """Try to become primary. The lock is released when the process exits."""
+        if self._file is not None:
+            return True
+        lock_file = open(self.path, 'a+')
+        if fcntl:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._file = lock_file
+        logger.info(f"Process {os.getpid()} is the primary worker")
+        return True
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+class RecognitionBudget:
+    def __init__(self, slots=RECOGNITION_CPU_BUDGET, folder=RECOGNITION_SLOTS_FOLDER):
+        """
+        Cap the recognitions running at once across every worker process.
+
+        Each slot is a lock file; a recognition holds an exclusive lock on
+        one of them while it runs, so /upload requests in any worker and
+        the primary's camera frames draw on the same set of cores.
+        """
+        self.slots = max(1, slots)
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._paths = [os.path.join(folder, f"slot_{i}.lock") for i in range(self.slots)]
+        # Windows: single-process development server only
+        self._local_slots = threading.BoundedSemaphore(self.slots)
+
+    @contextmanager
+    def slot(self):
+        """Hold a recognition slot, waiting for one if all are busy."""
+        if not fcntl:
+            with self._local_slots:
+                yield
+            return
+        # Start at a random slot so waiting processes spread over the lock files
+        start = random.randrange(self.slots)
+        order = self._paths[start:] + self._paths[:start]
+        lock_file = None
+        for path in order:
+            candidate = open(path, 'a+')
+            try:
+                fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                candidate.close()
+                continue
+            lock_file = candidate
+            break
+        if lock_file is None:
+            lock_file = open(order[0], 'a+')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+class SharedGallery:
+    def __init__(self, folder=GALLERY_FOLDER):
+        """
+        Face gallery shared by every worker process through memory-mapped files.
+
+        Each published gallery is an immutable encodings_<version>.npy matrix
+        plus names_<version>.json. An 8-byte counter in the 'version' file,
+        mapped by every process, tells workers when to map a newer matrix.
+        Since matrices are mapped read-only, all workers share the same pages.
+        """
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.lock_path = os.path.join(folder, 'gallery.lock')
+        version_path = os.path.join(folder, 'version')
+        with file_lock(self.lock_path):
+            if not os.path.exists(version_path) or os.path.getsize(version_path) < VERSION_SIZE:
+                with open(version_path, 'wb') as f:
+                    f.write(struct.pack(VERSION_FORMAT, 0))
+        self._version_file = open(version_path, 'r+b')
+        self._version_map = mmap.mmap(self._version_file.fileno(), VERSION_SIZE)
+
+    def _paths(self, version):
+        return (os.path.join(self.folder, f"encodings_{version}.npy"),
+                os.path.join(self.folder, f"names_{version}.json"))
+
+    def current_version(self) -> int:
+        """Latest published version (0 if nothing was published yet)."""
+        return struct.unpack_from(VERSION_FORMAT, self._version_map, 0)[0]
+
+    def load(self, version=None):
+        """Map a published gallery. Returns (version, encodings, names)."""
+        version = self.current_version() if version is None else version
+        if version == 0:
+            return 0, np.zeros((0, ENCODING_SIZE)), []
+        encodings_path, names_path = self._paths(version)
+        encodings = np.load(encodings_path, mmap_mode='r')
+        with open(names_path) as f:
+            names = json.load(f)
+        return version, encodings, names
+
+    def publish(self, encodings, names) -> int:
+        """Write a new gallery version and make it visible to every worker."""
+        matrix = self._matrix(encodings, names)
+        with file_lock(self.lock_path):
+            version = self._write(matrix, names)
+        logger.info(f"Published gallery version {version} with {len(matrix)} faces")
+        return version
+
+    def append(self, encodings, names) -> int:
+        """Publish the latest gallery plus the given faces, reading and writing under the gallery lock."""
+        matrix = self._matrix(encodings, names)
+        with file_lock(self.lock_path):
+            # No other process can publish between this read and the write below
+            _, known_encodings, known_names = self.load()
+            matrix = np.concatenate([np.asarray(known_encodings, dtype=np.float64), matrix])
+            names = list(known_names) + list(names)
+            version = self._write(matrix, names)
+        logger.info(f"Published gallery version {version} with {len(matrix)} faces")
+        return version
+
+    @staticmethod
+    def _matrix(encodings, names):
+        matrix = np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_SIZE)
+        if len(matrix) != len(names):
+            raise ValueError("Encodings and names must have the same length")
+        return matrix
+
+    def _write(self, matrix, names) -> int:
+        """Write the next version's files and bump the counter. The gallery lock must be held."""
+        version = self.current_version() + 1
+        encodings_path, names_path = self._paths(version)
+        with open(encodings_path + '.tmp', 'wb') as f:
+            np.save(f, matrix)
+        os.replace(encodings_path + '.tmp', encodings_path)
+        with open(names_path + '.tmp', 'w') as f:
+            json.dump(list(names), f)
+        os.replace(names_path + '.tmp', names_path)
+
+        struct.pack_into(VERSION_FORMAT, self._version_map, 0, version)
+        self._version_map.flush()
+        self._remove_old_versions(version)
+        return version
+
+    def _remove_old_versions(self, version):
+        """Delete superseded files; workers that still map them keep their pages."""
+        for path in glob.glob(os.path.join(self.folder, 'encodings_*.npy')) + \
+                glob.glob(os.path.join(self.folder, 'names_*.json')):
+            try:
+                file_version = int(os.path.basename(path).split('_')[1].split('.')[0])
+            except ValueError:
+                continue
+            if file_version <= version - KEEP_VERSIONS:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
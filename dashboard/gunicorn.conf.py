@@ -0,0 +1,14 @@
+from config import SERVING_BIND, SERVING_WORKERS, SERVING_THREADS
+
+# Production serving: gunicorn -c gunicorn.conf.py wsgi:app
+bind = SERVING_BIND
+workers = SERVING_WORKERS
+worker_class = 'gthread'
+threads = SERVING_THREADS
+# Uploads queued during warm-up may wait UPLOAD_WARMUP_WAIT seconds
+timeout = 60
+
+def on_starting(server):
+    """Load OpenCV and the dlib models once in the master so forked workers share them."""
+    from vision import FaceRecognizer
+    FaceRecognizer().load_models()
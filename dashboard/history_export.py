@@ -0,0 +1,93 @@
+import io
+import csv
+import json
+import zlib
+import datetime
+
+# Dataset name -> (DatabaseManager iterator, column names)
+EXPORT_DATASETS = {
+    'access': ('iter_access_history',
+               ['timestamp', 'employee_id', 'name', 'decision', 'distance', 'box', 'photo_id', 'filename']),
+    'energy': ('iter_energy_usage', ['id', 'timestamp', 'device_name', 'state', 'duration_minutes']),
+    'sensors': ('iter_sensor_data', ['id', 'timestamp', 'board_id', 'sensor_type', 'value']),
+}
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def parse_export_time(value, end=False):
+    """
+    Parse a UTC 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' bound.
+
+    A plain date used as the end of a range includes that whole day.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        day = datetime.datetime.strptime(value, '%Y-%m-%d')
+        return day + datetime.timedelta(days=1) if end else day
+
+class HistoryExporter:
+    def __init__(self, db_manager):
+        """
+        Stream access, energy and sensor history as CSV or NDJSON.
+
+        Rows are read a batch at a time and each batch is encoded into one
+        chunk, so memory stays flat however long the range is. Output can
+        be gzip-compressed on the fly.
+        """
+        self.db_manager = db_manager
+
+    def stream(self, dataset, start=None, end=None, fmt='csv', compress=False):
+        """Yield the encoded export as byte chunks. Raises ValueError for unknown datasets or formats."""
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f"Unknown dataset '{dataset}', expected one of: {', '.join(EXPORT_DATASETS)}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(EXPORT_FORMATS)}")
+        if start and end and start >= end:
+            raise ValueError("'from' must be before 'to'")
+
+        method, columns = EXPORT_DATASETS[dataset]
+        return self.encode(getattr(self.db_manager, method)(start, end), columns, fmt, compress)
+
+    def encode(self, batches, columns, fmt='csv', compress=False):
+        """Yield any iterator of row batches as encoded byte chunks, one chunk per batch."""
+        chunks = self._encode(batches, columns, fmt)
+        return self._gzip(chunks) if compress else chunks
+
+    @staticmethod
+    def filename(dataset, start=None, end=None, fmt='csv', compress=False):
+        # The end bound is exclusive; name the file after the last day it covers
+        last = end - datetime.timedelta(seconds=1) if end else None
+        parts = [dataset] + [bound.strftime('%Y%m%d') for bound in (start, last) if bound]
+        return '_'.join(parts) + f'.{fmt}' + ('.gz' if compress else '')
+
+    @staticmethod
+    def content_type(fmt, compress=False):
+        return 'application/gzip' if compress else EXPORT_FORMATS[fmt]
+
+    def _encode(self, batches, columns, fmt):
+        """Turn row batches into CSV or NDJSON text chunks."""
+        if fmt == 'csv':
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            yield output.getvalue().encode()
+            for batch in batches:
+                output.seek(0)
+                output.truncate()
+                writer.writerows(batch)
+                yield output.getvalue().encode()
+        else:
+            for batch in batches:
+                yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in batch).encode()
+
+    def _gzip(self, chunks):
+        """Compress a chunk stream into one gzip member."""
+        compressor = zlib.compressobj(wbits=31)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
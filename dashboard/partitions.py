@@ -0,0 +1,222 @@
+import re
+import logging
+import threading
+import datetime
+
+logger = logging.getLogger(__name__)
+
+# Column name, definition and, for the insert trigger, the default to use when a value is omitted
+PARTITIONED_TABLES = {
+    'sensor_data': {
+        'columns': [
+            ('sensor_type', 'TEXT NOT NULL', None),
+            ('value', 'REAL NOT NULL', None),
+            ('timestamp', 'DATETIME DEFAULT CURRENT_TIMESTAMP', 'CURRENT_TIMESTAMP'),
+            ('board_id', 'INTEGER', None),
+        ],
+        'index': ('sensor_type', 'timestamp'),
+    },
+    'energy_usage': {
+        'columns': [
+            ('device_name', 'TEXT NOT NULL', None),
+            ('state', 'TEXT NOT NULL', None),
+            ('timestamp', 'DATETIME DEFAULT CURRENT_TIMESTAMP', 'CURRENT_TIMESTAMP'),
+            ('duration_minutes', 'REAL DEFAULT 0', '0'),
+        ],
+        'index': ('device_name', 'timestamp'),
+    },
+}
+
+def current_month():
+    """Month partition key of the current UTC time (timestamps are stored in UTC)."""
+    return datetime.datetime.utcnow().strftime('%Y_%m')
+
+def month_of(when):
+    return when.strftime('%Y_%m')
+
+def months_ago(month, count):
+    """Partition key 'count' months before 'month'."""
+    year, month_number = (int(part) for part in month.split('_'))
+    index = year * 12 + month_number - 1 - count
+    return f"{index // 12:04d}_{index % 12 + 1:02d}"
+
+class PartitionManager:
+    def __init__(self, retention_months):
+        """
+        Store large history tables in one table per month behind a view.
+
+        Each table in PARTITIONED_TABLES becomes a view named like the old
+        table, a UNION ALL over <table>_YYYY_MM partitions. An INSTEAD OF
+        INSERT trigger on the view writes into the current month, so rows
+        are partitioned by the month they were written. Partitions share
+        one id sequence, which keeps ids increasing across months.
+        Expiring a month drops one table instead of deleting rows.
+        """
+        self.retention_months = retention_months
+        self._checked_month = {}
+        self._lock = threading.Lock()
+
+    def partitions(self, cursor, table):
+        """Partition table names of a table, oldest first."""
+        pattern = re.compile(rf'^{table}_\d{{4}}_\d{{2}}$')
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (f"{table}_%",))
+        return sorted(name for (name,) in cursor.fetchall() if pattern.match(name))
+
+    def partitions_since(self, cursor, table, since=None):
+        """
+        Partitions that may hold rows newer than 'since', oldest first.
+
+        Older partitions were written before 'since' and can be skipped.
+        """
+        names = self.partitions(cursor, table)
+        if since is None:
+            return names
+        first = f"{table}_{month_of(since)}"
+        return [name for name in names if name >= first] or names[-1:]
+
+    def source(self, cursor, table, since=None):
+        """FROM clause covering the partitions that may hold rows newer than 'since'."""
+        names = self.partitions_since(cursor, table, since)
+        if len(names) == 1:
+            return names[0]
+        return '(' + ' UNION ALL '.join(f'SELECT * FROM {name}' for name in names) + ')'
+
+    def setup(self, cursor):
+        """Convert unpartitioned tables and make sure this month's partitions exist."""
+        conn = cursor.connection
+        if conn.in_transaction:
+            conn.commit()
+        for table in PARTITIONED_TABLES:
+            # Worker processes start together; the view and trigger are dropped and recreated one at a time
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,))
+                row = cursor.fetchone()
+                if row and row[0] == 'table':
+                    self._migrate(cursor, table)
+                self._ensure_partition(cursor, table, current_month())
+                self._rebuild_view(cursor, table, self.partitions(cursor, table), f"{table}_{current_month()}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self._checked_month[table] = current_month()
+
+    def ensure_current(self, conn):
+        """Create this month's partitions once per month (cheap check otherwise)."""
+        month = current_month()
+        with self._lock:
+            if all(self._checked_month.get(table) == month for table in PARTITIONED_TABLES):
+                return
+            # Serialize rollover with other worker processes
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = conn.cursor()
+                for table in PARTITIONED_TABLES:
+                    self._ensure_partition(cursor, table, month)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            for table in PARTITIONED_TABLES:
+                self._checked_month[table] = month
+
+    def _ensure_partition(self, cursor, table, month):
+        """Create a month partition if missing and route inserts to it."""
+        name = f"{table}_{month}"
+        existing = self.partitions(cursor, table)
+        if name in existing:
+            return
+        spec = PARTITIONED_TABLES[table]
+        columns = ',\n'.join(f'{column} {definition}' for column, definition, _ in spec['columns'])
+        cursor.execute(f'CREATE TABLE {name} (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})')
+        cursor.execute(f'CREATE INDEX idx_{name}_{"_".join(spec["index"])} ON {name} ({", ".join(spec["index"])})')
+
+        # Continue the id sequence of the previous partitions
+        if existing:
+            cursor.execute("SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ({})".format(
+                ','.join('?' * len(existing))), existing)
+            last_id = cursor.fetchone()[0]
+            if last_id:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (name, last_id))
+        self._rebuild_view(cursor, table, existing + [name], name)
+        logger.info(f"Created partition {name}")
+
+    def _rebuild_view(self, cursor, table, names, insert_into):
+        """Point the table's view at the given partitions and inserts at one of them."""
+        spec = PARTITIONED_TABLES[table]
+        cursor.execute(f'DROP VIEW IF EXISTS {table}')
+        cursor.execute(f'CREATE VIEW {table} AS ' + ' UNION ALL '.join(f'SELECT * FROM {name}' for name in names))
+        column_names = ['id'] + [column for column, _, _ in spec['columns']]
+        values = ['NEW.id'] + [f'COALESCE(NEW.{column}, {default})' if default else f'NEW.{column}'
+                               for column, _, default in spec['columns']]
+        cursor.execute(f'''
+            CREATE TRIGGER {table}_insert INSTEAD OF INSERT ON {table}
+            BEGIN
+                INSERT INTO {insert_into} ({', '.join(column_names)}) VALUES ({', '.join(values)});
+            END
+        ''')
+
+    def _migrate(self, cursor, table):
+        """Move an unpartitioned table's rows into month partitions, keeping their ids. The caller commits."""
+        legacy = f"{table}_unpartitioned"
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+        cursor.execute(f'PRAGMA table_info({legacy})')
+        legacy_columns = {row[1] for row in cursor.fetchall()}
+        columns = ['id'] + [column for column, _, _ in PARTITIONED_TABLES[table]['columns']
+                            if column in legacy_columns]
+
+        # Timestamps are 'YYYY-MM-DD HH:MM:SS' text, so each month is one index range
+        cursor.execute(f'CREATE INDEX {legacy}_timestamp ON {legacy} (timestamp)')
+        cursor.execute(f"SELECT DISTINCT substr(timestamp, 1, 7) FROM {legacy} WHERE timestamp IS NOT NULL")
+        months = sorted(month for (month,) in cursor.fetchall() if re.match(r'^\d{4}-\d{2}$', month or ''))
+        for month in months:
+            self._ensure_partition(cursor, table, month.replace('-', '_'))
+            cursor.execute(f'''
+                INSERT INTO {table}_{month.replace('-', '_')} ({', '.join(columns)})
+                SELECT {', '.join(columns)} FROM {legacy} WHERE timestamp >= ? AND timestamp < ?
+            ''', (month, month + '~'))
+        self._ensure_partition(cursor, table, current_month())
+        # Rows without a usable timestamp go to the current month
+        cursor.execute(f'''
+            INSERT INTO {table}_{current_month()} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {legacy} WHERE id NOT IN (
+                {' UNION ALL '.join(f'SELECT id FROM {name}' for name in self.partitions(cursor, table))})
+        ''')
+
+        # New rows continue after the highest migrated id
+        cursor.execute(f'SELECT MAX(id) FROM {legacy}')
+        last_id = cursor.fetchone()[0] or 0
+        cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (f"{table}_{current_month()}",))
+        cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (f"{table}_{current_month()}", last_id))
+        cursor.execute(f'DROP TABLE {legacy}')
+        logger.info(f"Partitioned {table} into {len(months)} monthly tables")
+
+    def apply_retention(self, conn):
+        """Drop partitions older than each table's retention. Returns the dropped names."""
+        dropped = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.cursor()
+            month = current_month()
+            for table, keep_months in self.retention_months.items():
+                if not keep_months:
+                    continue
+                names = self.partitions(cursor, table)
+                oldest_kept = f"{table}_{months_ago(month, keep_months - 1)}"
+                expired = [name for name in names if name < oldest_kept]
+                if not expired:
+                    continue
+                remaining = [name for name in names if name not in expired]
+                # The view must stop referencing a partition before it is dropped
+                self._rebuild_view(cursor, table, remaining, remaining[-1])
+                for name in expired:
+                    cursor.execute(f'DROP TABLE {name}')
+                    dropped.append(name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        for name in dropped:
+            logger.info(f"Dropped expired partition {name}")
+        return dropped
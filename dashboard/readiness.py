@@ -0,0 +1,71 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+class ReadinessTracker:
+    def __init__(self, components):
+        """Track the warm-up state of each server component."""
+        self._lock = threading.Lock()
+        self._components = {name: {"state": PENDING, "started_at": None, "finished_at": None,
+                                   "duration_sec": None, "error": None} for name in components}
+        self._events = {name: threading.Event() for name in components}
+
+    @contextmanager
+    def track(self, name):
+        """Mark a component as loading, then ready or failed depending on the block."""
+        self._set(name, LOADING, started_at=time.time())
+        try:
+            yield
+        except Exception as e:
+            logger.error(f"Component {name} failed to start: {e}")
+            self._finish(name, FAILED, str(e))
+        else:
+            self._finish(name, READY)
+
+    def mark_ready(self, name):
+        """Mark a component ready before its tracked block finishes (e.g. serving a cached copy)."""
+        self._finish(name, READY)
+
+    def _set(self, name, state, **fields):
+        with self._lock:
+            self._components[name].update(state=state, **fields)
+
+    def _finish(self, name, state, error=None):
+        with self._lock:
+            component = self._components[name]
+            finished_at = time.time()
+            component.update(state=state, finished_at=finished_at, error=error,
+                             duration_sec=round(finished_at - (component["started_at"] or finished_at), 3))
+        self._events[name].set()
+        logger.info(f"Component {name} is {state}")
+
+    def is_ready(self, *names):
+        """Check whether the given components (all if none given) are ready."""
+        with self._lock:
+            return all(self._components[n]["state"] == READY for n in (names or self._components))
+
+    def wait_for(self, names, timeout=None):
+        """Wait until the components finish warming up. Returns True if all are ready."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in names:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not self._events[name].wait(remaining):
+                return False
+        return self.is_ready(*names)
+
+    def status(self):
+        """Return overall and per-component readiness."""
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+        return {
+            "ready": all(c["state"] == READY for c in components.values()),
+            "components": components
+        }
@@ -0,0 +1,73 @@
+import sys
+import json
+import logging
+import argparse
+from database import DatabaseManager
+from gallery_store import SharedGallery
+from vision import FaceRecognizer
+from rescoring import FrameRescorer, RESCORE_SCOPES
+from config import EMPLOYEES_FACES_FOLDER, RESCORE_WORKERS, RESCORE_BATCH_SIZE
+
+logging.basicConfig(level=logging.WARNING)
+
+
+def print_progress(job):
+    eta = f"{job['eta_seconds']}s" if job["eta_seconds"] is not None else "-"
+    print(f"  {job['processed']}/{job['total']} frames ({job['percent']}%), {job['changed']} corrected, "
+          f"{job['missing']} missing, {job['rate'] or 0:.1f} frames/s, ETA {eta}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-run face recognition over stored access frames, e.g. after enrolling "
+                    "employees or changing the tolerance. Interrupted jobs resume where they stopped.")
+    parser.add_argument('--scope', choices=RESCORE_SCOPES, default='unknown',
+                        help="Frames with an Unknown face (default) or every frame")
+    parser.add_argument('--tolerance', type=float, help="Matching tolerance (default: the recognizer's)")
+    parser.add_argument('--workers', type=int, default=RESCORE_WORKERS, help="Detection processes")
+    parser.add_argument('--batch-size', type=int, default=RESCORE_BATCH_SIZE,
+                        help="Frames per write transaction and resume checkpoint")
+    parser.add_argument('--restart', action='store_true', help="Start a new job instead of resuming")
+    parser.add_argument('--status', action='store_true', help="Show the latest job and exit")
+    parser.add_argument('--stop', action='store_true', help="Ask the running job to pause and exit")
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager()
+    db_manager.init_database()
+    face_recognizer = FaceRecognizer(gallery_store=SharedGallery())
+    if args.tolerance is not None:
+        face_recognizer.tolerance = args.tolerance
+    rescorer = FrameRescorer(db_manager, face_recognizer, workers=args.workers, batch_size=args.batch_size)
+
+    if args.status or args.stop:
+        if args.stop and not rescorer.stop():
+            print("No running job", file=sys.stderr)
+            return 1
+        print(json.dumps(rescorer.status(), indent=2))
+        return 0
+
+    # Match against the gallery the server published, or build it if there is none yet
+    if not face_recognizer.sync_gallery():
+        face_recognizer.load_known_faces(EMPLOYEES_FACES_FOLDER)
+    try:
+        job_id = rescorer.start(args.scope, args.restart)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if job_id is None:
+        print("A rescore job is already running; stop it with --stop first", file=sys.stderr)
+        return 1
+
+    print(f"Rescore job {job_id}: scope={args.scope}, tolerance={face_recognizer.tolerance}")
+    try:
+        job = rescorer.run(job_id, progress=print_progress)
+    except KeyboardInterrupt:
+        print(f"Job {job_id} paused; run again to resume", file=sys.stderr)
+        return 130
+    print(f"Job {job_id} {job['status']}: {job['processed']} frames, {job['changed']} corrected, "
+          f"{job['cached']} from cached encodings, {job['missing']} missing files")
+    return 0 if job["status"] in ('finished', 'paused') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
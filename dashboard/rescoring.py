@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import vision
+from config import (UPLOAD_FOLDER, RESCORE_WORKERS, RESCORE_BATCH_SIZE, RESCORE_STALE_SECONDS,
+                    RESCORE_HEARTBEAT_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+RESCORE_SCOPES = ('unknown', 'all')
+
+_detector = None
+
+def _detect_frame(image_path):
+    """Detect, score and encode the faces of one stored frame in a worker process."""
+    global _detector
+    if _detector is None:
+        _detector = vision.FaceRecognizer()
+    return _detector.detect_faces(image_path, image_path)
+
+def recognizer_with_tolerance(face_recognizer, tolerance):
+    """A recognizer sharing face_recognizer's gallery but matching with another tolerance."""
+    recognizer = vision.FaceRecognizer(tolerance=tolerance, gallery_store=face_recognizer.gallery_store,
+                                       quality_policy=face_recognizer.quality_policy)
+    if recognizer.gallery_store is None:
+        recognizer.set_known_faces(face_recognizer.known_face_encodings, face_recognizer.known_face_names)
+    return recognizer
+
+class FrameRescorer:
+    def __init__(self, db_manager, face_recognizer, upload_folder=UPLOAD_FOLDER, workers=RESCORE_WORKERS,
+                 batch_size=RESCORE_BATCH_SIZE):
+        """
+        Re-run recognition over stored access frames after gallery or tolerance changes.
+
+        Frames are read from the photos table in id order, a batch at a
+        time. Frames without cached encodings are detected and encoded on a
+        process pool; every frame is then matched in this process against
+        the current gallery with face_recognizer's tolerance. Corrected
+        names and the job's checkpoint are written in one transaction per
+        batch, so an interrupted job resumes after its last batch.
+        """
+        self.db_manager = db_manager
+        self.face_recognizer = face_recognizer
+        self.upload_folder = upload_folder
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def start(self, scope='unknown', restart=False):
+        """
+        Create a job, or pick up the latest unfinished one with the same scope and tolerance.
+
+        Only one job runs at a time, since jobs rewrite the same photos.
+        Returns the job id, or None if a job is being run by another process.
+        """
+        if scope not in RESCORE_SCOPES:
+            raise ValueError(f"Unknown scope '{scope}', expected one of: {', '.join(RESCORE_SCOPES)}")
+        job = self.db_manager.get_rescore_job()
+        if (not restart and job and job["status"] != 'finished' and job["scope"] == scope
+                and job["tolerance"] == self.face_recognizer.tolerance):
+            if not self.db_manager.claim_rescore_job(job["id"], RESCORE_STALE_SECONDS):
+                return None
+            logger.info(f"Resuming rescore job {job['id']} after photo {job['last_photo_id']}")
+            return job["id"]
+        job_id = self.db_manager.create_rescore_job(scope, self.face_recognizer.tolerance, RESCORE_STALE_SECONDS)
+        if job_id is None and self.db_manager.get_active_rescore_job(RESCORE_STALE_SECONDS) is None:
+            raise RuntimeError("Could not create the rescore job")
+        return job_id
+
+    def run(self, job_id, progress=None):
+        """Process a claimed job until it is done or asked to stop. Returns the final job row."""
+        job = self.db_manager.get_rescore_job(job_id)
+        last_photo_id, processed = job["last_photo_id"], 0
+        started = time.monotonic()
+        # Spawned workers do not inherit the server's threads and locks
+        context = multiprocessing.get_context('spawn')
+        # A batch can take longer than the stale interval on a slow CPU, so liveness does not wait for it
+        stopped = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stopped), name=f"rescore-{job_id}-heartbeat",
+                         daemon=True).start()
+        try:
+            with ProcessPoolExecutor(max_workers=max(1, self.workers), mp_context=context) as executor:
+                while True:
+                    if self.db_manager.get_rescore_job(job_id)["status"] == 'stopping':
+                        self.db_manager.set_rescore_job_status(job_id, 'paused')
+                        logger.info(f"Rescore job {job_id} paused after photo {last_photo_id}")
+                        break
+                    batch = self.db_manager.get_rescore_batch(job["scope"], last_photo_id, job["max_photo_id"],
+                                                              self.batch_size)
+                    if not batch:
+                        self.db_manager.set_rescore_job_status(job_id, 'finished')
+                        break
+                    results, counts = self._rescore_batch(batch, executor)
+                    last_photo_id = batch[-1][0]
+                    processed += len(batch)
+                    rate = processed / max(time.monotonic() - started, 1e-6)
+                    if not self.db_manager.save_rescore_batch(job_id, results, last_photo_id, counts, rate):
+                        raise RuntimeError(f"Could not save the batch ending at photo {last_photo_id}")
+                    if progress:
+                        progress(self.status(job_id))
+        except Exception as e:
+            logger.error(f"Rescore job {job_id} failed: {e}")
+            self.db_manager.set_rescore_job_status(job_id, 'failed', str(e))
+        except BaseException:
+            # Interrupted (e.g. Ctrl-C): leave the job resumable right away
+            self.db_manager.set_rescore_job_status(job_id, 'paused', only_if=('running', 'stopping'))
+            logger.info(f"Rescore job {job_id} interrupted after photo {last_photo_id}")
+            raise
+        finally:
+            stopped.set()
+        return self.status(job_id)
+
+    def _heartbeat(self, job_id, stopped):
+        """Mark the job as alive every RESCORE_HEARTBEAT_INTERVAL seconds until stopped is set."""
+        while not stopped.wait(RESCORE_HEARTBEAT_INTERVAL):
+            self.db_manager.touch_rescore_job(job_id)
+
+    def _rescore_batch(self, batch, executor):
+        """Detect (when not cached) and match the faces of one batch of frames."""
+        counts = {"processed": len(batch), "changed": 0, "missing": 0, "cached": 0}
+        frames, to_detect = [], []
+        for photo_id, filename, recognized_faces, faces_json, blob in batch:
+            frame = {"photo_id": photo_id, "old_names": recognized_faces, "faces": None, "encodings": None}
+            if faces_json is not None:
+                frame["faces"], frame["encodings"] = vision.unpack_faces(faces_json, blob)
+                counts["cached"] += 1
+            else:
+                path = os.path.join(self.upload_folder, filename)
+                if not os.path.exists(path):
+                    counts["missing"] += 1
+                    continue
+                to_detect.append((frame, path))
+            frames.append(frame)
+
+        if to_detect:
+            chunksize = max(1, len(to_detect) // (self.workers * 4))
+            detected = executor.map(_detect_frame, [path for _, path in to_detect], chunksize=chunksize)
+            for (frame, _), (faces, encodings) in zip(to_detect, detected):
+                if faces is None:
+                    # Unreadable file: keep the stored result rather than caching "no faces"
+                    counts["missing"] += 1
+                    continue
+                frame["faces"], frame["encodings"] = faces, encodings
+                frame["cache"] = vision.pack_faces(faces, encodings)
+
+        results = []
+        for frame in frames:
+            if frame["faces"] is None:
+                continue
+            accepted = [face for face in frame["faces"] if face["accepted"]]
+            self.face_recognizer.match_faces(accepted, frame["encodings"])
+            names = vision.FaceRecognizer.accepted_names(frame["faces"])
+            changed = (', '.join(names) if names else 'None') != frame["old_names"]
+            counts["changed"] += changed
+            results.append({"photo_id": frame["photo_id"], "names": names, "faces": frame["faces"],
+                            "changed": changed, "cache": frame.get("cache")})
+        return results, counts
+
+    def status(self, job_id=None):
+        """Job row (the running one, else the latest if no id is given) with its progress and ETA in seconds."""
+        job = (self.db_manager.get_rescore_job(job_id) if job_id is not None
+               else self.db_manager.get_active_rescore_job(RESCORE_STALE_SECONDS) or self.db_manager.get_rescore_job())
+        if job is None:
+            return None
+        remaining = max(job["total"] - job["processed"], 0)
+        job["percent"] = round(100.0 * job["processed"] / job["total"], 1) if job["total"] else 100.0
+        job["eta_seconds"] = (round(remaining / job["rate"]) if job["rate"] and job["status"] == 'running'
+                              else None)
+        return job
+
+    def stop(self, job_id=None):
+        """Ask a running job (in any process; the running one if no id is given) to pause after its current batch."""
+        job = (self.db_manager.get_rescore_job(job_id) if job_id is not None
+               else self.db_manager.get_active_rescore_job(RESCORE_STALE_SECONDS))
+        return bool(job) and self.db_manager.set_rescore_job_status(job["id"], 'stopping', only_if=('running',))
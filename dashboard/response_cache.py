@@ -0,0 +1,198 @@
+import os
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, make_response, Response
+from gallery_store import file_lock
+from config import CACHE_GENERATIONS_FILE, CACHE_MAX_ENTRIES, CACHE_CHANGE_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Each tag names a kind of data; writes bump the tag's generation
+CACHE_TAGS = ('energy', 'employees', 'cameras', 'boards')
+GENERATION_FORMAT = '<Q'
+GENERATION_SIZE = struct.calcsize(GENERATION_FORMAT)
+
+class CacheEntry:
+    def __init__(self, generation, expires, body, etag, mimetype):
+        self.generation = generation
+        self.expires = expires
+        self.body = body
+        self.etag = etag
+        self.mimetype = mimetype
+
+class ResponseCache:
+    def __init__(self, generations_file=CACHE_GENERATIONS_FILE, max_entries=CACHE_MAX_ENTRIES):
+        """
+        Cache JSON API responses per endpoint and query string.
+
+        Generations live in a small memory-mapped file so that an
+        invalidation in one worker process is seen by all of them. At most
+        max_entries responses are kept; the least recently used go first.
+        """
+        self.generations_file = generations_file
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._map = None
+        self._changed = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def _get_map(self):
+        """Map the shared generation counters, creating the file if needed."""
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    size = GENERATION_SIZE * len(CACHE_TAGS)
+                    lock_path = self.generations_file + '.lock'
+                    with file_lock(lock_path):
+                        if not os.path.exists(self.generations_file) or \
+                                os.path.getsize(self.generations_file) < size:
+                            with open(self.generations_file, 'wb') as f:
+                                f.write(b'\0' * size)
+                    self._file = open(self.generations_file, 'r+b')
+                    self._map = mmap.mmap(self._file.fileno(), size)
+        return self._map
+
+    def use_file(self, generations_file):
+        """Switch to another generations file and drop the cached responses (tests and benchmarks)."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+            self.generations_file = generations_file
+            self._map = None
+            self._entries.clear()
+            self._key_locks.clear()
+
+    def _generation(self, tags):
+        """Combined generation of the given tags."""
+        generations_map = self._get_map()
+        return tuple(struct.unpack_from(GENERATION_FORMAT, generations_map,
+                                        CACHE_TAGS.index(tag) * GENERATION_SIZE)[0] for tag in tags)
+
+    def generation(self, tag):
+        """Current generation of a single tag."""
+        return self._generation((tag,))[0]
+
+    def invalidate(self, *tags):
+        """Mark every cached response depending on these tags as stale."""
+        try:
+            generations_map = self._get_map()
+            with file_lock(self.generations_file + '.lock'):
+                for tag in tags:
+                    offset = CACHE_TAGS.index(tag) * GENERATION_SIZE
+                    value = struct.unpack_from(GENERATION_FORMAT, generations_map, offset)[0]
+                    struct.pack_into(GENERATION_FORMAT, generations_map, offset, value + 1)
+        except Exception as e:
+            # Entries still expire by TTL
+            logger.error(f"Error invalidating cache tags {tags}: {e}")
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait_for_change(self, tag, generation, timeout, poll_interval=CACHE_CHANGE_POLL_INTERVAL):
+        """
+        Block until the tag's generation differs from the given one.
+
+        Writes in this process wake waiters immediately; writes in other
+        worker processes are noticed within poll_interval.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            # Checked under the condition, so a local invalidate cannot slip in before wait()
+            while self.generation(tag) == generation:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(min(remaining, poll_interval))
+        return True
+
+    def cached(self, ttl, tags=()):
+        """Decorator caching a view's 200 responses with ETag/If-None-Match support."""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                key = (f.__name__, request.full_path)
+                entry = self._get(key)
+                if not self._is_fresh(entry, tags):
+                    with self._key_lock(key):
+                        # Another request may have refreshed it while we waited
+                        entry = self._get(key)
+                        if not self._is_fresh(entry, tags):
+                            generation = self._generation(tags)
+                            response = make_response(f(*args, **kwargs))
+                            if response.status_code != 200:
+                                self._drop_key_lock(key)
+                                return response
+                            body = response.get_data()
+                            entry = CacheEntry(generation, time.monotonic() + ttl, body,
+                                               hashlib.sha1(body).hexdigest()[:20], response.mimetype)
+                            self._store(key, entry)
+                            self.misses += 1
+                        else:
+                            self.hits += 1
+                else:
+                    self.hits += 1
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+    def _is_fresh(self, entry, tags):
+        return (entry is not None and entry.expires > time.monotonic()
+                and entry.generation == self._generation(tags))
+
+    def _get(self, key):
+        """Look up an entry and mark it recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, entry):
+        """Add an entry, evicting the least recently used ones (and their locks) beyond max_entries."""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted, None)
+                self.evictions += 1
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _drop_key_lock(self, key):
+        """Forget the lock of a key that has no entry, e.g. after an error response."""
+        with self._lock:
+            if key not in self._entries:
+                self._key_locks.pop(key, None)
+
+    def _respond(self, entry):
+        """Build the response, answering 304 if the client already has this version."""
+        if entry.etag in request.if_none_match:
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        # Logged-in data: browsers may keep it but must revalidate each time
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def stats(self):
+        """Return hit/miss counters."""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "not_modified": self.not_modified, "evictions": self.evictions}
+
+response_cache = ResponseCache()
@@ -0,0 +1,225 @@
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import datetime
+from functools import wraps
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from config import (SLOW_TRACE_THRESHOLD_MS, SLOW_TRACE_LOG_FILE, SLOW_TRACE_LOG_MAX_BYTES,
+                    SLOW_TRACE_LOG_BACKUPS, PROFILE_FOLDER)
+
+logger = logging.getLogger(__name__)
+
+class Tracer:
+    def __init__(self, threshold_ms=SLOW_TRACE_THRESHOLD_MS, log_file=SLOW_TRACE_LOG_FILE):
+        """Initialize tracer that records per-stage spans for each request."""
+        self.threshold_ms = threshold_ms
+        self.log_file = log_file
+        self._local = threading.local()
+        self._slow_logger = None
+        self._logger_lock = threading.Lock()
+
+    def _get_slow_logger(self):
+        """Get the rotating logger used for slow traces."""
+        if self._slow_logger is None:
+            with self._logger_lock:
+                if self._slow_logger is None:
+                    os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+                    slow_logger = logging.getLogger('smart_enterprise.slow_traces')
+                    slow_logger.propagate = False
+                    slow_logger.setLevel(logging.INFO)
+                    handler = RotatingFileHandler(self.log_file, maxBytes=SLOW_TRACE_LOG_MAX_BYTES,
+                                                  backupCount=SLOW_TRACE_LOG_BACKUPS)
+                    handler.setFormatter(logging.Formatter('%(message)s'))
+                    slow_logger.addHandler(handler)
+                    self._slow_logger = slow_logger
+        return self._slow_logger
+
+    def _current(self):
+        """Get the active trace for this thread, if any."""
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Start a root trace; nested spans are attached to it."""
+        if self._current() is not None:
+            # Already inside a trace, record as a span instead
+            with self.span(name, **attributes):
+                yield
+            return
+
+        trace = {
+            "name": name,
+            "started_at": datetime.datetime.now().isoformat(),
+            "attributes": attributes,
+            "spans": [],
+            "depth": 0,
+            "start": time.perf_counter()
+        }
+        self._local.trace = trace
+        try:
+            yield
+        finally:
+            self._local.trace = None
+            duration_ms = (time.perf_counter() - trace["start"]) * 1000
+            if duration_ms >= self.threshold_ms:
+                self._log_slow_trace(trace, duration_ms)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Record a timed span inside the active trace."""
+        trace = self._current()
+        if trace is None:
+            yield
+            return
+
+        depth = trace["depth"]
+        trace["depth"] = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace["depth"] = depth
+            trace["spans"].append({
+                "name": name,
+                "depth": depth,
+                "offset_ms": round((start - trace["start"]) * 1000, 3),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                **attributes
+            })
+
+    def annotate(self, **attributes):
+        """Attach attributes to the active trace."""
+        trace = self._current()
+        if trace is not None:
+            trace["attributes"].update(attributes)
+
+    def _log_slow_trace(self, trace, duration_ms):
+        """Write a slow trace to the rotating trace log."""
+        try:
+            spans = sorted(trace["spans"], key=lambda s: s["offset_ms"])
+            record = {
+                "trace": trace["name"],
+                "started_at": trace["started_at"],
+                "duration_ms": round(duration_ms, 3),
+                "attributes": trace["attributes"],
+                "spans": spans
+            }
+            self._get_slow_logger().info(json.dumps(record, default=str))
+            logger.warning(f"Slow trace {trace['name']}: {duration_ms:.0f} ms")
+        except Exception as e:
+            logger.error(f"Error writing slow trace: {e}")
+
+def traced(name):
+    """Decorator to record a function call as a span of the active trace."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class ProfilerManager:
+    def __init__(self, output_folder=PROFILE_FOLDER):
+        """Initialize on-demand cProfile capture."""
+        self.output_folder = output_folder
+        self._lock = threading.Lock()
+        # cProfile only supports one active profiler per process
+        self._active = threading.Lock()
+        self._remaining = 0
+        self._sample_every = 1
+        self._seen = 0
+        self._captured = 0
+        self._stats = None
+        self.stats_file = None
+
+    def start(self, requests=10, sample_every=1):
+        """Capture profiles for the next N sampled requests."""
+        with self._lock:
+            self._remaining = max(int(requests), 0)
+            self._sample_every = max(int(sample_every), 1)
+            self._seen = 0
+            self._captured = 0
+            self._stats = None
+        logger.info(f"Profiling enabled for {requests} requests (1 in {sample_every})")
+
+    def stop(self):
+        """Stop capturing and write any collected stats."""
+        with self._lock:
+            self._remaining = 0
+            self._dump_stats()
+
+    def status(self):
+        """Return the profiler state."""
+        with self._lock:
+            return {
+                "enabled": self._remaining > 0,
+                "remaining": self._remaining,
+                "sample_every": self._sample_every,
+                "captured": self._captured,
+                "stats_file": os.path.basename(self.stats_file) if self.stats_file else None
+            }
+
+    def _should_sample(self):
+        """Decide whether the current request should be profiled."""
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._seen += 1
+            return (self._seen - 1) % self._sample_every == 0
+
+    @contextmanager
+    def profile_request(self):
+        """Profile the wrapped block if a capture is running."""
+        if not self._should_sample() or not self._active.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+        finally:
+            self._active.release()
+            self._collect(profiler)
+
+    def _collect(self, profiler):
+        """Merge a finished profile into the accumulated stats."""
+        with self._lock:
+            if self._remaining <= 0:
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler, stream=io.StringIO())
+            else:
+                self._stats.add(profiler)
+            self._captured += 1
+            self._remaining -= 1
+            if self._remaining == 0:
+                self._dump_stats()
+
+    def _dump_stats(self):
+        """Write accumulated stats to disk. Caller must hold the lock."""
+        if self._stats is None:
+            return
+        try:
+            os.makedirs(self.output_folder, exist_ok=True)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(self.output_folder, f"profile_{timestamp}.prof")
+            self._stats.dump_stats(path)
+            self.stats_file = os.path.abspath(path)
+            self._stats = None
+            logger.info(f"Profile stats written to {path}")
+        except Exception as e:
+            logger.error(f"Error writing profile stats: {e}")
+
+tracer = Tracer()
+profiler = ProfilerManager()
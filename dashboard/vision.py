@@ -1,109 +1,313 @@
-import cv2
-import face_recognition
 import numpy as np
+import io
 import os
+import json
 import logging
+import threading
+from contextlib import nullcontext
 from typing import List, Tuple, Optional
+from tracing import tracer
+from config import (FACE_QUALITY_POLICY, FACE_MIN_SIZE, FACE_MIN_SHARPNESS, FACE_MIN_BRIGHTNESS,
+                    FACE_MAX_BRIGHTNESS)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Imported on first use: importing face_recognition loads the dlib models,
+# which takes long enough to delay server startup
+cv2 = None
+face_recognition = None
+_backend_lock = threading.Lock()
+
+def _load_backend():
+    """Import OpenCV and face_recognition if not done yet."""
+    global cv2, face_recognition
+    if face_recognition is None:
+        with _backend_lock:
+            if face_recognition is None:
+                import cv2 as cv2_module
+                import face_recognition as face_recognition_module
+                cv2 = cv2_module
+                face_recognition = face_recognition_module
+
+# Faces are rescaled to this size before measuring sharpness, so the
+# threshold does not depend on how far the person stands from the camera
+QUALITY_SCALE = 96
+
+class FaceQualityPolicy:
+    def __init__(self, mode=FACE_QUALITY_POLICY, min_size=FACE_MIN_SIZE, min_sharpness=FACE_MIN_SHARPNESS,
+                 min_brightness=FACE_MIN_BRIGHTNESS, max_brightness=FACE_MAX_BRIGHTNESS):
+        """Thresholds deciding which detected faces are worth encoding."""
+        if mode not in ('reject', 'report', 'off'):
+            raise ValueError(f"Unknown face quality policy: {mode}")
+        self.mode = mode
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+    
+    def assess(self, gray_image, location) -> Optional[dict]:
+        """Score one face box; returns None when the policy is off."""
+        if self.mode == 'off':
+            return None
+        top, right, bottom, left = location
+        crop = gray_image[max(top, 0):bottom, max(left, 0):right]
+        size = min(bottom - top, right - left)
+        if crop.size == 0:
+            return {"size": size, "sharpness": 0.0, "brightness": 0.0, "passed": False, "reasons": ["size"]}
+        
+        scaled = cv2.resize(crop, (QUALITY_SCALE, QUALITY_SCALE), interpolation=cv2.INTER_AREA)
+        sharpness = float(cv2.Laplacian(scaled, cv2.CV_64F).var())
+        brightness = float(crop.mean())
+        
+        reasons = []
+        if size < self.min_size:
+            reasons.append("size")
+        if sharpness < self.min_sharpness:
+            reasons.append("sharpness")
+        if not self.min_brightness <= brightness <= self.max_brightness:
+            reasons.append("exposure")
+        return {"size": int(size), "sharpness": round(sharpness, 1), "brightness": round(brightness, 1),
+                "passed": not reasons, "reasons": reasons}
+    
+    def accepts(self, quality) -> bool:
+        """Whether a scored face should be encoded."""
+        return self.mode != 'reject' or quality is None or quality["passed"]
+def pack_faces(faces, encodings):
+    """Serialize detected faces and the encodings of the accepted ones for the photo_encodings cache."""
+    stored = [{"box": face["box"], "quality": face["quality"], "accepted": face["accepted"]} for face in faces]
+    blob = np.asarray(encodings, dtype=np.float64).tobytes() if len(encodings) else None
+    return json.dumps(stored), blob
+
+def unpack_faces(faces_json, blob):
+    """Rebuild faces (without names) and encodings from the photo_encodings cache."""
+    faces = [dict(face, name=None, distance=None) for face in json.loads(faces_json)]
+    encodings = list(np.frombuffer(blob, dtype=np.float64).reshape(-1, 128)) if blob else []
+    return faces, encodings
+
+
 class FaceRecognizer:
-    def __init__(self, tolerance: float = 0.6):
-        """Initialize face recognizer with configurable tolerance."""
-        self.known_face_encodings = []
-        self.known_face_names = []
+    def __init__(self, tolerance: float = 0.6, gallery_store=None, quality_policy=None, recognition_budget=None):
+        """Initialize face recognizer with configurable tolerance, optional shared gallery and CPU budget."""
+        self._gallery = ([], [])
+        self._gallery_version = None
+        self._gallery_lock = threading.Lock()
+        self.gallery_store = gallery_store
         self.tolerance = tolerance
+        self.quality_policy = quality_policy or FaceQualityPolicy()
+        self.recognition_budget = recognition_budget
+    
+    @property
+    def known_face_encodings(self):
+        """Encodings of the current gallery."""
+        return self._gallery[0]
+    
+    @property
+    def known_face_names(self):
+        """Names matching known_face_encodings."""
+        return self._gallery[1]
+    
+    def set_known_faces(self, encodings, names) -> None:
+        """Replace the gallery in one step so readers never see a half-built one."""
+        if self.gallery_store is None:
+            with self._gallery_lock:
+                self._gallery = (list(encodings), list(names))
+            return
+        # Other worker processes pick the new version up on their next match
+        self.gallery_store.publish(encodings, names)
+        self.sync_gallery()
+    
+    def add_known_faces(self, encodings, names) -> None:
+        """Append faces to the current gallery, publishing it once."""
+        if self.gallery_store is None:
+            with self._gallery_lock:
+                known_encodings, known_names = self._gallery
+                self._gallery = (list(known_encodings) + list(encodings), list(known_names) + list(names))
+            return
+        # Read-modify-write under the gallery lock so concurrent publishes are not lost
+        self.gallery_store.append(encodings, names)
+        self.sync_gallery()
+    
+    def sync_gallery(self) -> Optional[int]:
+        """Map the latest shared gallery if a newer version was published."""
+        if self.gallery_store is None:
+            return None
+        version = self.gallery_store.current_version()
+        if version != self._gallery_version:
+            version, encodings, names = self.gallery_store.load(version)
+            self._gallery = (encodings, names)
+            self._gallery_version = version
+            logger.info(f"Using gallery version {version} ({len(names)} faces)")
+        return version
+    
+    def load_models(self) -> None:
+        """Load OpenCV and the dlib face models."""
+        _load_backend()
         
     def load_known_faces(self, faces_directory: str) -> None:
         """Load known faces from a directory containing subdirectories for each person."""
         if not os.path.exists(faces_directory):
             logger.error(f"Faces directory not found: {faces_directory}")
             return
-            
-        loaded_count = 0
+        
+        _load_backend()
+        encodings, names = [], []
         for person_name in os.listdir(faces_directory):
             person_dir = os.path.join(faces_directory, person_name)
             if os.path.isdir(person_dir):
                 for image_file in os.listdir(person_dir):
                     if self._is_image_file(image_file):
                         image_path = os.path.join(person_dir, image_file)
-                        if self._add_known_face(image_path, person_name):
-                            loaded_count += 1
+                        encoding = self._encode_known_face(image_path, person_name)
+                        if encoding is not None:
+                            encodings.append(encoding)
+                            names.append(person_name)
         
-        logger.info(f"Loaded {loaded_count} known faces from {faces_directory}")
+        # The previous gallery keeps serving until the new one is complete
+        self.set_known_faces(encodings, names)
+        logger.info(f"Loaded {len(encodings)} known faces from {faces_directory}")
     
     def _is_image_file(self, filename: str) -> bool:
         """Check if file is a supported image format."""
         return filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))
     
-    def _add_known_face(self, image_path: str, name: str) -> bool:
-        """Add a single known face to the recognizer."""
+    def _encode_known_face(self, image_path: str, name: str):
+        """Compute the encoding of a single known face, or None if there is none."""
         try:
             image = face_recognition.load_image_file(image_path)
             encodings = face_recognition.face_encodings(image)
             
             if not encodings:
                 logger.warning(f"No faces found in {image_path}")
-                return False
+                return None
                 
-            self.known_face_encodings.append(encodings[0])
-            self.known_face_names.append(name)
             logger.info(f"Added face for {name} from {image_path}")
-            return True
+            return encodings[0]
             
         except Exception as e:
             logger.error(f"Error loading {image_path}: {e}")
-            return False
+            return None
     
     def recognize_faces_in_image(self, image_path: str) -> List[str]:
         """Recognize faces in a single image and return the names of recognized faces."""
+        return self.accepted_names(self.analyze_faces_in_image(image_path))
+    
+    def recognize_faces_in_bytes(self, image_data: bytes, source: str = "frame") -> List[str]:
+        """Recognize faces in an encoded image held in memory (e.g. a stream frame)."""
+        return self.accepted_names(self.analyze_faces_in_bytes(image_data, source))
+    
+    def analyze_faces_in_image(self, image_path: str, with_encodings: bool = False):
+        """
+        Detect, score and identify the faces in an image file.
+
+        With with_encodings, returns (faces, encodings of the accepted
+        faces), the encodings being None if the image could not be processed.
+        """
         if not os.path.exists(image_path):
             logger.error(f"Image file not found: {image_path}")
-            return []
+            return ([], None) if with_encodings else []
             
+        return self._analyze(image_path, image_path, with_encodings)
+    
+    def analyze_faces_in_bytes(self, image_data: bytes, source: str = "frame", with_encodings: bool = False):
+        """Detect, score and identify the faces in an encoded image held in memory (see analyze_faces_in_image)."""
+        return self._analyze(io.BytesIO(image_data), source, with_encodings)
+    
+    @staticmethod
+    def accepted_names(faces: List[dict]) -> List[str]:
+        """Names of the faces that passed the quality check."""
+        return [face["name"] for face in faces if face["accepted"]]
+    
+    def _analyze(self, image_file, source: str, with_encodings: bool = False):
+        """
+        Decode an image file or file-like object and identify its faces.
+
+        Returns one entry per detected face with its box, quality scores and
+        name. Faces rejected by the quality policy are not encoded and have
+        no name.
+        """
+        # Uploads and camera frames share the process-wide recognition budget
+        with self.recognition_budget.slot() if self.recognition_budget else nullcontext():
+            faces, face_encodings = self.detect_faces(image_file, source)
+        if faces is None:
+            return ([], None) if with_encodings else []
+        self.match_faces([face for face in faces if face["accepted"]], face_encodings)
+        return (faces, face_encodings) if with_encodings else faces
+    
+    def detect_faces(self, image_file, source: str = "frame") -> Tuple[Optional[List[dict]], list]:
+        """
+        Detect and score the faces of an image and encode the accepted ones.
+
+        Returns the faces (without names) and the encodings of the accepted
+        faces, in order, or None for the faces if the image could not be
+        processed. Matching is left to match_faces.
+        """
+        _load_backend()
         try:
-            image = face_recognition.load_image_file(image_path)
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            with tracer.span('vision.decode'):
+                image = face_recognition.load_image_file(image_file)
+                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            
+            with tracer.span('vision.face_locations'):
+                face_locations = face_recognition.face_locations(rgb_image)
             
-            face_locations = face_recognition.face_locations(rgb_image)
-            face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+            if not face_locations:
+                logger.info(f"No faces detected in {source}")
+                return [], []
             
-            if not face_encodings:
-                logger.info(f"No faces detected in {image_path}")
-                return []
+            with tracer.span('vision.quality', faces=len(face_locations)):
+                gray_image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+                faces = []
+                for location in face_locations:
+                    quality = self.quality_policy.assess(gray_image, location)
+                    faces.append({"box": [int(v) for v in location], "quality": quality,
+                                  "accepted": self.quality_policy.accepts(quality), "name": None,
+                                  "distance": None})
             
-            face_names = []
-            for face_encoding in face_encodings:
-                name = self._identify_face(face_encoding)
-                face_names.append(name)
-                logger.info(f"Face identified as: {name}")
+            accepted = [face for face in faces if face["accepted"]]
+            if len(accepted) < len(faces):
+                logger.info(f"Skipped {len(faces) - len(accepted)} low-quality faces in {source}")
+            if not accepted:
+                return faces, []
             
-            return face_names
+            with tracer.span('vision.face_encodings', faces=len(accepted)):
+                face_encodings = face_recognition.face_encodings(
+                    rgb_image, [tuple(face["box"]) for face in accepted])
+            return faces, face_encodings
             
         except Exception as e:
-            logger.error(f"Error processing image {image_path}: {e}")
-            return []
+            logger.error(f"Error processing image {source}: {e}")
+            return None, []
+    
+    def match_faces(self, faces: List[dict], face_encodings) -> None:
+        """Set the name and distance of each face from its encoding against the current gallery."""
+        if not faces:
+            return
+        _load_backend()
+        self.sync_gallery()
+        with tracer.span('vision.match', gallery=len(self.known_face_encodings)):
+            for face, face_encoding in zip(faces, face_encodings):
+                face["name"], face["distance"] = self._match_face(face_encoding)
+                logger.info(f"Face identified as: {face['name']}")
     
     def _identify_face(self, face_encoding) -> str:
         """Identify a single face encoding."""
-        if not self.known_face_encodings:
-            return "Unknown"
-            
-        matches = face_recognition.compare_faces(
-            self.known_face_encodings, face_encoding, tolerance=self.tolerance
-        )
-        
-        if not any(matches):
-            return "Unknown"
+        return self._match_face(face_encoding)[0]
+    
+    def _match_face(self, face_encoding) -> Tuple[str, Optional[float]]:
+        """Return the best matching name and its distance (None with an empty gallery)."""
+        known_face_encodings, known_face_names = self._gallery
+        if len(known_face_encodings) == 0:
+            return "Unknown", None
             
         face_distances = face_recognition.face_distance(
-            self.known_face_encodings, face_encoding
+            known_face_encodings, face_encoding
         )
         best_match_index = np.argmin(face_distances)
+        best_distance = round(float(face_distances[best_match_index]), 4)
         
-        if matches[best_match_index]:
-            return self.known_face_names[best_match_index]
+        if face_distances[best_match_index] <= self.tolerance:
+            return known_face_names[best_match_index], best_distance
         
-        return "Unknown"
\ No newline at end of file
+        return "Unknown", best_distance
\ No newline at end of file
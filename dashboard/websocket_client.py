@@ -1,41 +1,156 @@
+import time
+import threading
 import websocket
 import logging
-from config import ESP32_WEBSOCKET_URL
+from config import ESP32_WEBSOCKET_URL, BOARD_CONNECT_TIMEOUT, BOARD_RECEIVE_TIMEOUT
+from tracing import traced
 
 logger = logging.getLogger(__name__)
 
+TELEMETRY_SENSORS = ('temp', 'humidity', 'pir')
+TELEMETRY_VERSION = 1
+# Batched frame: 't1:<seq>,<board millis>,<temp>,<humidity>,<pir>'.
+# An empty reading field means the sensor is not part of that frame.
+TELEMETRY_PREFIX = f"t{TELEMETRY_VERSION}:"
+
+def encode_telemetry(seq, ts, readings):
+    """Build a batched telemetry frame from a {sensor: value} dict."""
+    fields = []
+    for sensor in TELEMETRY_SENSORS:
+        value = readings.get(sensor)
+        if value is None:
+            fields.append('')
+        elif sensor == 'pir':
+            fields.append(str(int(value)))
+        else:
+            fields.append('nan' if value != value else f"{value:.2f}")
+    return TELEMETRY_PREFIX + ','.join([str(seq), str(ts)] + fields)
+
+def decode_telemetry(message: str):
+    """
+    Decode a telemetry frame into {"version", "seq", "ts", "readings"}.
+
+    Legacy 'sensor:value' frames decode as version 0 without seq/ts.
+    Returns None for anything else (command echoes, unknown versions).
+    """
+    if message.startswith(TELEMETRY_PREFIX):
+        fields = message[len(TELEMETRY_PREFIX):].split(',')
+        if len(fields) != 2 + len(TELEMETRY_SENSORS):
+            return None
+        try:
+            readings = {sensor: float(value)
+                        for sensor, value in zip(TELEMETRY_SENSORS, fields[2:]) if value}
+            return {"version": TELEMETRY_VERSION, "seq": int(fields[0]), "ts": int(fields[1]),
+                    "readings": readings}
+        except ValueError:
+            return None
+
+    sensor, separator, value = message.partition(':')
+    if not separator or sensor not in TELEMETRY_SENSORS:
+        return None
+    try:
+        return {"version": 0, "seq": None, "ts": None, "readings": {sensor: float(value)}}
+    except ValueError:
+        return None
+
 class WebSocketClient:
-    def __init__(self):
+    def __init__(self, websocket_url=ESP32_WEBSOCKET_URL, board_id=None):
         self.ws_connection = None
-        self.websocket_url = ESP32_WEBSOCKET_URL
+        self.websocket_url = websocket_url
+        self.board_id = board_id
         self.db_manager = None
-    
+        self.message_handler = None
+        self.last_message_at = None
+        self._send_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+
     def set_database_manager(self, db_manager):
         """Set the database manager for status tracking."""
         self.db_manager = db_manager
-    
+
+    def set_message_handler(self, handler):
+        """Set a callback(board_id, message) for frames received from the board."""
+        self.message_handler = handler
+
+    @traced('ws.connect')
     def connect(self):
         """Establish WebSocket connection to ESP32."""
+        with self._connect_lock:
+            if self.ws_connection is not None:
+                return True
+            try:
+                ws_connection = websocket.WebSocket()
+                ws_connection.connect(self.websocket_url, timeout=BOARD_CONNECT_TIMEOUT)
+                ws_connection.settimeout(BOARD_RECEIVE_TIMEOUT)
+                self.ws_connection = ws_connection
+                self.last_message_at = time.time()
+                logger.info(f"Connected to ESP32 WebSocket {self.websocket_url}")
+            except Exception as e:
+                logger.error(f"Failed to connect to ESP32 {self.websocket_url}: {e}")
+                self.ws_connection = None
+                return False
+
+        if self.message_handler:
+            threading.Thread(target=self._listen, args=(ws_connection,),
+                             name=f"board-{self.board_id}", daemon=True).start()
+        return True
+
+    def disconnect(self, ws_connection=None):
+        """Close the connection (only if it is still the given one)."""
+        with self._connect_lock:
+            ws_connection = ws_connection or self.ws_connection
+            if ws_connection is None or ws_connection is not self.ws_connection:
+                return
+            self.ws_connection = None
+        try:
+            ws_connection.close()
+        except Exception:
+            pass
+
+    def _listen(self, ws_connection):
+        """Receive frames from the board until the connection drops."""
+        while self.ws_connection is ws_connection:
+            try:
+                message = ws_connection.recv()
+            except Exception as e:
+                if self.ws_connection is ws_connection:
+                    logger.warning(f"Connection to {self.websocket_url} lost: {e}")
+                    self.disconnect(ws_connection)
+                break
+            self.last_message_at = time.time()
+            if isinstance(message, str) and message:
+                try:
+                    self.message_handler(self.board_id, message)
+                except Exception as e:
+                    logger.error(f"Error handling message from {self.websocket_url}: {e}")
+
+    def check_health(self) -> bool:
+        """Ping the board, reconnecting if the connection is down."""
+        ws_connection = self.ws_connection
+        if ws_connection is None:
+            return self.connect()
         try:
-            self.ws_connection = websocket.WebSocket()
-            self.ws_connection.connect(self.websocket_url)
-            logger.info("Connected to ESP32 WebSocket")
+            with self._send_lock:
+                ws_connection.ping()
             return True
         except Exception as e:
-            logger.error(f"Failed to connect to ESP32: {e}")
-            self.ws_connection = None
-            return False
-    
+            logger.warning(f"Health check failed for {self.websocket_url}: {e}")
+            self.disconnect(ws_connection)
+            return self.connect()
+
+    @traced('ws.send_command')
     def send_command(self, command: str) -> bool:
         """Send command to ESP32 and track device status."""
         try:
             if self.ws_connection is None:
                 self.connect()
-            
-            if self.ws_connection:
-                self.ws_connection.send(command)
+
+            ws_connection = self.ws_connection
+            if ws_connection:
+                with self._send_lock:
+                    ws_connection.send(command)
                 logger.info(f"Sent command: {command}")
-                
+
                 # Track device status based on command
                 if self.db_manager:
                     if command == 'turn_on_lamp':
@@ -50,13 +165,13 @@ class WebSocketClient:
                     elif command == 'turn_off_pris':
                         self.db_manager.update_device_status('outlet', 'off')
                         self.db_manager.save_energy_event('outlet', 'off')
-                
+
                 return True
         except Exception as e:
             logger.error(f"Error sending command: {e}")
-            self.ws_connection = None
+            self.disconnect()
         return False
-    
+
     def is_connected(self):
         """Check if WebSocket is connected."""
         return self.ws_connection is not None
@@ -0,0 +1,6 @@
+from app import SmartEnterpriseServer
+
+# Entry point for WSGI servers, e.g. gunicorn -c gunicorn.conf.py wsgi:app
+server = SmartEnterpriseServer()
+server.start_background_tasks()
+app = server.app
@@ -22,5 +22,10 @@
 
 // Timing constants
 #define SENSOR_READ_DELAY 1000  // milliseconds
+#define PIR_DEBOUNCE_DELAY 50   // milliseconds
+
+// Telemetry: one batched frame "t1:<seq>,<millis>,<temp>,<humidity>,<pir>"
+#define TELEMETRY_VERSION 1
+#define TELEMETRY_LEGACY_FRAMES 0  // 1 = also send the old temp:/humidity:/pir: frames
 
 #endif // CONFIG_H
\ No newline at end of file
@@ -10,6 +10,7 @@ void printWiFiStatus();
 void setupWebSocket();
 void handle_received_msg(String message);
 void send_msg(String msg);
+void send_telemetry(String temp, String humidity, String pir);
 void websocketCleanup();
 
 AsyncWebServer server(80);
@@ -19,6 +20,9 @@ DHT dht11 = DHT(DHT11_PIN, DHT11);
 
 unsigned long lastTime = 0;
 unsigned long timerDelay = SENSOR_READ_DELAY;
+unsigned long telemetrySeq = 0;
+int lastPirValue = -1;
+unsigned long lastPirChange = 0;
 
 void setup()
 {
@@ -44,17 +48,18 @@ void setup()
 
 void loop()
 {
+  // Motion is reported as soon as it changes instead of waiting for the next reading
+  int pirValue = digitalRead(PIR_PIN);
+  if (pirValue != lastPirValue && (millis() - lastPirChange) > PIR_DEBOUNCE_DELAY) {
+    lastPirValue = pirValue;
+    lastPirChange = millis();
+    send_telemetry("", "", String(pirValue));
+  }
+
   if ((millis() - lastTime) > timerDelay) {
     float temp = dht11.readTemperature();
     float humidity = dht11.readHumidity();
-    int pirValue = digitalRead(PIR_PIN);
-    
-    String sensorTemp = "temp:" + String(temp);
-    String sensorHumd = "humidity:" + String(humidity);
-    String sensorPIR = "pir:" + String(pirValue);
-    send_msg(sensorTemp);
-    send_msg(sensorHumd);
-    send_msg(sensorPIR);
+    send_telemetry(String(temp), String(humidity), String(lastPirValue));
     
     lastTime = millis();
   }
@@ -115,6 +120,22 @@ void send_msg(String msg){
   ws.textAll(msg);
 }
 
+// Send all readings in one frame; an empty field means the sensor is not included
+void send_telemetry(String temp, String humidity, String pir){
+  if (ws.count() == 0) {
+    return;
+  }
+  String frame = "t" + String(TELEMETRY_VERSION) + ":" + String(telemetrySeq++) + "," + String(millis())
+    + "," + temp + "," + humidity + "," + pir;
+  send_msg(frame);
+
+#if TELEMETRY_LEGACY_FRAMES
+  if (temp.length() > 0) send_msg("temp:" + temp);
+  if (humidity.length() > 0) send_msg("humidity:" + humidity);
+  if (pir.length() > 0) send_msg("pir:" + pir);
+#endif
+}
+
 void websocketCleanup() {
   ws.cleanupClients();
 }
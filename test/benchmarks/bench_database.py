@@ -0,0 +1,143 @@
+import os
+import time
+import sqlite3
+import tempfile
+import datetime
+from common import summarize, time_call, make_result
+
+SUITE = 'database'
+DEFAULT_ROWS = 1000000
+QUICK_ROWS = 10000
+SEED_BATCH = 50000
+SPREAD_DAYS = 30
+# Sensor and energy history covers several monthly partitions, more than sensor retention keeps
+HISTORY_DAYS = 240
+# Legacy single-table layout; init_database() moves these rows into monthly partitions
+LEGACY_TABLES = {
+    'sensor_data': 'sensor_type TEXT NOT NULL, value REAL NOT NULL, timestamp DATETIME, board_id INTEGER',
+    'energy_usage': 'device_name TEXT NOT NULL, state TEXT NOT NULL, timestamp DATETIME, '
+                    'duration_minutes REAL DEFAULT 0',
+}
+
+
+def _timestamps(count, now, days=SPREAD_DAYS):
+    """Yield SQLite timestamps spread evenly over the given number of days before now."""
+    step = days * 86400 / max(count, 1)
+    start = now - datetime.timedelta(days=days)
+    for i in range(count):
+        yield (start + datetime.timedelta(seconds=i * step)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _insert(cursor, sql, rows_iter):
+    batch = []
+    for row in rows_iter:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH:
+            cursor.executemany(sql, batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+
+
+def seed_history(db_file, rows):
+    """
+    Bulk-load energy_usage and sensor_data with HISTORY_DAYS of synthetic history.
+
+    Inserts through the partitioned views would all land in the current
+    month, so the rows are written to unpartitioned tables for
+    init_database() to split into one partition per month.
+    """
+    # Stored timestamps are UTC, like CURRENT_TIMESTAMP
+    now = datetime.datetime.utcnow()
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    for table, columns in LEGACY_TABLES.items():
+        cursor.execute(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})')
+    _insert(cursor, 'INSERT INTO energy_usage (device_name, state, timestamp) VALUES (?, ?, ?)',
+            (('lamp' if i % 4 < 2 else 'outlet', 'on' if i % 2 == 0 else 'off', ts)
+             for i, ts in enumerate(_timestamps(rows, now, HISTORY_DAYS))))
+    _insert(cursor, 'INSERT INTO sensor_data (sensor_type, value, timestamp) VALUES (?, ?, ?)',
+            ((('temp', 'humidity', 'pir')[i % 3], float(i % 40), ts)
+             for i, ts in enumerate(_timestamps(rows, now, HISTORY_DAYS))))
+    conn.commit()
+    conn.close()
+
+
+def seed_photos(db_file, rows):
+    """Bulk-load photos with SPREAD_DAYS of synthetic access history."""
+    now = datetime.datetime.utcnow()
+    conn = sqlite3.connect(db_file)
+    names = ['Alice', 'Bob', 'Unknown', 'Carol', 'Dave']
+    _insert(conn.cursor(), 'INSERT INTO photos (filename, timestamp, recognized_faces) VALUES (?, ?, ?)',
+            ((f"{i}.jpg", ts, names[i % len(names)]) for i, ts in enumerate(_timestamps(rows, now))))
+    conn.commit()
+    conn.close()
+
+
+def _count_rows(batches):
+    return sum(len(batch) for batch in batches)
+
+
+def run(quick=False, iterations=None, rows=None):
+    """Benchmark DatabaseManager writes and queries against large tables."""
+    from database import DatabaseManager
+    from response_cache import response_cache
+
+    rows = rows or (QUICK_ROWS if quick else DEFAULT_ROWS)
+    count = iterations or (20 if quick else 100)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager()
+        db_manager.db_file = os.path.join(tmp_dir, 'bench.db')
+        # Writes invalidate cached responses; keep that away from a server running from this checkout
+        response_cache.use_file(os.path.join(tmp_dir, 'cache_generations'))
+
+        print(f"  seeding {rows} rows per table...")
+        seed_history(db_manager.db_file, rows)
+        started = time.perf_counter()
+        db_manager.init_database()
+        migrate_seconds = time.perf_counter() - started
+        seed_photos(db_manager.db_file, rows)
+        params = {"rows": rows}
+        results.append(make_result(SUITE, 'partition_migration', params, summarize([migrate_seconds])))
+        print(f"  partition_migration: {results[-1]['mean_ms']} ms")
+
+        # A window crossing the boundary between the two previous months
+        last_month = datetime.datetime.utcnow().replace(day=1) - datetime.timedelta(days=1)
+        window = (last_month - datetime.timedelta(days=last_month.day + 14), last_month - datetime.timedelta(days=10))
+
+        state = {"index": 0}
+
+        def save_photo():
+            state["index"] += 1
+            db_manager.save_photo_record(f"bench_{state['index']}.jpg", ['Alice'])
+
+        def save_energy():
+            db_manager.save_energy_event('lamp', 'on' if state["index"] % 2 else 'off')
+            state["index"] += 1
+
+        cases = [
+            ('save_photo_record', save_photo, count),
+            ('save_energy_event', save_energy, count),
+            ('update_device_status', lambda: db_manager.update_device_status('lamp', 'on'), count),
+            ('get_device_status', lambda: db_manager.get_device_status('lamp'), count),
+            ('get_recent_energy_activity', lambda: db_manager.get_recent_energy_activity(10), count),
+            ('calculate_device_usage_time_1d',
+             lambda: db_manager.calculate_device_usage_time('lamp', 1), max(count // 10, 3)),
+            ('calculate_device_usage_time_90d',
+             lambda: db_manager.calculate_device_usage_time('lamp', 90), 3),
+            ('iter_sensor_data_cross_partition', lambda: _count_rows(db_manager.iter_sensor_data(*window)), 3),
+            ('get_all_photos', db_manager.get_all_photos, 3),
+        ]
+        for name, func, case_count in cases:
+            samples = time_call(func, case_count)
+            results.append(make_result(SUITE, name, params, summarize(samples)))
+            print(f"  {name}: {results[-1]['mean_ms']} ms ({results[-1]['ops_per_sec']} ops/s)")
+
+        # Dropping the months past retention can only be timed once, so no warmup
+        dropped = []
+        samples = time_call(lambda: dropped.extend(db_manager.maintain_partitions()), 1, warmup=0)
+        results.append(make_result(SUITE, 'maintain_partitions_retention', params, summarize(samples)))
+        print(f"  maintain_partitions_retention: {results[-1]['mean_ms']} ms ({len(dropped)} partitions dropped)")
+    return results
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import numpy as np
+from common import summarize, time_call, make_result
+
+SUITE = 'detection'
+# ESP32-CAM frame sizes used by cam_board
+RESOLUTIONS = {
+    'QVGA': (320, 240),
+    'SVGA': (800, 600),
+    'UXGA': (1600, 1200)
+}
+
+
+def make_frame(width, height, rng, source_image=None):
+    """
+    Create a BGR test frame at the given resolution.
+
+    A real face photo can be supplied so that the detector finds faces;
+    otherwise a synthetic gradient with noise is generated.
+    """
+    import cv2
+
+    if source_image is not None:
+        return cv2.resize(source_image, (width, height), interpolation=cv2.INTER_AREA)
+
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    gradient = (x[None, :] + y[:, None]) / 2
+    frame = np.repeat(gradient[:, :, None], 3, axis=2)
+    frame += rng.normal(0, 20, size=frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def run(quick=False, iterations=None, image_path=None, seed=42):
+    """Benchmark image decode, face detection and the full recognition call."""
+    import cv2
+    import face_recognition
+    from vision import FaceRecognizer
+
+    rng = np.random.default_rng(seed)
+    source_image = cv2.imread(image_path) if image_path else None
+    if image_path and source_image is None:
+        raise ValueError(f"Could not read image: {image_path}")
+
+    recognizer = FaceRecognizer()
+    count = iterations or (3 if quick else 10)
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, (width, height) in RESOLUTIONS.items():
+            frame = make_frame(width, height, rng, source_image)
+            frame_path = os.path.join(tmp_dir, f"{label}.jpg")
+            cv2.imwrite(frame_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            params = {"resolution": label, "width": width, "height": height,
+                      "synthetic": source_image is None}
+
+            samples = time_call(lambda: face_recognition.load_image_file(frame_path), count)
+            results.append(make_result(SUITE, 'decode', params, summarize(samples)))
+
+            image = face_recognition.load_image_file(frame_path)
+            samples = time_call(lambda: face_recognition.face_locations(image), count)
+            results.append(make_result(SUITE, 'face_locations', params, summarize(samples)))
+
+            samples = time_call(lambda: recognizer.recognize_faces_in_image(frame_path), count)
+            results.append(make_result(SUITE, 'recognize_faces_in_image', params, summarize(samples)))
+
+            print(f"  {label}: decode {results[-3]['mean_ms']} ms, "
+                  f"detect {results[-2]['mean_ms']} ms, full {results[-1]['mean_ms']} ms")
+    return results
@@ -0,0 +1,57 @@
+import numpy as np
+from common import summarize, time_call, make_result
+
+SUITE = 'matching'
+GALLERY_SIZES = [100, 1000, 10000, 100000]
+QUICK_GALLERY_SIZES = [100, 1000]
+ENCODING_SIZE = 128
+
+
+def make_gallery(size, rng):
+    """
+    Create a synthetic gallery of face encodings.
+
+    Encodings are scaled so that distances between different people fall
+    well above the default tolerance, as with real dlib encodings.
+    """
+    encodings = rng.normal(0, 0.09, size=(size, ENCODING_SIZE))
+    names = [f"person_{i // 3}" for i in range(size)]
+    return list(encodings), names
+
+
+def make_probes(gallery, count, rng):
+    """Create probe encodings: half near gallery entries, half strangers."""
+    probes = []
+    for i in range(count):
+        if i % 2 == 0:
+            base = gallery[rng.integers(len(gallery))]
+            probes.append(base + rng.normal(0, 0.01, size=ENCODING_SIZE))
+        else:
+            probes.append(rng.normal(0, 0.09, size=ENCODING_SIZE))
+    return probes
+
+
+def run(quick=False, iterations=None, seed=42):
+    """Benchmark FaceRecognizer matching latency against synthetic galleries."""
+    from vision import FaceRecognizer
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in (QUICK_GALLERY_SIZES if quick else GALLERY_SIZES):
+        recognizer = FaceRecognizer()
+        recognizer.load_models()
+        recognizer.set_known_faces(*make_gallery(size, rng))
+        probes = make_probes(recognizer.known_face_encodings, 64, rng)
+
+        count = iterations or (50 if quick else 200)
+        state = {"index": 0}
+
+        def identify():
+            probe = probes[state["index"] % len(probes)]
+            state["index"] += 1
+            recognizer._identify_face(probe)
+
+        samples = time_call(identify, count)
+        results.append(make_result(SUITE, 'identify_face', {"gallery_size": size}, summarize(samples)))
+        print(f"  identify_face gallery={size}: {results[-1]['mean_ms']} ms")
+    return results
@@ -0,0 +1,94 @@
+import os
+import time
+import threading
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from common import summarize, make_result
+
+SUITE = 'upload'
+CONCURRENCY_LEVELS = [1, 4, 16]
+QUICK_CONCURRENCY_LEVELS = [1, 4]
+# Nothing listens here, so door commands fail fast instead of hanging
+OFFLINE_WEBSOCKET_URL = "ws://127.0.0.1:9/ws"
+
+
+def start_server(work_dir, websocket_url=OFFLINE_WEBSOCKET_URL):
+    """Start the dashboard server in a background thread on a free port."""
+    import config
+    config.ESP32_WEBSOCKET_URL = websocket_url
+
+    from werkzeug.serving import make_server
+    os.chdir(work_dir)
+    from app import SmartEnterpriseServer
+    from response_cache import response_cache
+    response_cache.use_file(os.path.join(work_dir, 'cache_generations'))
+
+    server = SmartEnterpriseServer()
+    server.start_background_tasks()
+    server.readiness.wait_for(('models', 'gallery'), timeout=120)
+    http_server = make_server('127.0.0.1', 0, server.app, threaded=True)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    return http_server, f"http://127.0.0.1:{http_server.server_port}/upload"
+
+
+def run_clients(upload_url, image_bytes, concurrency, requests_per_client):
+    """Post frames from concurrent clients and collect latencies."""
+    import requests
+
+    def client(_):
+        session = requests.Session()
+        samples, errors = [], 0
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                response = session.post(upload_url, files={'file': ('frame.jpg', image_bytes, 'image/jpeg')})
+                if response.status_code != 200:
+                    errors += 1
+            except requests.exceptions.RequestException:
+                errors += 1
+            samples.append(time.perf_counter() - start)
+        session.close()
+        return samples, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(client, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    samples = [s for client_samples, _ in outcomes for s in client_samples]
+    errors = sum(e for _, e in outcomes)
+    return samples, errors, elapsed
+
+
+def run(quick=False, iterations=None, image_path=None, seed=42):
+    """Benchmark end-to-end /upload requests per second with concurrent clients."""
+    import cv2
+    from bench_detection import make_frame, RESOLUTIONS
+
+    rng = np.random.default_rng(seed)
+    source_image = cv2.imread(image_path) if image_path else None
+    frame = make_frame(*RESOLUTIONS['QVGA'], rng, source_image)
+    image_bytes = cv2.imencode('.jpg', frame)[1].tobytes()
+    requests_per_client = iterations or (5 if quick else 25)
+
+    results = []
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        http_server, upload_url = start_server(tmp_dir)
+        try:
+            for concurrency in (QUICK_CONCURRENCY_LEVELS if quick else CONCURRENCY_LEVELS):
+                samples, errors, elapsed = run_clients(upload_url, image_bytes, concurrency,
+                                                       requests_per_client)
+                stats = summarize(samples)
+                stats["requests_per_sec"] = round(len(samples) / elapsed, 2) if elapsed > 0 else None
+                stats["errors"] = errors
+                params = {"concurrency": concurrency, "synthetic": source_image is None}
+                results.append(make_result(SUITE, 'upload', params, stats))
+                print(f"  concurrency={concurrency}: {stats['requests_per_sec']} req/s, "
+                      f"p95 {stats['p95_ms']} ms, errors {errors}")
+        finally:
+            http_server.shutdown()
+            os.chdir(original_cwd)
+    return results
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(BENCHMARKS_DIR, '..', '..'))
+DASHBOARD_DIR = os.path.join(REPO_ROOT, 'dashboard')
+
+# Make the dashboard modules importable the same way app.py imports them
+if DASHBOARD_DIR not in sys.path:
+    sys.path.insert(0, DASHBOARD_DIR)
+
+
+def summarize(samples, unit_count=1):
+    """Summarize per-iteration durations (seconds, unit_count operations each) as ms percentiles and ops/s."""
+    if not samples:
+        return {"iterations": 0}
+
+    ordered = sorted(samples)
+    total = sum(ordered)
+
+    def percentile(p):
+        index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index] * 1000
+
+    return {
+        "iterations": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p50_ms": round(percentile(50), 4),
+        "p95_ms": round(percentile(95), 4),
+        "p99_ms": round(percentile(99), 4),
+        "min_ms": round(ordered[0] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        "ops_per_sec": round(len(ordered) * unit_count / total, 2) if total > 0 else None
+    }
+
+
+def time_call(func, iterations, warmup=1):
+    """Time iterations calls of func after warmup untimed ones. Returns the durations in seconds."""
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_result(suite, name, params, stats):
+    """Build a single machine-readable benchmark record."""
+    return {"suite": suite, "name": name, "params": params, **stats}
+
+
+def result_key(result):
+    """Key used to match the same benchmark across runs."""
+    return (result["suite"], result["name"], json.dumps(result["params"], sort_keys=True))
+
+
+def _git_commit():
+    """Get the current git commit, if available."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def collect_metadata():
+    """Describe the environment the benchmarks ran in."""
+    return {
+        "created_at": datetime.datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def write_results(path, metadata, results):
+    """Write benchmark results as JSON."""
+    with open(path, 'w') as f:
+        json.dump({"metadata": metadata, "results": results}, f, indent=2)
@@ -0,0 +1,58 @@
+import sys
+import json
+import argparse
+from common import result_key
+
+# Metrics where a larger value is better; everything else is a latency
+HIGHER_IS_BETTER = {'ops_per_sec', 'requests_per_sec'}
+
+
+def load_results(path):
+    """Load a results file written by run_benchmarks.py."""
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("metadata", {}), {result_key(r): r for r in data.get("results", [])}
+
+
+def compare(baseline, candidate, metric, threshold):
+    """Compare two result sets on a metric. Returns (rows, regressions), rows being (key, old, new, change_pct)."""
+    rows, regressions = [], []
+    for key, new in candidate.items():
+        old = baseline.get(key)
+        if not old or old.get(metric) in (None, 0) or new.get(metric) is None:
+            continue
+        change = (new[metric] - old[metric]) / old[metric] * 100
+        rows.append((key, old[metric], new[metric], change))
+        worse = -change if metric in HIGHER_IS_BETTER else change
+        if worse > threshold:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline', help="Results from the reference commit")
+    parser.add_argument('candidate', help="Results from the commit under test")
+    parser.add_argument('--metric', default='p50_ms', help="Metric to compare (default: p50_ms)")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="Percent change counted as a regression (default: 10)")
+    args = parser.parse_args()
+
+    old_meta, baseline = load_results(args.baseline)
+    new_meta, candidate = load_results(args.candidate)
+    print(f"Baseline:  {old_meta.get('git_commit')}")
+    print(f"Candidate: {new_meta.get('git_commit')}")
+
+    rows, regressions = compare(baseline, candidate, args.metric, args.threshold)
+    for (suite, name, params), old, new, change in rows:
+        marker = ' REGRESSION' if (suite, name, params) in regressions else ''
+        print(f"{suite:10} {name:32} {params:45} {old:>12.3f} -> {new:>12.3f} ({change:+.1f}%){marker}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
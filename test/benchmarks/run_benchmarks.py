@@ -0,0 +1,52 @@
+import sys
+import argparse
+from common import collect_metadata, write_results
+
+SUITES = ['matching', 'detection', 'database', 'upload']
+
+
+def run_suite(name, args):
+    """Run a single benchmark suite and return its results."""
+    if name == 'matching':
+        import bench_matching
+        return bench_matching.run(quick=args.quick, iterations=args.iterations)
+    if name == 'detection':
+        import bench_detection
+        return bench_detection.run(quick=args.quick, iterations=args.iterations, image_path=args.image)
+    if name == 'database':
+        import bench_database
+        return bench_database.run(quick=args.quick, iterations=args.iterations, rows=args.rows)
+    if name == 'upload':
+        import bench_upload
+        return bench_upload.run(quick=args.quick, iterations=args.iterations, image_path=args.image)
+    raise ValueError(f"Unknown suite: {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Smart Enterprise benchmark suite offline")
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help="Suite to run (repeatable, default: all)")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes for a fast smoke run")
+    parser.add_argument('--iterations', type=int, help="Override timed iterations per benchmark")
+    parser.add_argument('--rows', type=int, help="Rows per table for the database suite")
+    parser.add_argument('--image', help="Optional face photo used instead of synthetic frames")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write JSON results")
+    args = parser.parse_args()
+
+    results = []
+    failed = []
+    for name in (args.suite or SUITES):
+        print(f"Running {name} benchmarks...")
+        try:
+            results.extend(run_suite(name, args))
+        except ImportError as e:
+            print(f"  skipped {name}: missing dependency ({e})")
+            failed.append(name)
+
+    write_results(args.output, collect_metadata(), results)
+    print(f"Wrote {len(results)} results to {args.output}")
+    return 1 if failed and not results else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import time
+import base64
+import random
+import struct
+import asyncio
+import hashlib
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# Commands understood by main_board/src/main.cpp and the relay each one drives
+RELAY_COMMANDS = {
+    'open_door': ('door', True),
+    'close_door': ('door', False),
+    'turn_on_lamp': ('lamp', True),
+    'turn_off_lamp': ('lamp', False),
+    'turn_on_pris': ('outlet', True),
+    'turn_off_pris': ('outlet', False),
+}
+DOOR_COMMANDS = ('open_door', 'close_door')
+
+
+def format_float(value):
+    """Format a reading the way Arduino's String(float) does."""
+    if value != value:
+        return "nan"
+    return f"{value:.2f}"
+
+
+class FakeMainBoard:
+    def __init__(self, board_id, host='127.0.0.1', port=8100, sensor_interval=1.0,
+                 motion_probability=0.1, seed=None, door_id=None, legacy_frames=False):
+        """
+        Simulate a main board: a WebSocket server at /ws that broadcasts
+        batched t1: telemetry frames (or, with legacy_frames, the old
+        temp:/humidity:/pir: frames) and accepts relay commands.
+        """
+        self.board_id = board_id
+        self.door_id = door_id
+        self.host = host
+        self.port = port
+        self.sensor_interval = sensor_interval
+        self.legacy_frames = legacy_frames
+        self.telemetry_seq = 0
+        self.motion_probability = motion_probability
+        self.rng = random.Random(seed)
+        self.clients = set()
+        self.relays = {'door': False, 'lamp': False, 'outlet': False}
+        self.temperature = 22.0 + self.rng.uniform(-2, 2)
+        self.humidity = 45.0 + self.rng.uniform(-5, 5)
+        self.pir = 0
+        self.server = None
+        self._sensor_task = None
+
+        # Statistics
+        self.frames_sent = 0
+        self.commands_received = {}
+        self.unknown_commands = 0
+        self.connections = 0
+        self.pending_uploads = deque()
+        self.door_latencies = []
+
+    @property
+    def url(self):
+        """WebSocket URL the dashboard should connect to."""
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self):
+        """Start listening and broadcasting sensor readings."""
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self._sensor_task = asyncio.create_task(self._sensor_loop())
+        logger.info(f"Board {self.board_id} listening on {self.url}")
+
+    async def stop(self):
+        """Stop the server and disconnect clients."""
+        if self._sensor_task:
+            self._sensor_task.cancel()
+        for writer in list(self.clients):
+            writer.close()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def expect_door_command(self, sent_at):
+        """Register an upload whose door command should arrive at this board."""
+        self.pending_uploads.append(sent_at)
+
+    async def _handle_client(self, reader, writer):
+        """Perform the WebSocket handshake and process incoming frames."""
+        try:
+            if not await self._handshake(reader, writer):
+                return
+            self.clients.add(writer)
+            self.connections += 1
+            while True:
+                opcode, payload = await self._read_frame(reader)
+                if opcode == OPCODE_CLOSE:
+                    self._write_frame(writer, OPCODE_CLOSE, payload[:2])
+                    break
+                if opcode == OPCODE_PING:
+                    self._write_frame(writer, OPCODE_PONG, payload)
+                elif opcode == OPCODE_TEXT:
+                    self._handle_received_msg(payload.decode(errors='replace'))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Board {self.board_id} client error: {e}")
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def _handshake(self, reader, writer):
+        """Answer the HTTP upgrade request for /ws."""
+        request = await reader.readuntil(b'\r\n\r\n')
+        lines = request.decode(errors='replace').split('\r\n')
+        parts = lines[0].split(' ')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        key = headers.get('sec-websocket-key')
+        if len(parts) < 2 or parts[1] != '/ws' or not key:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+            return False
+
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        return True
+
+    async def _read_frame(self, reader):
+        """Read a single (masked) client frame."""
+        first, second = await reader.readexactly(2)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def _write_frame(self, writer, opcode, payload):
+        """Write a single unmasked server frame."""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        writer.write(header + payload)
+
+    def _handle_received_msg(self, message):
+        """Apply a command the same way the firmware does."""
+        received_at = time.perf_counter()
+        if message in RELAY_COMMANDS:
+            relay, state = RELAY_COMMANDS[message]
+            self.relays[relay] = state
+            self.commands_received[message] = self.commands_received.get(message, 0) + 1
+            if message in DOOR_COMMANDS and self.pending_uploads:
+                self.door_latencies.append(received_at - self.pending_uploads.popleft())
+        else:
+            self.unknown_commands += 1
+            logger.warning(f"Board {self.board_id} unknown command received: {message}")
+
+    def send_msg(self, message):
+        """Broadcast a text frame to every connected client (ws.textAll)."""
+        payload = message.encode()
+        for writer in list(self.clients):
+            try:
+                self._write_frame(writer, OPCODE_TEXT, payload)
+                self.frames_sent += 1
+            except Exception:
+                self.clients.discard(writer)
+
+    def read_sensors(self):
+        """Produce the next temperature, humidity and PIR readings."""
+        self.temperature = min(max(self.temperature + self.rng.uniform(-0.2, 0.2), 15), 35)
+        self.humidity = min(max(self.humidity + self.rng.uniform(-0.5, 0.5), 20), 80)
+        if self.pir:
+            self.pir = 0 if self.rng.random() < 0.3 else 1
+        else:
+            self.pir = 1 if self.rng.random() < self.motion_probability else 0
+        return self.temperature, self.humidity, self.pir
+
+    async def _sensor_loop(self):
+        """Send readings every sensor_interval seconds, like loop() on the board."""
+        while True:
+            await asyncio.sleep(self.sensor_interval)
+            temp, humidity, pir = self.read_sensors()
+            if self.legacy_frames:
+                self.send_msg("temp:" + format_float(temp))
+                self.send_msg("humidity:" + format_float(humidity))
+                self.send_msg("pir:" + str(pir))
+            elif self.clients:
+                self.send_msg(self.telemetry_frame(format_float(temp), format_float(humidity), str(pir)))
+
+    def telemetry_frame(self, temp, humidity, pir):
+        """Build a frame like send_telemetry() on the board."""
+        millis = int(time.monotonic() * 1000)
+        frame = f"t1:{self.telemetry_seq},{millis},{temp},{humidity},{pir}"
+        self.telemetry_seq += 1
+        return frame
+
+    def stats(self):
+        """Return counters for the report."""
+        return {
+            "board_id": self.board_id,
+            "door_id": self.door_id,
+            "url": self.url,
+            "connections": self.connections,
+            "connected_clients": len(self.clients),
+            "frames_sent": self.frames_sent,
+            "commands_received": dict(self.commands_received),
+            "unknown_commands": self.unknown_commands,
+            "relays": dict(self.relays),
+            "unmatched_uploads": len(self.pending_uploads)
+        }
@@ -0,0 +1,138 @@
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def load_frame(image_path=None, width=320, height=240, seed=0):
+    """
+    Get JPEG bytes to upload.
+
+    Uses the given image if provided, otherwise renders a synthetic QVGA
+    frame (the size cam_board switches to after init).
+    """
+    if image_path:
+        with open(image_path, 'rb') as f:
+            return f.read()
+
+    import cv2
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+class FakeCamera:
+    def __init__(self, camera_id, upload_url, frame, interval=10.0, board=None, jitter=0.1,
+                 timeout=30):
+        """
+        Simulate an ESP32-CAM posting multipart frames to /upload.
+
+        If a board is given, every upload is registered with it so the door
+        command that the server sends in response can be timed. Like the
+        firmware, the camera follows the server's next-capture hint.
+        """
+        self.camera_id = camera_id
+        self.upload_url = upload_url
+        self.frame = frame
+        self.interval = interval
+        self.default_interval = interval
+        self.board = board
+        self.jitter = jitter
+        self.timeout = timeout
+        self.rng = random.Random(camera_id)
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Statistics
+        self.uploads = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.access_granted = 0
+        self.skipped = 0
+        self.http_latencies = []
+
+    def start(self):
+        """Start posting frames in a background thread."""
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop posting frames."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout)
+
+    def _run(self):
+        """Post a frame every interval seconds, like loop() on the camera board."""
+        import requests
+
+        # Spread cameras out instead of firing them all at once
+        if self._stop.wait(self.rng.uniform(0, self.interval)):
+            return
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            self.send_image(requests)
+            elapsed = time.perf_counter() - started
+            delay = self.interval * (1 + self.rng.uniform(-self.jitter, self.jitter)) - elapsed
+            if self._stop.wait(max(delay, 0)):
+                break
+
+    def send_image(self, requests):
+        """Post one frame as multipart form data with field name 'file'."""
+        filename = f"image_{int(time.monotonic() * 1000)}.jpg"
+        sent_at = time.perf_counter()
+        if self.board:
+            self.board.expect_door_command(sent_at)
+        try:
+            data = {'door_id': self.board.door_id} if self.board and self.board.door_id else None
+            response = requests.post(self.upload_url, files={'file': (filename, self.frame, 'image/jpeg')},
+                                     data=data, timeout=self.timeout)
+            self.http_latencies.append(time.perf_counter() - sent_at)
+            self.uploads += 1
+            self.status_codes[response.status_code] = self.status_codes.get(response.status_code, 0) + 1
+            self._follow_hint(response)
+            if response.status_code != 200:
+                self._forget_upload(sent_at)
+                return
+            result = response.json()
+            if result.get('skipped'):
+                # Frames without motion get no door command
+                self.skipped += 1
+                self._forget_upload(sent_at)
+            elif result.get('access_granted'):
+                self.access_granted += 1
+        except Exception as e:
+            self.errors += 1
+            self._forget_upload(sent_at)
+            logger.warning(f"Camera {self.camera_id} upload failed: {e}")
+
+    def _follow_hint(self, response):
+        """Adopt the capture interval suggested by the server, as cam_board does."""
+        hint = response.headers.get('X-Next-Capture-Interval') or response.headers.get('Retry-After')
+        try:
+            self.interval = min(max(float(hint), 0.5), 60.0) if hint else self.default_interval
+        except ValueError:
+            self.interval = self.default_interval
+
+    def _forget_upload(self, sent_at):
+        """Stop waiting for a door command the server did not send."""
+        if self.board:
+            try:
+                self.board.pending_uploads.remove(sent_at)
+            except (ValueError, RuntimeError):
+                pass
+
+    def stats(self):
+        """Return counters for the report."""
+        return {
+            "camera_id": self.camera_id,
+            "uploads": self.uploads,
+            "errors": self.errors,
+            "status_codes": {str(k): v for k, v in self.status_codes.items()},
+            "access_granted": self.access_granted,
+            "skipped": self.skipped,
+            "interval": self.interval
+        }
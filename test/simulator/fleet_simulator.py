@@ -0,0 +1,174 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import threading
+import datetime
+from fake_board import FakeMainBoard
+from fake_camera import FakeCamera, load_frame
+
+logger = logging.getLogger(__name__)
+
+
+def summarize_latencies(samples):
+    """Latency percentiles in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+class FleetSimulator:
+    def __init__(self, boards=1, cameras=1, upload_url="http://127.0.0.1:5000/upload",
+                 host='127.0.0.1', base_port=8100, sensor_interval=1.0, camera_interval=10.0,
+                 motion_probability=0.1, image_path=None, legacy_frames=False):
+        """Run N fake main boards and M fake cameras against a dashboard server."""
+        self.boards = [
+            FakeMainBoard(i, host=host, port=base_port + i, sensor_interval=sensor_interval,
+                          motion_probability=motion_probability, seed=i,
+                          door_id='main' if i == 0 else f"door{i}", legacy_frames=legacy_frames)
+            for i in range(boards)
+        ]
+        frame = load_frame(image_path)
+        # Each camera is paired with a board, as cameras sit next to doors
+        self.cameras = [
+            FakeCamera(i, upload_url, frame, interval=camera_interval,
+                       board=self.boards[i % boards] if boards else None)
+            for i in range(cameras)
+        ]
+        self.loop = None
+        self._loop_thread = None
+        self.started_at = None
+
+    def start(self):
+        """Start the boards' event loop, then the cameras."""
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self._start_boards())
+            ready.set()
+            self.loop.run_forever()
+
+        self._loop_thread = threading.Thread(target=run_loop, name="boards", daemon=True)
+        self._loop_thread.start()
+        ready.wait()
+        for camera in self.cameras:
+            camera.start()
+        self.started_at = time.time()
+
+    def stop(self):
+        """Stop cameras and boards."""
+        for camera in self.cameras:
+            camera.stop()
+        if self.loop:
+            future = asyncio.run_coroutine_threadsafe(self._stop_boards(), self.loop)
+            future.result(timeout=10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._loop_thread.join(timeout=10)
+
+    async def _start_boards(self):
+        """Start every board on the event loop."""
+        await asyncio.gather(*(b.start() for b in self.boards))
+
+    async def _stop_boards(self):
+        """Stop every board on the event loop."""
+        await asyncio.gather(*(b.stop() for b in self.boards))
+
+    def report(self):
+        """Build a machine-readable report of the run so far."""
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        http_latencies = [s for c in self.cameras for s in c.http_latencies]
+        door_latencies = [s for b in self.boards for s in b.door_latencies]
+        uploads = sum(c.uploads for c in self.cameras)
+        return {
+            "created_at": datetime.datetime.now().isoformat(),
+            "elapsed_sec": round(elapsed, 1),
+            "boards": len(self.boards),
+            "cameras": len(self.cameras),
+            "uploads": uploads,
+            "upload_errors": sum(c.errors for c in self.cameras),
+            "uploads_skipped": sum(c.skipped for c in self.cameras),
+            "uploads_per_sec": round(uploads / elapsed, 3) if elapsed else None,
+            "telemetry_frames_sent": sum(b.frames_sent for b in self.boards),
+            "upload_latency": summarize_latencies(http_latencies),
+            "door_command_latency": summarize_latencies(door_latencies),
+            "board_stats": [b.stats() for b in self.boards],
+            "camera_stats": [c.stats() for c in self.cameras]
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of main boards and ESP32 cameras")
+    parser.add_argument('--boards', type=int, default=1, help="Number of fake main boards")
+    parser.add_argument('--cameras', type=int, default=1, help="Number of fake cameras")
+    parser.add_argument('--upload-url', default="http://127.0.0.1:5000/upload",
+                        help="Dashboard upload endpoint")
+    parser.add_argument('--host', default='127.0.0.1', help="Address the boards listen on")
+    parser.add_argument('--base-port', type=int, default=8100, help="Port of the first board")
+    parser.add_argument('--sensor-interval', type=float, default=1.0,
+                        help="Seconds between sensor broadcasts (SENSOR_READ_DELAY)")
+    parser.add_argument('--camera-interval', type=float, default=10.0,
+                        help="Seconds between camera uploads until the server sends a hint (sendInterval)")
+    parser.add_argument('--motion-probability', type=float, default=0.1,
+                        help="Chance per reading that the PIR starts detecting motion")
+    parser.add_argument('--legacy-frames', action='store_true',
+                        help="Send the old temp:/humidity:/pir: frames instead of batched ones")
+    parser.add_argument('--image', help="JPEG to upload instead of a synthetic frame")
+    parser.add_argument('--duration', type=float, default=60, help="Run time in seconds (0 = until Ctrl+C)")
+    parser.add_argument('--report-interval', type=float, default=10, help="Seconds between progress lines")
+    parser.add_argument('--output', help="Write the final JSON report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = FleetSimulator(
+        boards=args.boards, cameras=args.cameras, upload_url=args.upload_url, host=args.host,
+        base_port=args.base_port, sensor_interval=args.sensor_interval,
+        camera_interval=args.camera_interval, motion_probability=args.motion_probability,
+        image_path=args.image, legacy_frames=args.legacy_frames
+    )
+    simulator.start()
+    for board in simulator.boards:
+        print(f"Board {board.board_id}: {board.url} (door_id: {board.door_id})")
+
+    try:
+        deadline = time.time() + args.duration if args.duration else None
+        while deadline is None or time.time() < deadline:
+            time.sleep(min(args.report_interval, max(deadline - time.time(), 0)) if deadline
+                       else args.report_interval)
+            report = simulator.report()
+            print(f"[{report['elapsed_sec']}s] uploads={report['uploads']} "
+                  f"errors={report['upload_errors']} "
+                  f"upload p95={report['upload_latency'].get('p95_ms')} ms "
+                  f"door p95={report['door_command_latency'].get('p95_ms')} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+
+    report = simulator.report()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from fake_camera import load_frame
+
+BOUNDARY = "frame"
+
+
+def load_frames(image_dir=None, count=8):
+    """Load JPEGs from a directory, or render a few synthetic frames."""
+    if image_dir:
+        files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(('.jpg', '.jpeg')))
+        frames = [load_frame(os.path.join(image_dir, f)) for f in files]
+        if frames:
+            return frames
+    return [load_frame(seed=i) for i in range(count)]
+
+
+class MJPEGHandler(BaseHTTPRequestHandler):
+    """Serve /stream as multipart MJPEG and /snapshot as single JPEGs, like an IP camera."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == self.server.stream_path:
+            self._serve_stream()
+        elif self.path == '/snapshot':
+            self._serve_snapshot()
+        else:
+            self.send_error(404)
+
+    def _next_frame(self):
+        frames = self.server.frames
+        with self.server.lock:
+            self.server.frames_served += 1
+            return frames[self.server.frames_served % len(frames)]
+
+    def _serve_snapshot(self):
+        frame = self._next_frame()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(frame)))
+        self.end_headers()
+        self.wfile.write(frame)
+
+    def _serve_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                frame = self._next_frame()
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                                 f"Content-Length: {len(frame)}\r\n\r\n".encode())
+                self.wfile.write(frame)
+                self.wfile.write(b"\r\n")
+                self.wfile.flush()
+                time.sleep(1 / self.server.fps)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start_camera_server(port, frames, host='127.0.0.1', fps=10, stream_path='/stream', verbose=False):
+    """Start one stand-in camera in a background thread."""
+    server = ThreadingHTTPServer((host, port), MJPEGHandler)
+    server.daemon_threads = True
+    server.frames = frames
+    server.fps = fps
+    server.stream_path = stream_path
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    server.frames_served = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in MJPEG/snapshot IP cameras for local testing")
+    parser.add_argument('--cameras', type=int, default=1, help="Number of cameras to serve")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    parser.add_argument('--base-port', type=int, default=8080, help="Port of the first camera")
+    parser.add_argument('--fps', type=float, default=10, help="Frames per second on /stream")
+    parser.add_argument('--stream-path', default='/stream', help="Path of the MJPEG stream")
+    parser.add_argument('--images', help="Directory of JPEGs to cycle through")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    frames = load_frames(args.images)
+    servers = []
+    for i in range(args.cameras):
+        port = args.base_port + i
+        servers.append(start_camera_server(port, frames, args.host, args.fps, args.stream_path, args.verbose))
+        print(f"Camera {i}: http://{args.host}:{port}{args.stream_path} (snapshot: /snapshot)")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    for server in servers:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
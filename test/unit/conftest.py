@@ -0,0 +1,75 @@
+import os
+import sys
+import logging
+import pytest
+
+DASHBOARD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'dashboard'))
+
+# Make the dashboard modules importable the same way app.py imports them
+if DASHBOARD_DIR not in sys.path:
+    sys.path.insert(0, DASHBOARD_DIR)
+
+logging.basicConfig(level=logging.WARNING)
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    """A DatabaseManager on a fresh database file."""
+    from database import DatabaseManager
+    db_manager = DatabaseManager()
+    db_manager.db_file = str(tmp_path / 'entreprise.db')
+    db_manager.init_database()
+    return db_manager
+
+
+@pytest.fixture(autouse=True)
+def isolated_response_cache(tmp_path):
+    """Keep tests off the generation counters of a server running from this checkout."""
+    from response_cache import response_cache
+    previous = response_cache.generations_file
+    response_cache.use_file(str(tmp_path / 'cache_generations'))
+    yield response_cache
+    response_cache.use_file(previous)
+
+
+class StubBoardManager:
+    """Board manager with no boards connected."""
+
+    def connected_count(self):
+        return 0
+
+    def registered_count(self):
+        return 0
+
+    def is_connected(self, board_id=None):
+        return False
+
+    def send_command(self, command, board_id=None, door_id=None):
+        return False
+
+
+class StubFaceRecognizer:
+    known_face_names = []
+
+
+@pytest.fixture
+def api(db_manager):
+    """An APIManager on the test database, with stub boards and recognizer."""
+    from api import APIManager
+    api = APIManager(StubFaceRecognizer(), StubBoardManager())
+    api.db_manager = db_manager
+    return api
+
+
+@pytest.fixture
+def client(api):
+    """A Flask test client serving the API blueprint, logged in as admin."""
+    from flask import Flask
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(api.get_blueprint())
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+        session['username'] = 'admin'
+    return client
@@ -0,0 +1,55 @@
+import csv
+import io
+import sqlite3
+import pytest
+
+
+@pytest.fixture
+def attendance(db_manager):
+    """Two employees present on three days of March 2024, plus one day outside the range."""
+    alice, bob = db_manager.add_employees([('Alice', 'N-1'), ('Bob', 'N-2')])
+    conn = sqlite3.connect(db_manager.db_file)
+    with conn:
+        for employee_id, day in [(alice, '2024-03-01'), (bob, '2024-03-01'), (alice, '2024-03-02'),
+                                 (bob, '2024-03-03'), (alice, '2024-03-03'), (alice, '2024-04-01')]:
+            conn.execute('INSERT INTO attendance (employee_id, day, first_seen, last_seen) VALUES (?, ?, ?, ?)',
+                         (employee_id, day, f'{day} 08:00:00', f'{day} 17:00:00'))
+    conn.close()
+    return alice, bob
+
+
+def test_iter_attendance_walks_the_period_in_batches(db_manager, attendance):
+    alice, bob = attendance
+
+    batches = list(db_manager.iter_attendance('2024-03-01', '2024-03-31', batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    keys = [(row[3], row[0]) for batch in batches for row in batch]
+    assert keys == [('2024-03-03', bob), ('2024-03-03', alice), ('2024-03-02', alice),
+                    ('2024-03-01', bob), ('2024-03-01', alice)]
+
+
+def test_iter_attendance_filters_by_employee(db_manager, attendance):
+    alice, _ = attendance
+
+    rows = [row for batch in db_manager.iter_attendance('2024-03-01', '2024-03-31', alice, batch_size=1)
+            for row in batch]
+
+    assert [(row[1], row[3]) for row in rows] == [('Alice', '2024-03-03'), ('Alice', '2024-03-02'),
+                                                  ('Alice', '2024-03-01')]
+
+
+def test_export_streams_csv(client, attendance):
+    response = client.get('/api/attendance/export?month=2024-03')
+
+    assert response.status_code == 200 and response.is_streamed
+    assert response.headers['Content-Disposition'] == 'attachment; filename=attendance_2024-03-01_2024-03-31.csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ['employee_id', 'name', 'national_id', 'day', 'first_seen', 'last_seen', 'sightings']
+    assert [(row[1], row[3]) for row in rows[1:]] == [('Bob', '2024-03-03'), ('Alice', '2024-03-03'),
+                                                      ('Alice', '2024-03-02'), ('Bob', '2024-03-01'),
+                                                      ('Alice', '2024-03-01')]
+
+
+def test_export_rejects_bad_days(client):
+    assert client.get('/api/attendance/export?from=2024-13-01').status_code == 400
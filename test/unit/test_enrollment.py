@@ -0,0 +1,94 @@
+import io
+import zipfile
+import numpy as np
+import pytest
+from enrollment import BulkEnrollment
+
+
+class StubRecognizer:
+    def __init__(self):
+        self.added = []
+
+    def add_known_faces(self, encodings, names):
+        self.added.extend(zip(names, encodings))
+
+
+class StubEnrollment(BulkEnrollment):
+    """Photos named good*.jpg encode to a vector, every other photo has no usable face."""
+
+    def _encode_images(self, images, report):
+        for person, image in images:
+            if image["file"].rsplit('/', 1)[-1].startswith('good'):
+                image["encoding"] = np.full(128, 0.5)
+            else:
+                report["errors"].append({"employee": person["national_id"], "file": image["file"],
+                                         "error": "no face found"})
+
+
+def make_archive(manifest, files=(), prefix=''):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(prefix + 'manifest.csv', manifest)
+        for path in files:
+            archive.writestr(prefix + path, b'jpeg bytes')
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def enrollment(db_manager, tmp_path):
+    return StubEnrollment(db_manager, StubRecognizer(), faces_directory=str(tmp_path / 'employees'), workers=1)
+
+
+def errors_by_row(report):
+    return {error.get("row"): error["error"] for error in report["errors"]}
+
+
+def test_manifest_rows_are_validated(enrollment, db_manager):
+    db_manager.add_employees([('Dana', 'N-4')])
+    manifest = ('﻿name,national_id,folder\n'
+                'Alice,N-1,\n'
+                ',N-2,\n'
+                '../x,N-3,\n'
+                'Dana,N-4,\n'
+                'Bob,N-5,photos/bob\n'
+                'Bobby,N-5,\n')
+
+    report = enrollment.enroll(make_archive(manifest, ['Alice/good1.jpg', 'photos/bob/good.png']), dry_run=True)
+
+    assert errors_by_row(report) == {3: "name and national_id are required", 4: "invalid name",
+                                     5: "national_id already registered", 7: "duplicate national_id in manifest"}
+    assert [(e["name"], e["images"]) for e in report["employees"]] == [('Alice', 1), ('Bob', 1)]
+    assert report["employees_added"] == 0
+
+
+def test_archive_may_wrap_everything_in_a_folder(enrollment):
+    report = enrollment.enroll(make_archive('name,national_id\nAlice,N-1\n', ['Alice/good.jpg'],
+                                            prefix='export/'), dry_run=True)
+
+    assert report["errors"] == []
+    assert [e["name"] for e in report["employees"]] == ['Alice']
+
+
+def test_archive_without_manifest_is_rejected(enrollment):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('Alice/good.jpg', b'jpeg bytes')
+    buffer.seek(0)
+
+    with pytest.raises(ValueError, match='manifest.csv'):
+        enrollment.enroll(buffer)
+    with pytest.raises(ValueError, match='Not a ZIP or tar archive'):
+        enrollment.enroll(io.BytesIO(b'not an archive'))
+
+
+def test_people_sharing_a_name_are_enrolled_separately(enrollment, db_manager):
+    manifest = 'name,national_id,folder\nSam,N-1,sam1\nSam,N-2,sam2\n'
+
+    report = enrollment.enroll(make_archive(manifest, ['sam1/good.jpg', 'sam1/blurry.jpg', 'sam2/blurry.jpg']))
+
+    assert report["employees_added"] == 1 and report["images_enrolled"] == 1
+    assert [(e["national_id"], e["images"]) for e in report["employees"]] == [('N-1', 1)]
+    assert {"employee": 'N-2', "row": 3, "error": "no usable photos"} in report["errors"]
+    assert [name for name, _ in enrollment.face_recognizer.added] == ['Sam']
+    assert db_manager.get_existing_national_ids(['N-1', 'N-2']) == {'N-1'}
@@ -0,0 +1,110 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import pytest
+from history_export import HistoryExporter, parse_export_time
+
+COLUMNS = ['id', 'sensor_type', 'value']
+BATCHES = [[(1, 'temp', 21.5), (2, 'humidity', 40.0)], [(3, 'pir', 1.0)]]
+
+
+@pytest.fixture
+def exporter(db_manager):
+    return HistoryExporter(db_manager)
+
+
+@pytest.fixture
+def readings(db_manager):
+    """Three readings from one telemetry frame of board 1."""
+    db_manager.save_sensor_readings({"temp": 21.5, "humidity": 40.0, "pir": 1.0}, board_id=1)
+
+
+def test_plain_end_date_includes_the_whole_day():
+    assert parse_export_time('2024-03-01') == datetime.datetime(2024, 3, 1)
+    assert parse_export_time('2024-03-01', end=True) == datetime.datetime(2024, 3, 2)
+    assert parse_export_time('2024-03-01 12:30:00', end=True) == datetime.datetime(2024, 3, 1, 12, 30)
+    assert parse_export_time('') is None
+    with pytest.raises(ValueError):
+        parse_export_time('yesterday')
+
+
+def test_csv_is_one_chunk_per_batch_after_the_header(exporter):
+    chunks = list(exporter.encode(iter(BATCHES), COLUMNS))
+
+    assert chunks[0] == b'id,sensor_type,value\r\n'
+    assert chunks[1:] == [b'1,temp,21.5\r\n2,humidity,40.0\r\n', b'3,pir,1.0\r\n']
+
+
+def test_ndjson_has_one_object_per_row(exporter):
+    text = b''.join(exporter.encode(iter(BATCHES), COLUMNS, fmt='ndjson')).decode()
+
+    assert [json.loads(line) for line in text.splitlines()] == [
+        {"id": 1, "sensor_type": 'temp', "value": 21.5},
+        {"id": 2, "sensor_type": 'humidity', "value": 40.0},
+        {"id": 3, "sensor_type": 'pir', "value": 1.0}]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_gzip_output_is_one_valid_member(exporter, fmt):
+    plain = b''.join(exporter.encode(iter(BATCHES), COLUMNS, fmt))
+
+    compressed = b''.join(exporter.encode(iter(BATCHES), COLUMNS, fmt, compress=True))
+
+    assert compressed[:2] == b'\x1f\x8b'
+    assert gzip.decompress(compressed) == plain
+
+
+def test_filename_names_the_last_day_covered():
+    start, end = parse_export_time('2024-03-01'), parse_export_time('2024-03-31', end=True)
+
+    assert HistoryExporter.filename('energy', start, end) == 'energy_20240301_20240331.csv'
+    assert HistoryExporter.filename('access', fmt='ndjson', compress=True) == 'access.ndjson.gz'
+    assert HistoryExporter.content_type('ndjson') == 'application/x-ndjson'
+    assert HistoryExporter.content_type('csv', compress=True) == 'application/gzip'
+
+
+@pytest.mark.parametrize('dataset, fmt, start, end, message', [
+    ('badges', 'csv', None, None, "Unknown dataset 'badges'"),
+    ('energy', 'xml', None, None, "Unknown format 'xml'"),
+    ('energy', 'csv', datetime.datetime(2024, 3, 2), datetime.datetime(2024, 3, 1), "'from' must be before 'to'"),
+])
+def test_bad_requests_are_rejected_before_streaming(exporter, dataset, fmt, start, end, message):
+    with pytest.raises(ValueError, match=message):
+        exporter.stream(dataset, start, end, fmt)
+
+
+def test_sensor_history_is_exported(exporter, readings):
+    rows = list(csv.reader(io.StringIO(b''.join(exporter.stream('sensors')).decode())))
+
+    assert rows[0] == ['id', 'timestamp', 'board_id', 'sensor_type', 'value']
+    assert sorted((row[2], row[3], row[4]) for row in rows[1:]) == [
+        ('1', 'humidity', '40.0'), ('1', 'pir', '1.0'), ('1', 'temp', '21.5')]
+
+
+def test_range_excludes_rows_outside_it(exporter, readings):
+    last_year = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+
+    chunks = list(exporter.stream('sensors', last_year, last_year + datetime.timedelta(days=1)))
+
+    assert chunks == [b'id,timestamp,board_id,sensor_type,value\r\n']
+
+
+def test_export_endpoint_streams_gzip(client, readings):
+    response = client.get('/api/export/sensors?format=ndjson&gzip=1')
+
+    assert response.status_code == 200 and response.is_streamed
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=sensors.ndjson.gz'
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    assert sorted(json.loads(line)["sensor_type"] for line in lines) == ['humidity', 'pir', 'temp']
+
+
+@pytest.mark.parametrize('query', ['/api/export/badges', '/api/export/energy?format=xml',
+                                   '/api/export/energy?from=2024-03-02&to=2024-03-01',
+                                   '/api/export/energy?from=March'])
+def test_export_endpoint_rejects_bad_requests(client, query):
+    response = client.get(query)
+
+    assert response.status_code == 400 and 'error' in response.get_json()
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import pytest
+import app
+from app import SmartEnterpriseServer
+from config import CAPTURE_INTERVAL_MOTION, CAPTURE_INTERVAL_IDLE, CAPTURE_INTERVAL_DEFAULT
+
+
+class StubBoards:
+    """Reports a fixed PIR state and records which door was asked about."""
+
+    def __init__(self, state):
+        self.state = state
+        self.doors = []
+
+    def motion_state(self, board_id=None, door_id=None):
+        self.doors.append(door_id)
+        return self.state
+
+
+def gate(state, door_id='front'):
+    boards = StubBoards(state)
+    server = SimpleNamespace(board_manager=boards)
+    return SmartEnterpriseServer._motion_gate(server, door_id), boards
+
+
+@pytest.mark.parametrize('state, interval', [
+    ('motion', CAPTURE_INTERVAL_MOTION),
+    ('idle', CAPTURE_INTERVAL_IDLE),
+    # Unknown, disconnected or stale PIR reading
+    (None, CAPTURE_INTERVAL_DEFAULT),
+])
+def test_gate_follows_the_door_pir(state, interval):
+    (motion, next_interval), boards = gate(state)
+
+    assert (motion, next_interval) == (state, interval)
+    assert boards.doors == ['front']
+
+
+def test_gate_disabled_ignores_the_pir(monkeypatch):
+    monkeypatch.setattr(app, 'MOTION_GATING_ENABLED', False)
+
+    (motion, next_interval), boards = gate('idle')
+
+    assert (motion, next_interval) == (None, CAPTURE_INTERVAL_DEFAULT)
+    assert boards.doors == []
+
+
+def test_idle_cameras_are_not_slowed_below_the_default_rate():
+    assert CAPTURE_INTERVAL_MOTION <= CAPTURE_INTERVAL_IDLE <= CAPTURE_INTERVAL_DEFAULT
@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+import datetime
+import pytest
+from partitions import PartitionManager, current_month, months_ago
+
+
+def timestamp(month, day=15):
+    return f"{month.replace('_', '-')}-{day:02d} 12:00:00"
+
+
+def tables(db_file, table):
+    conn = sqlite3.connect(db_file)
+    names = PartitionManager({}).partitions(conn.cursor(), table)
+    conn.close()
+    return names
+
+
+def rows(db_file, sql, params=()):
+    conn = sqlite3.connect(db_file)
+    result = conn.execute(sql, params).fetchall()
+    conn.close()
+    return result
+
+
+def create_legacy_table(db_file):
+    """An old unpartitioned sensor_data table holding four months and a row without a timestamp."""
+    conn = sqlite3.connect(db_file)
+    with conn:
+        conn.execute('CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_type TEXT NOT NULL, '
+                     'value REAL NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)')
+        for age in (9, 3, 1, 0):
+            conn.execute('INSERT INTO sensor_data (sensor_type, value, timestamp) VALUES (?, ?, ?)',
+                         ('temp', float(age), timestamp(months_ago(current_month(), age), day=1)))
+        conn.execute("INSERT INTO sensor_data (sensor_type, value, timestamp) VALUES ('temp', -1, NULL)")
+    conn.close()
+
+
+def run_together(count, func):
+    """Run func in several threads released at the same moment. Returns the exceptions raised."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker():
+        try:
+            barrier.wait()
+            func()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A DatabaseManager whose sensor_data was migrated from an old unpartitioned table."""
+    from database import DatabaseManager
+    db_manager = DatabaseManager()
+    db_manager.db_file = str(tmp_path / 'entreprise.db')
+    create_legacy_table(db_manager.db_file)
+    db_manager.init_database()
+    return db_manager
+
+
+@pytest.mark.parametrize('month, count, expected', [
+    ('2024_03', 0, '2024_03'),
+    ('2024_03', 2, '2024_01'),
+    ('2024_03', 3, '2023_12'),
+    ('2024_01', 13, '2022_12'),
+])
+def test_months_ago(month, count, expected):
+    assert months_ago(month, count) == expected
+
+
+def test_inserts_through_the_view_land_in_the_current_month(db_manager):
+    db_manager.save_energy_event('lamp', 'on')
+    old = timestamp(months_ago(current_month(), 2))
+    conn = sqlite3.connect(db_manager.db_file)
+    with conn:
+        conn.execute("INSERT INTO energy_usage (device_name, state, timestamp) VALUES ('lamp', 'off', ?)", (old,))
+    conn.close()
+
+    assert tables(db_manager.db_file, 'energy_usage') == [f'energy_usage_{current_month()}']
+    assert rows(db_manager.db_file, f'SELECT state, duration_minutes FROM energy_usage_{current_month()} '
+                                    'ORDER BY id') == [('on', 0), ('off', 0)]
+
+
+def test_migration_splits_legacy_rows_by_month_and_keeps_ids(legacy_db):
+    month = current_month()
+    assert tables(legacy_db.db_file, 'sensor_data') == [
+        f'sensor_data_{months_ago(month, age)}' for age in (9, 3, 1, 0)]
+    assert rows(legacy_db.db_file, f'SELECT id, value FROM sensor_data_{months_ago(month, 3)}') == [(2, 3.0)]
+    # Rows without a timestamp join the current month
+    assert rows(legacy_db.db_file, f'SELECT id FROM sensor_data_{month} ORDER BY id') == [(4,), (5,)]
+    assert rows(legacy_db.db_file, 'SELECT id FROM sensor_data ORDER BY id') == [(1,), (2,), (3,), (4,), (5,)]
+
+    legacy_db.save_sensor_data('temp', 21.5)
+    assert rows(legacy_db.db_file, 'SELECT MAX(id) FROM sensor_data') == [(6,)]
+
+
+def test_new_partition_continues_the_id_sequence(db_manager):
+    for _ in range(3):
+        db_manager.save_energy_event('lamp', 'on')
+    next_month = months_ago(current_month(), -1)
+    conn = sqlite3.connect(db_manager.db_file)
+    with conn:
+        db_manager.partitions._ensure_partition(conn.cursor(), 'energy_usage', next_month)
+        conn.execute("INSERT INTO energy_usage (device_name, state) VALUES ('lamp', 'off')")
+    conn.close()
+
+    assert rows(db_manager.db_file, f'SELECT id, state FROM energy_usage_{next_month}') == [(4, 'off')]
+    assert [row[0] for row in rows(db_manager.db_file, 'SELECT id FROM energy_usage')] == [1, 2, 3, 4]
+
+
+def test_partitions_since_skips_older_months(legacy_db):
+    conn = sqlite3.connect(legacy_db.db_file)
+    cursor = conn.cursor()
+    month = current_month()
+    year, month_number = (int(part) for part in months_ago(month, 1).split('_'))
+    since = datetime.datetime(year, month_number, 20)
+
+    assert legacy_db.partitions.partitions_since(cursor, 'sensor_data', since) == [
+        f'sensor_data_{months_ago(month, 1)}', f'sensor_data_{month}']
+    assert legacy_db.partitions.source(cursor, 'sensor_data', datetime.datetime.utcnow()) == f'sensor_data_{month}'
+    # Nothing that recent or old: the newest partition, or all of them
+    assert legacy_db.partitions.partitions_since(cursor, 'sensor_data', datetime.datetime(9999, 1, 1)) == [
+        f'sensor_data_{month}']
+    assert len(legacy_db.partitions.partitions_since(cursor, 'sensor_data')) == 4
+    conn.close()
+
+
+def test_retention_drops_expired_partitions_and_keeps_the_view(legacy_db):
+    month = current_month()
+
+    dropped = legacy_db.maintain_partitions()
+
+    assert dropped == [f'sensor_data_{months_ago(month, 9)}']
+    assert tables(legacy_db.db_file, 'sensor_data') == [
+        f'sensor_data_{months_ago(month, age)}' for age in (3, 1, 0)]
+    legacy_db.save_sensor_data('temp', 21.5)
+    assert [row[0] for row in rows(legacy_db.db_file, 'SELECT value FROM sensor_data ORDER BY id')] == [
+        3.0, 1.0, 0.0, -1.0, 21.5]
+    assert legacy_db.maintain_partitions() == []
+
+
+def test_setup_is_repeatable(db_manager):
+    db_manager.save_sensor_data('temp', 20.0)
+    conn = sqlite3.connect(db_manager.db_file)
+    PartitionManager({}).setup(conn.cursor())
+    PartitionManager({}).setup(conn.cursor())
+    conn.close()
+
+    db_manager.save_sensor_data('temp', 21.0)
+    assert tables(db_manager.db_file, 'sensor_data') == [f'sensor_data_{current_month()}']
+    assert rows(db_manager.db_file, 'SELECT id, value FROM sensor_data') == [(1, 20.0), (2, 21.0)]
+
+
+def test_concurrent_setup_from_two_connections(legacy_db):
+    """Workers starting together take turns rebuilding the views and triggers."""
+    def start_worker():
+        conn = sqlite3.connect(legacy_db.db_file, timeout=10)
+        try:
+            for _ in range(20):
+                PartitionManager({}).setup(conn.cursor())
+        finally:
+            conn.close()
+
+    assert run_together(2, start_worker) == []
+    legacy_db.save_sensor_data('temp', 21.5)
+    assert rows(legacy_db.db_file, 'SELECT COUNT(*), MAX(id) FROM sensor_data') == [(6, 6)]
+
+
+def test_concurrent_migration_runs_once(tmp_path):
+    db_file = str(tmp_path / 'entreprise.db')
+    create_legacy_table(db_file)
+
+    def start_worker():
+        conn = sqlite3.connect(db_file, timeout=10)
+        try:
+            PartitionManager({}).setup(conn.cursor())
+        finally:
+            conn.close()
+
+    assert run_together(2, start_worker) == []
+    assert len(tables(db_file, 'sensor_data')) == 4
+    assert rows(db_file, 'SELECT id FROM sensor_data ORDER BY id') == [(1,), (2,), (3,), (4,), (5,)]
@@ -0,0 +1,66 @@
+import io
+import threading
+import pytest
+import app
+from readiness import ReadinessTracker
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """A server created in an empty working directory, with nothing warmed up yet."""
+    monkeypatch.chdir(tmp_path)
+    return app.SmartEnterpriseServer()
+
+
+def test_tracker_reports_each_component():
+    readiness = ReadinessTracker(['models', 'gallery'])
+    with readiness.track('models'):
+        pass
+    with readiness.track('gallery'):
+        raise OSError('gallery folder missing')
+
+    status = readiness.status()
+    assert not status["ready"] and readiness.is_ready('models') and not readiness.is_ready()
+    assert status["components"]["models"]["state"] == 'ready'
+    assert status["components"]["gallery"]["state"] == 'failed'
+    assert status["components"]["gallery"]["error"] == 'gallery folder missing'
+    assert not readiness.wait_for(('models', 'gallery'), timeout=1)
+
+
+def test_ready_probe_is_503_until_warmed_up(api, client):
+    api.readiness = ReadinessTracker(['models', 'gallery'])
+
+    response = client.get('/api/ready')
+    assert response.status_code == 503
+    assert response.get_json()["components"]["models"]["state"] == 'pending'
+
+    api.readiness.mark_ready('models')
+    api.readiness.mark_ready('gallery')
+    response = client.get('/api/ready')
+    assert response.status_code == 200 and response.get_json()["ready"]
+
+
+def test_uploads_are_rejected_with_retry_after_while_warming_up(server, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_WARMUP_POLICY', 'reject')
+
+    response = server.app.test_client().post('/upload', data={"file": (io.BytesIO(b'jpeg'), 'frame.jpg')})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert response.get_json()["readiness"]["components"]["models"]["state"] == 'pending'
+
+
+def test_queued_uploads_wait_for_warm_up(server, monkeypatch):
+    monkeypatch.setattr(app, 'UPLOAD_WARMUP_POLICY', 'queue')
+    monkeypatch.setattr(app, 'UPLOAD_WARMUP_WAIT', 0.1)
+    client = server.app.test_client()
+    assert client.post('/upload').status_code == 503
+
+    monkeypatch.setattr(app, 'UPLOAD_WARMUP_WAIT', 5)
+    warm_up = threading.Timer(0.2, lambda: [server.readiness.mark_ready(name) for name in ('models', 'gallery')])
+    warm_up.start()
+    response = client.post('/upload')
+    warm_up.join()
+
+    # Past the readiness check: rejected for having no file, not for warming up
+    assert response.status_code == 400
@@ -0,0 +1,44 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from gallery_store import RecognitionBudget
+
+
+def test_budget_caps_concurrent_recognitions(tmp_path):
+    budget = RecognitionBudget(slots=2, folder=str(tmp_path))
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def recognize(_):
+        with budget.slot():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(recognize, range(12)))
+
+    assert max(peak) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['slot_0.lock', 'slot_1.lock']
+
+
+def test_budgets_in_other_processes_share_the_slots(tmp_path):
+    """Two budgets on one folder stand for two worker processes."""
+    upload_budget = RecognitionBudget(slots=1, folder=str(tmp_path))
+    camera_budget = RecognitionBudget(slots=1, folder=str(tmp_path))
+    acquired = threading.Event()
+
+    def camera_frame():
+        with camera_budget.slot():
+            acquired.set()
+
+    with upload_budget.slot():
+        camera = threading.Thread(target=camera_frame)
+        camera.start()
+        assert not acquired.wait(0.2)
+    camera.join(5)
+    assert acquired.is_set()
@@ -0,0 +1,153 @@
+import time
+import sqlite3
+import threading
+import numpy as np
+import pytest
+import rescoring
+from rescoring import FrameRescorer
+
+
+class StubRecognizer:
+    """Matches by the first encoding value instead of a real gallery."""
+    tolerance = 0.6
+
+    def match_faces(self, faces, encodings):
+        for face, encoding in zip(faces, encodings):
+            face["name"], face["distance"] = ('Alice', 0.3) if encoding[0] > 0.5 else ('Unknown', 0.9)
+
+
+def add_frames(db_manager, values):
+    """Store Unknown frames, as uploads do, whose encoding starts with each value."""
+    for i, value in enumerate(values):
+        face = {"box": [0, 10, 10, 0], "quality": {}, "accepted": True, "name": 'Unknown', "distance": None}
+        db_manager.save_photo_record(f'frame_{i}.jpg', ['Unknown'], [face], encodings=[np.full(128, value)])
+
+
+def recognized(db_manager):
+    conn = sqlite3.connect(db_manager.db_file)
+    rows = conn.execute('SELECT recognized_faces FROM photos ORDER BY id').fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+@pytest.fixture
+def rescorer(db_manager, tmp_path):
+    return FrameRescorer(db_manager, StubRecognizer(), upload_folder=str(tmp_path), workers=1, batch_size=2)
+
+
+def test_rescore_corrects_frames_from_cached_encodings(db_manager, rescorer):
+    add_frames(db_manager, [1, 0, 1, 0, 1])
+
+    job = rescorer.run(rescorer.start('unknown'))
+
+    assert job["status"] == 'finished'
+    assert (job["processed"], job["changed"], job["cached"], job["missing"]) == (5, 3, 5, 0)
+    assert recognized(db_manager) == ['Alice', 'Unknown', 'Alice', 'Unknown', 'Alice']
+    conn = sqlite3.connect(db_manager.db_file)
+    assert conn.execute("SELECT COUNT(*) FROM photo_faces WHERE decision = 'recognized' AND name = 'Alice'"
+                        ).fetchone()[0] == 3
+
+
+def test_only_one_job_runs_at_a_time(db_manager, rescorer):
+    add_frames(db_manager, [1])
+    job_id = rescorer.start('unknown')
+
+    assert rescorer.start('all') is None
+    assert rescorer.start('unknown', restart=True) is None
+    other_tolerance = FrameRescorer(db_manager, StubRecognizer(), workers=1)
+    other_tolerance.face_recognizer.tolerance = 0.4
+    assert other_tolerance.start('unknown') is None
+    assert db_manager.get_active_rescore_job(300)["id"] == job_id
+
+
+def test_stale_running_job_is_paused_and_replaced(db_manager, rescorer):
+    add_frames(db_manager, [1])
+    old_id = rescorer.start('unknown')
+    conn = sqlite3.connect(db_manager.db_file)
+    with conn:
+        conn.execute("UPDATE rescore_jobs SET updated_at = datetime('now', '-1 hour') WHERE id = ?", (old_id,))
+    conn.close()
+
+    new_id = rescorer.start('all')
+
+    assert new_id not in (None, old_id)
+    assert db_manager.get_rescore_job(old_id)["status"] == 'paused'
+
+
+def test_interrupted_job_pauses_and_resumes(db_manager, rescorer):
+    add_frames(db_manager, [1, 1, 1, 1, 1])
+    job_id = rescorer.start('unknown')
+
+    def interrupt(job):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        rescorer.run(job_id, progress=interrupt)
+
+    job = db_manager.get_rescore_job(job_id)
+    assert (job["status"], job["last_photo_id"], job["processed"]) == ('paused', 2, 2)
+    assert rescorer.start('unknown') == job_id
+    job = rescorer.run(job_id)
+    assert (job["status"], job["processed"], job["changed"]) == ('finished', 5, 5)
+
+
+def test_stop_pauses_the_running_job(db_manager, rescorer):
+    add_frames(db_manager, [1, 1, 1])
+    job_id = rescorer.start('unknown')
+
+    assert rescorer.stop()
+    job = rescorer.run(job_id)
+
+    assert (job["status"], job["processed"]) == ('paused', 0)
+    assert not rescorer.stop()
+
+
+def test_unreadable_frame_is_missing_and_left_alone(db_manager, rescorer, tmp_path):
+    (tmp_path / 'broken.jpg').write_bytes(b'not a jpeg')
+    db_manager.save_photo_record('broken.jpg', ['Unknown'])
+    db_manager.save_photo_record('deleted.jpg', ['Unknown'])
+
+    job = rescorer.run(rescorer.start('unknown'))
+
+    assert (job["status"], job["processed"], job["missing"], job["changed"]) == ('finished', 2, 2, 0)
+    assert recognized(db_manager) == ['Unknown', 'Unknown']
+    conn = sqlite3.connect(db_manager.db_file)
+    assert conn.execute('SELECT COUNT(*) FROM photo_encodings').fetchone()[0] == 0
+
+
+def test_recognized_frames_are_cached_when_saved(db_manager):
+    face = {"box": [0, 10, 10, 0], "quality": {"sharpness": 30.0}, "accepted": True, "name": 'Alice',
+            "distance": 0.3}
+    rejected = dict(face, accepted=False, name=None, distance=None)
+    photo_id = db_manager.save_photo_record('frame.jpg', ['Alice'], [face, rejected],
+                                            encodings=[np.full(128, 0.25)])
+    db_manager.save_photo_record('stored_unrecognized.jpg', [], [])
+
+    conn = sqlite3.connect(db_manager.db_file)
+    rows = conn.execute('SELECT photo_id, faces, encodings FROM photo_encodings').fetchall()
+    conn.close()
+    assert [row[0] for row in rows] == [photo_id]
+    faces, encodings = rescoring.vision.unpack_faces(rows[0][1], rows[0][2])
+    assert [face["accepted"] for face in faces] == [True, False]
+    assert faces[0]["quality"] == {"sharpness": 30.0}
+    assert len(encodings) == 1 and encodings[0][0] == 0.25
+
+
+def test_heartbeat_keeps_a_slow_job_active(db_manager, rescorer, monkeypatch):
+    monkeypatch.setattr(rescoring, 'RESCORE_HEARTBEAT_INTERVAL', 0.05)
+    add_frames(db_manager, [1])
+    job_id = rescorer.start('unknown')
+    conn = sqlite3.connect(db_manager.db_file)
+    with conn:
+        conn.execute("UPDATE rescore_jobs SET updated_at = datetime('now', '-1 hour') WHERE id = ?", (job_id,))
+    conn.close()
+    assert db_manager.get_active_rescore_job(300) is None
+
+    stopped = threading.Event()
+    heartbeat = threading.Thread(target=rescorer._heartbeat, args=(job_id, stopped))
+    heartbeat.start()
+    time.sleep(0.3)
+    stopped.set()
+    heartbeat.join()
+
+    assert db_manager.get_active_rescore_job(300)["id"] == job_id
@@ -0,0 +1,149 @@
+import time
+import threading
+import pytest
+from flask import Flask, jsonify, request
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(generations_file=str(tmp_path / 'cache_generations'))
+
+
+@pytest.fixture
+def view(cache):
+    """A Flask client for a cached /items view counting how often it really runs."""
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/items')
+    @cache.cached(ttl=60, tags=('cameras',))
+    def items():
+        calls.append(request.full_path)
+        if request.args.get('fail'):
+            return jsonify({"error": "down"}), 500
+        return jsonify({"items": len(calls)})
+
+    client = app.test_client()
+    client.calls = calls
+    return client
+
+
+def test_repeated_requests_are_served_from_the_cache(view, cache):
+    first = view.get('/items')
+    second = view.get('/items')
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_data() == second.get_data()
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert len(view.calls) == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_matching_etag_gets_304(view, cache):
+    etag = view.get('/items').headers['ETag']
+
+    response = view.get('/items', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304 and response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert view.get('/items', headers={'If-None-Match': '"stale"'}).status_code == 200
+    assert cache.not_modified == 1
+
+
+def test_invalidating_a_tag_refreshes_its_responses(view, cache):
+    etag = view.get('/items').headers['ETag']
+
+    cache.invalidate('employees')
+    assert view.get('/items').headers['ETag'] == etag
+    cache.invalidate('cameras')
+    response = view.get('/items', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200 and response.get_json() == {"items": 2}
+    assert response.headers['ETag'] != etag
+
+
+def test_query_strings_are_cached_separately_and_errors_not_at_all(view):
+    view.get('/items?page=1')
+    view.get('/items?page=2')
+    view.get('/items?page=1')
+    assert view.get('/items?fail=1').status_code == 500
+    assert view.get('/items?fail=1').status_code == 500
+
+    assert view.calls == ['/items?page=1', '/items?page=2', '/items?fail=1', '/items?fail=1']
+
+
+def test_least_recently_used_responses_are_evicted(view, cache):
+    cache.max_entries = 2
+    view.get('/items?page=1')
+    view.get('/items?page=2')
+    view.get('/items?page=1')
+    view.get('/items?page=3')
+
+    view.get('/items?page=1')
+    view.get('/items?page=2')
+
+    assert view.calls == ['/items?page=1', '/items?page=2', '/items?page=3', '/items?page=2']
+    assert cache.stats()["entries"] == 2 and cache.evictions == 2
+    assert len(cache._key_locks) <= 2
+
+
+def test_api_writes_invalidate_cached_responses(client):
+    first = client.get('/api/cameras')
+    assert first.get_json() == []
+
+    assert client.post('/api/cameras', json={"name": 'Lobby', "ip_address": '10.0.0.5'}).status_code == 201
+    second = client.get('/api/cameras', headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 200
+    assert [camera["name"] for camera in second.get_json()] == ['Lobby']
+
+
+def wait_in_thread(cache, generation, timeout, poll_interval):
+    """Start wait_for_change in a thread. Returns (thread, result dict with 'changed' and 'seconds')."""
+    result = {}
+
+    def wait():
+        started = time.monotonic()
+        result["changed"] = cache.wait_for_change('energy', generation, timeout, poll_interval=poll_interval)
+        result["seconds"] = time.monotonic() - started
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    return thread, result
+
+
+def test_local_invalidate_wakes_waiters_at_once(cache):
+    generation = cache.generation('energy')
+    thread, result = wait_in_thread(cache, generation, timeout=5, poll_interval=5)
+    time.sleep(0.1)
+
+    cache.invalidate('energy')
+    thread.join(2)
+
+    assert result["changed"] and result["seconds"] < 1
+
+
+def test_other_process_writes_are_noticed_by_polling(cache, tmp_path):
+    # A second cache on the same file stands for another worker process
+    other_worker = ResponseCache(generations_file=cache.generations_file)
+    generation = cache.generation('energy')
+    thread, result = wait_in_thread(cache, generation, timeout=5, poll_interval=0.1)
+    time.sleep(0.1)
+
+    other_worker.invalidate('energy')
+    thread.join(2)
+
+    assert result["changed"] and result["seconds"] < 1
+    assert cache.generation('energy') == generation + 1
+
+
+def test_wait_times_out_without_changes(cache):
+    generation = cache.generation('energy')
+    cache.invalidate('employees')
+
+    started = time.monotonic()
+    assert not cache.wait_for_change('energy', generation, timeout=0.2, poll_interval=0.05)
+    assert 0.2 <= time.monotonic() - started < 1
+    assert cache.wait_for_change('employees', 0, timeout=0)
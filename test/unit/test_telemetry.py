@@ -0,0 +1,61 @@
+import math
+import sqlite3
+import pytest
+from websocket_client import encode_telemetry, decode_telemetry
+from board_manager import BoardConnectionManager
+
+
+def test_batched_frame_round_trip():
+    message = encode_telemetry(7, 123456, {"temp": 21.456, "humidity": 40.0, "pir": 1})
+
+    assert message == 't1:7,123456,21.46,40.00,1'
+    assert decode_telemetry(message) == {"version": 1, "seq": 7, "ts": 123456,
+                                         "readings": {"temp": 21.46, "humidity": 40.0, "pir": 1.0}}
+
+
+def test_sensors_left_out_of_a_frame_are_not_read():
+    message = encode_telemetry(8, 5, {"pir": 0})
+
+    assert message == 't1:8,5,,,0'
+    assert decode_telemetry(message)["readings"] == {"pir": 0.0}
+
+
+def test_failed_dht_reads_travel_as_nan():
+    frame = decode_telemetry(encode_telemetry(9, 5, {"temp": float('nan'), "humidity": 50.0}))
+
+    assert math.isnan(frame["readings"]["temp"])
+    assert frame["readings"]["humidity"] == 50.0
+
+
+@pytest.mark.parametrize('message, readings', [
+    ('temp:22.5', {"temp": 22.5}),
+    ('humidity:48', {"humidity": 48.0}),
+    ('pir:1', {"pir": 1.0}),
+])
+def test_legacy_frames_decode_as_version_0(message, readings):
+    assert decode_telemetry(message) == {"version": 0, "seq": None, "ts": None, "readings": readings}
+
+
+@pytest.mark.parametrize('message', [
+    'open_door',          # command echo
+    'door:open',          # not a sensor
+    'temp:warm',          # not a number
+    't1:1,2,3',           # missing fields
+    't1:x,2,20,40,0',     # bad sequence number
+    't2:1,2,20,40,0',     # unknown version
+])
+def test_other_messages_are_ignored(message):
+    assert decode_telemetry(message) is None
+
+
+def test_lost_frames_are_counted_from_sequence_gaps(db_manager):
+    boards = BoardConnectionManager(db_manager)
+    for seq in (1, 2, 5, 6, 0, 1):  # 3 and 4 lost, then a restart
+        boards._handle_message(1, encode_telemetry(seq, seq * 1000, {"temp": 20.0, "pir": 0}))
+    boards._handle_message(1, 'temp:21.0')
+
+    assert boards.frame_stats[1] == {"last_seq": 1, "lost": 2}
+    assert boards.telemetry[1]["temp"][0] == 21.0
+    conn = sqlite3.connect(db_manager.db_file)
+    assert conn.execute("SELECT COUNT(*) FROM sensor_data WHERE sensor_type = 'temp'").fetchone()[0] == 7
+    conn.close()